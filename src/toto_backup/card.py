@@ -36,7 +36,11 @@ class InvalidDataError(Exception):
         super().__init__('Invalid data.')
 
 
+# Cards are read-only once parsed, and indexing jobs keep thousands of them in memory: slots
+# avoid a dictionary per object.
 class Track:
+    __slots__ = ('_title', '_track_number', '_url')
+
     def __init__(self, track_number: int, title: str, url: str):
         self._track_number: int = track_number
         self._title: str = title
@@ -56,17 +60,30 @@ class Track:
 
 
 class Chapter:
+    __slots__ = ('_chapter_number', '_icon_url', '_title', '_track_numbers', '_tracks')
+
     def __init__(self, chapter_number: int, title: str, icon_url: str):
         self._chapter_number: int = chapter_number
         self._title: str = title
         self._icon_url: str = icon_url
         self._tracks: list[Track] = []
+        # Index of the track numbers, built once tracks are not added in order.
+        self._track_numbers: set[int] | None = None
 
     def add_track(self, track: Track) -> None:
-        is_duplicate = len([t for t in self._tracks if t.track_number == track.track_number]) > 0
-        if is_duplicate:
+        if self._has_track(track.track_number):
             raise DuplicateTrackError(track.track_number, self._chapter_number)
         self._tracks.append(track)
+        if self._track_numbers is not None:
+            self._track_numbers.add(track.track_number)
+
+    def _has_track(self, track_number: int) -> bool:
+        if self._track_numbers is None:
+            if not self._tracks or track_number > self._tracks[-1].track_number:
+                # Tracks added in increasing order (as parsed) cannot be duplicates.
+                return False
+            self._track_numbers = {track.track_number for track in self._tracks}
+        return track_number in self._track_numbers
 
     @property
     def chapter_number(self) -> int:
@@ -86,16 +103,19 @@ class Chapter:
 
 
 class Card:
+    __slots__ = ('_author', '_chapter_numbers', '_chapters', '_cover_url', '_title', '_track_total')
+
     def __init__(self, title: str, author: str, cover_url: str):
         self._title: str = title
         self._author: str = author
         self._cover_url: str = cover_url
         self._chapters: list[Chapter] = []
+        # Index of the chapter numbers, built once chapters are not added in order.
+        self._chapter_numbers: set[int] | None = None
         self._track_total: int = 0
 
     def add_chapter(self, chapter: Chapter):
-        is_duplicate = len([c for c in self._chapters if c.chapter_number == chapter.chapter_number]) > 0
-        if is_duplicate:
+        if self._has_chapter(chapter.chapter_number):
             raise DuplicateChapterError(chapter.chapter_number)
 
         track_count = len(chapter.tracks)
@@ -103,8 +123,18 @@ class Card:
             raise EmptyChapterError(chapter.chapter_number, chapter.title)
 
         self._chapters.append(chapter)
+        if self._chapter_numbers is not None:
+            self._chapter_numbers.add(chapter.chapter_number)
         self._track_total += track_count
 
+    def _has_chapter(self, chapter_number: int) -> bool:
+        if self._chapter_numbers is None:
+            if not self._chapters or chapter_number > self._chapters[-1].chapter_number:
+                # Chapters added in increasing order (as parsed) cannot be duplicates.
+                return False
+            self._chapter_numbers = {chapter.chapter_number for chapter in self._chapters}
+        return chapter_number in self._chapter_numbers
+
     @property
     def title(self) -> str:
         return self._title
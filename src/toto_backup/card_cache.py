@@ -0,0 +1,166 @@
+#
+# SPDX-License-Identifier: MPL-2.0
+#
+# Copyright (c) 2025-2026 "Laurent Desgrange".
+#
+# This file is part of "toto-backup".
+# See "https://github.com/ldesgrange/toto-backup") for further information.
+#
+# This Source Code Form is subject to the terms of the
+# Mozilla Public License, v. 2.0. If a copy of the MPL
+# was not distributed with this file, You can obtain one
+# at https://mozilla.org/MPL/2.0/.
+#
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any
+from uuid import uuid4
+
+import structlog
+
+from toto_backup.utils import canonical_url, json_loads
+
+logger = structlog.stdlib.get_logger()
+
+CARD_CACHE_VERSION = 1
+# Card data holds the URLs of the tracks, which may expire: keep it for a short while only.
+CARD_CACHE_TTL = 15 * 60
+CARD_CACHE_MAX_SIZE = 64 * 1024 * 1024
+CARD_CACHE_ENTRY_SUFFIX = '.json'
+
+
+class CachedCard:
+    """
+    A card found in the card cache: either its data, or the error that prevented its backup.
+    """
+
+    def __init__(self, data: Any, exit_code: int = 0, reason: str | None = None):
+        self._data = data
+        self._exit_code = exit_code
+        self._reason = reason
+
+    @property
+    def data(self) -> Any:
+        """
+        The JSON data of the card page, `None` for a card that could not be backed up.
+        """
+        return self._data
+
+    @property
+    def exit_code(self) -> int:
+        """
+        The exit code of the error that prevented the backup of the card, 0 if there was none.
+        """
+        return self._exit_code
+
+    @property
+    def reason(self) -> str | None:
+        return self._reason
+
+
+class CardCache:
+    """
+    Keeps the data of card pages on disk, so that backing up a card again shortly after (to
+    retry failed tracks, re-tag them…) does not fetch and search its page again.
+
+    Each card is stored in its own file, named after the SHA-256 checksum of its canonical URL.
+    Entries expire `ttl` seconds after the page was fetched. Cards whose page was not found or
+    had no valid data are cached too (negative entries), so that they fail without a request.
+    Once the total size of the entries exceeds `max_size`, least recently used entries are
+    evicted.
+    """
+
+    def __init__(self, directory: Path, ttl: float = CARD_CACHE_TTL, max_size: int = CARD_CACHE_MAX_SIZE):
+        self._directory = directory
+        self._ttl = ttl
+        self._max_size = max_size
+        self._lock = threading.Lock()
+        directory.mkdir(parents=True, exist_ok=True)
+
+    @property
+    def directory(self) -> Path:
+        return self._directory
+
+    def get(self, url: str) -> CachedCard | None:
+        """
+        Looks for a card in the cache.
+
+        :param url: The URL of the card.
+        :return: The cached card, or `None` if it is not cached or its entry expired.
+        """
+        file = self._get_entry_file(url)
+        try:
+            entry = json_loads(file.read_bytes())
+        except FileNotFoundError:
+            return None
+        except ValueError:
+            logger.warning(f'Ignoring unreadable card cache entry: {file}')
+            return None
+        if not isinstance(entry, dict) or entry.get('version') != CARD_CACHE_VERSION:
+            return None
+        if time.time() - entry.get('fetched_at', 0) > self._ttl:
+            logger.debug(f'Card cache entry of {url} expired.')
+            return None
+        # The modification time of entries tells which were used last.
+        try:
+            os.utime(file)
+        except FileNotFoundError:
+            # Evicted meanwhile, still usable.
+            pass
+        return CachedCard(entry.get('data'), entry.get('exit_code') or 0, entry.get('reason'))
+
+    def put(self, url: str, data: Any) -> None:
+        """
+        Caches the data of a card.
+
+        :param url: The URL of the card.
+        :param data: The JSON data of the card page.
+        """
+        self._save(url, {'data': data})
+
+    def put_error(self, url: str, exit_code: int, reason: str) -> None:
+        """
+        Caches a card that could not be backed up, and will not be until its page changes.
+
+        :param url: The URL of the card.
+        :param exit_code: The exit code of the error.
+        :param reason: The reason of the error.
+        """
+        self._save(url, {'data': None, 'exit_code': exit_code, 'reason': reason})
+
+    def _save(self, url: str, entry: dict[str, Any]) -> None:
+        file = self._get_entry_file(url)
+        content = json.dumps(
+            {'version': CARD_CACHE_VERSION, 'url': canonical_url(url), 'fetched_at': time.time(), **entry},
+            ensure_ascii=False,
+        )
+        # Write then rename, so that readers never see a truncated entry.
+        temporary_file = file.with_name(f'{file.name}.{uuid4()}.tmp')
+        temporary_file.write_text(content, encoding='utf-8')
+        os.replace(temporary_file, file)
+        self._evict()
+
+    def _evict(self) -> None:
+        with self._lock:
+            entries = []
+            for file in self._directory.glob(f'*{CARD_CACHE_ENTRY_SUFFIX}'):
+                try:
+                    stat = file.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime_ns, stat.st_size, file))
+            size = sum(entry_size for _, entry_size, _ in entries)
+            for _, entry_size, file in sorted(entries):
+                if size <= self._max_size:
+                    break
+                logger.debug(f'Evicting card cache entry: {file}')
+                file.unlink(missing_ok=True)
+                size -= entry_size
+
+    def _get_entry_file(self, url: str) -> Path:
+        key = hashlib.sha256(canonical_url(url).encode('utf-8')).hexdigest()
+        return self._directory / f'{key}{CARD_CACHE_ENTRY_SUFFIX}'
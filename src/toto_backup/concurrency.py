@@ -0,0 +1,156 @@
+#
+# SPDX-License-Identifier: MPL-2.0
+#
+# Copyright (c) 2025-2026 "Laurent Desgrange".
+#
+# This file is part of "toto-backup".
+# See "https://github.com/ldesgrange/toto-backup") for further information.
+#
+# This Source Code Form is subject to the terms of the
+# Mozilla Public License, v. 2.0. If a copy of the MPL
+# was not distributed with this file, You can obtain one
+# at https://mozilla.org/MPL/2.0/.
+#
+import threading
+from collections.abc import Iterator
+from contextlib import contextmanager
+from http import HTTPStatus
+from typing import Any
+from urllib.parse import urlsplit
+
+import requests
+import structlog
+
+logger = structlog.stdlib.get_logger()
+
+# Requests in flight per host when a backup starts.
+INITIAL_WINDOW = 2
+# Responses telling the client to slow down.
+THROTTLING_STATUS_CODES = {HTTPStatus.TOO_MANY_REQUESTS, HTTPStatus.SERVICE_UNAVAILABLE}
+# A response is slow if it takes this many times longer than usual.
+LATENCY_SPIKE_FACTOR = 3
+# Latencies below this are all considered usual (e.g. local servers).
+MIN_LATENCY = 0.05
+# Number of responses needed to know the usual latency of a host.
+LATENCY_SAMPLE_COUNT = 5
+# Weight of the latest response in the usual latency (exponentially weighted moving average).
+LATENCY_SMOOTHING = 0.2
+
+
+class _HostState:
+    def __init__(self, window: int):
+        self.window = float(window)
+        self.in_flight = 0
+        # Usual time to the response headers, in seconds.
+        self.latency = 0.0
+        self.sample_count = 0
+        self.responses_since_decrease = window
+
+
+class ConcurrencyController:
+    """
+    Limits the number of requests in flight per host, adapting the limit (the window) to the
+    host like TCP congestion control (AIMD):
+
+    - each response arriving in time increases the window additively, by one request once a
+      whole window of responses has arrived;
+    - a throttling response ("429 Too Many Requests", "503 Service Unavailable") or a latency
+      spike (time to the response headers much longer than usual) halves it, at most once per
+      window of responses.
+
+    The window stays between 1 and `max_window` (e.g. the number of download workers).
+    Responses are reported with `record_response`, usually from an HTTP session hook (see
+    `attach`).
+    """
+
+    def __init__(self, max_window: int):
+        self._max_window = max_window
+        self._condition = threading.Condition()
+        self._hosts: dict[str, _HostState] = {}
+
+    @property
+    def max_window(self) -> int:
+        return self._max_window
+
+    def attach(self, session: requests.Session) -> None:
+        """
+        Reports every response received by an HTTP session to this controller.
+        """
+
+        def record(response: requests.Response, *_args: Any, **_kwargs: Any) -> None:
+            self.record_response(response.url, response.elapsed.total_seconds(), response.status_code)
+
+        session.hooks['response'].append(record)
+
+    @contextmanager
+    def slot(self, url: str) -> Iterator[None]:
+        """
+        Waits until a request to the host of a given URL can be made, and holds a slot of its
+        window while the request is in flight.
+
+        :param url: The URL of the request.
+        """
+        host = _get_host(url)
+        with self._condition:
+            state = self._get_state(host)
+            self._condition.wait_for(lambda: state.in_flight < int(state.window))
+            state.in_flight += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                state.in_flight -= 1
+                self._condition.notify_all()
+
+    def record_response(self, url: str, latency: float, status_code: int) -> None:
+        """
+        Adapts the window of a host to a response received from it.
+
+        :param url: The URL of the response.
+        :param latency: The time it took to receive the response headers, in seconds.
+        :param status_code: The HTTP status code of the response.
+        """
+        host = _get_host(url)
+        with self._condition:
+            state = self._get_state(host)
+            previous_window = int(state.window)
+            is_spike = state.sample_count >= LATENCY_SAMPLE_COUNT and latency > LATENCY_SPIKE_FACTOR * max(
+                state.latency, MIN_LATENCY
+            )
+            if status_code in THROTTLING_STATUS_CODES or is_spike:
+                if state.responses_since_decrease >= int(state.window):
+                    state.window = max(1.0, state.window / 2)
+                    state.responses_since_decrease = 0
+            else:
+                state.window = min(float(self._max_window), state.window + 1 / state.window)
+            state.responses_since_decrease += 1
+            if not is_spike:
+                # Spikes are not part of the usual latency.
+                state.latency = (
+                    latency if not state.sample_count else state.latency + LATENCY_SMOOTHING * (latency - state.latency)
+                )
+                state.sample_count += 1
+            window = int(state.window)
+            self._condition.notify_all()
+        if window != previous_window:
+            logger.info(f'Download concurrency for {host}: {window} requests in flight.')
+
+    def get_windows(self) -> dict[str, int]:
+        """
+        Provides the current window of each host.
+
+        :return: The number of requests allowed in flight, by host.
+        """
+        with self._condition:
+            return {host: int(state.window) for host, state in self._hosts.items()}
+
+    def _get_state(self, host: str) -> _HostState:
+        state = self._hosts.get(host)
+        if state is None:
+            state = _HostState(min(INITIAL_WINDOW, self._max_window))
+            self._hosts[host] = state
+        return state
+
+
+def _get_host(url: str) -> str:
+    return urlsplit(url).netloc.lower()
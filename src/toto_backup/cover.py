@@ -0,0 +1,191 @@
+#
+# SPDX-License-Identifier: MPL-2.0
+#
+# Copyright (c) 2025-2026 "Laurent Desgrange".
+#
+# This file is part of "toto-backup".
+# See "https://github.com/ldesgrange/toto-backup") for further information.
+#
+# This Source Code Form is subject to the terms of the
+# Mozilla Public License, v. 2.0. If a copy of the MPL
+# was not distributed with this file, You can obtain one
+# at https://mozilla.org/MPL/2.0/.
+#
+from __future__ import annotations
+
+import base64
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import cached_property
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from mutagen.id3 import APIC
+    from mutagen.mp4 import MP4Cover
+
+# Total size of the cover content kept in memory by the cover cache.
+COVER_CACHE_MAX_SIZE = 32 * 1024 * 1024
+
+
+class Cover:
+    """
+    The content of a cover file, with the cover objects embedded in tags. Each of them is
+    prepared on first use, then shared by all the tracks tagged with this cover: they must
+    not be modified.
+    """
+
+    def __init__(self, data: bytes, mime_type: str | None):
+        self._data = data
+        self._mime_type = mime_type
+        self._checksum = hashlib.sha256(data).hexdigest()
+
+    @property
+    def data(self) -> bytes:
+        return self._data
+
+    @property
+    def mime_type(self) -> str | None:
+        """
+        The MIME type of the cover, or `None` if its format cannot be embedded in tags.
+        """
+        return self._mime_type
+
+    @property
+    def checksum(self) -> str:
+        """
+        The SHA-256 checksum of the cover content.
+        """
+        return self._checksum
+
+    @cached_property
+    def mp4_cover(self) -> MP4Cover | None:
+        """
+        The cover for the `covr` atom of MP4 tags.
+        """
+        # Format-specific modules are only imported when tracks of that format are tagged.
+        from mutagen.mp4 import MP4Cover  # noqa: PLC0415
+
+        if self._mime_type == 'image/png':
+            return MP4Cover(self._data, imageformat=MP4Cover.FORMAT_PNG)
+        elif self._mime_type == 'image/jpeg':
+            return MP4Cover(self._data, imageformat=MP4Cover.FORMAT_JPEG)
+        else:
+            return None
+
+    @cached_property
+    def apic(self) -> APIC | None:
+        """
+        The cover frame of ID3 tags.
+        """
+        from mutagen.id3 import APIC, Encoding, PictureType  # noqa: PLC0415
+
+        if self._mime_type is None:
+            return None
+        return APIC(encoding=Encoding.UTF8, mime=self._mime_type, type=PictureType.ILLUSTRATION, data=self._data)
+
+    @cached_property
+    def metadata_block_picture(self) -> str | None:
+        """
+        The base64-encoded FLAC picture of the `metadata_block_picture` Vorbis comment.
+        """
+        from mutagen.flac import Picture  # noqa: PLC0415
+        from mutagen.id3 import PictureType  # noqa: PLC0415
+
+        if self._mime_type is None:
+            return None
+        picture = Picture()
+        picture.type = PictureType.COVER_FRONT
+        picture.mime = self._mime_type
+        picture.data = self._data
+        return base64.b64encode(picture.write()).decode('ascii')
+
+
+class CoverCache:
+    """
+    Keeps covers in memory, so that a cover file shared by many tracks (e.g. the icon of a
+    chapter) is read and prepared once, whatever the number of tracks or cards tagged with it.
+
+    Covers are identified by the SHA-256 checksum of their content: identical covers from
+    different files share the same entry. Files are only read again if they have been
+    modified (based on their inode, size and modification time). Least recently used covers
+    are evicted once their total size exceeds `max_size`.
+    """
+
+    def __init__(self, max_size: int = COVER_CACHE_MAX_SIZE):
+        self._max_size = max_size
+        self._size = 0
+        self._lock = threading.Lock()
+        self._covers: OrderedDict[str, Cover] = OrderedDict()
+        self._checksums: dict[tuple[int, int, int, int], str] = {}
+
+    @property
+    def max_size(self) -> int:
+        return self._max_size
+
+    @property
+    def size(self) -> int:
+        """
+        The total size of the cover content in the cache.
+        """
+        with self._lock:
+            return self._size
+
+    def get(self, cover_file: Path) -> Cover:
+        """
+        Provides the cover of a given file, reading it only if it is not in the cache.
+
+        :param cover_file: The cover file.
+        :return: The cover.
+        """
+        stat = cover_file.stat()
+        file_key = (stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            checksum = self._checksums.get(file_key)
+            if checksum is not None and checksum in self._covers:
+                self._covers.move_to_end(checksum)
+                return self._covers[checksum]
+
+        cover = Cover(cover_file.read_bytes(), get_cover_mime_type(cover_file))
+        with self._lock:
+            # Identical content may already be there (another file, or another thread).
+            cached_cover = self._covers.get(cover.checksum)
+            if cached_cover is None or cached_cover.mime_type != cover.mime_type:
+                self._add(cover)
+                cached_cover = cover
+            else:
+                self._covers.move_to_end(cover.checksum)
+            self._checksums[file_key] = cover.checksum
+            return cached_cover
+
+    def clear(self) -> None:
+        with self._lock:
+            self._covers.clear()
+            self._checksums.clear()
+            self._size = 0
+
+    def _add(self, cover: Cover) -> None:
+        previous_cover = self._covers.pop(cover.checksum, None)
+        if previous_cover is not None:
+            self._size -= len(previous_cover.data)
+        self._covers[cover.checksum] = cover
+        self._size += len(cover.data)
+        # Keep the latest cover, even if it is larger than the cache.
+        while self._size > self._max_size and len(self._covers) > 1:
+            checksum, evicted_cover = self._covers.popitem(last=False)
+            self._size -= len(evicted_cover.data)
+            self._checksums = {key: value for key, value in self._checksums.items() if value != checksum}
+
+
+def get_cover_mime_type(cover_file: Path) -> str | None:
+    if cover_file.suffix == '.png':
+        return 'image/png'
+    elif cover_file.suffix == '.jpg':
+        return 'image/jpeg'
+    else:
+        return None
+
+
+# Shared by all the tracks and cards of a run.
+cover_cache = CoverCache()
@@ -0,0 +1,351 @@
+#
+# SPDX-License-Identifier: MPL-2.0
+#
+# Copyright (c) 2025-2026 "Laurent Desgrange".
+#
+# This file is part of "toto-backup".
+# See "https://github.com/ldesgrange/toto-backup") for further information.
+#
+# This Source Code Form is subject to the terms of the
+# Mozilla Public License, v. 2.0. If a copy of the MPL
+# was not distributed with this file, You can obtain one
+# at https://mozilla.org/MPL/2.0/.
+#
+import threading
+from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import nullcontext
+from pathlib import Path
+from typing import Any
+
+import structlog
+from requests import Session
+
+from toto_backup.concurrency import ConcurrencyController
+from toto_backup.metrics import Metrics
+from toto_backup.retry import RetryPolicy
+from toto_backup.scratch import ScratchSpace
+from toto_backup.store import ObjectStore
+from toto_backup.utils import download_content, DownloadedContent, HeadRewriter, NotModifiedError
+
+logger = structlog.stdlib.get_logger()
+
+
+class Downloader:
+    """
+    Downloads content for a backup run, sharing one HTTP session and one worker pool between
+    all downloads.
+
+    Identical URLs are fetched only once per run: requesters of a URL already being
+    downloaded wait for that download and reuse its file instead of fetching it again.
+    Requesters must be announced with `expect` for the file to be kept until the last
+    one gets it.
+
+    If a scratch space is provided, downloads are made there under a name derived from their
+    URL, so that an interrupted download is resumed by the next download of the same URL.
+
+    If an object store is provided, downloaded content is moved into it, and content already
+    there is not downloaded again (unless it is being revalidated). Stored files belong to the
+    store: requesters must link or copy them, never move them. Stored content is kept as
+    downloaded, head rewriters are not applied to it. Content modified in place by its
+    requesters is only stored if the store supports clones (see `ObjectStore`).
+
+    If a session is provided, the number of downloads in flight per host adapts to the host
+    (see `ConcurrencyController`), up to `jobs`.
+
+    Downloads are measured in `metrics`, which other phases of the backup run may use too.
+
+    If a retry policy is provided, downloads failing with transient errors are retried before
+    giving up. Content is not downloaded again if it was downloaded successfully in between.
+    """
+
+    def __init__(
+        self,
+        session: Session | None = None,
+        jobs: int = 1,
+        scratch: ScratchSpace | None = None,
+        store: ObjectStore | None = None,
+        retry_policy: RetryPolicy | None = None,
+    ):
+        self._session = session
+        self._jobs = jobs
+        self._scratch = scratch
+        self._store = store
+        self._retry_policy = retry_policy or RetryPolicy(max_attempts=1)
+        self._metrics = Metrics()
+        # Adapting concurrency needs to know about responses, only the session tells.
+        self._concurrency: ConcurrencyController | None = None
+        if session is not None:
+            self._concurrency = ConcurrencyController(jobs)
+            self._concurrency.attach(session)
+        self._executor: ThreadPoolExecutor | None = None
+        self._lock = threading.Lock()
+        # Downloads of this run by URL, with the validators of their first requester.
+        self._downloads: dict[str, tuple[Future[DownloadedContent], dict[str, Any] | None]] = {}
+        # Content downloaded during this run by URL, once downloaded.
+        self._contents: dict[str, DownloadedContent] = {}
+        # Errors of the last failed download of URLs, if it failed during this run.
+        self._errors: dict[str, Exception] = {}
+        # Requesters announced with `expect` not arrived yet, and requesters holding the file.
+        self._expected_counts: Counter[str] = Counter()
+        self._holder_counts: Counter[str] = Counter()
+        # URLs whose content belongs to the store.
+        self._stored_urls: set[str] = set()
+
+    @property
+    def session(self) -> Session | None:
+        return self._session
+
+    @property
+    def jobs(self) -> int:
+        return self._jobs
+
+    @property
+    def retry_policy(self) -> RetryPolicy:
+        return self._retry_policy
+
+    @property
+    def concurrency(self) -> ConcurrencyController | None:
+        return self._concurrency
+
+    @property
+    def metrics(self) -> Metrics:
+        return self._metrics
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        """
+        The worker pool running downloads, created on first use with `jobs` workers.
+        """
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self._jobs, thread_name_prefix='download')
+            return self._executor
+
+    def expect(self, url: str) -> None:
+        """
+        Announces an upcoming download of the given URL.
+
+        :param url: The URL that will be downloaded.
+        """
+        with self._lock:
+            self._expected_counts[url] += 1
+
+    def download(
+        self,
+        url: str,
+        validators: dict[str, Any] | None = None,
+        head_rewriter: HeadRewriter | None = None,
+        modified_in_place: bool = False,
+    ) -> tuple[DownloadedContent, bool]:
+        """
+        Downloads content from a given URL, unless it has already been downloaded or is being
+        downloaded during this run.
+
+        :param url: The URL of the resource to download.
+        :param validators: The validators of a previous download of the content, to only
+            download it if it has been modified.
+        :param head_rewriter: Rewrites the beginning of the content while it is downloaded.
+            Only the rewriter of the requester actually downloading the content is applied,
+            see `get_head_key`.
+        :param modified_in_place: Whether requesters modify the content once they got it
+            (e.g. tracks are tagged), the requester actually downloading it decides.
+        :return: A tuple containing the downloaded content, and whether the caller is the last
+            requester of its file. The last requester owns the file and may move it. Others
+            must link or copy it, without modifying it, then call `release`.
+        :raises NotModifiedError: If the content has not been modified since the previous download.
+        """
+        with self._lock:
+            self._expected_counts[url] -= 1
+            self._holder_counts[url] += 1
+        while True:
+            with self._lock:
+                download = self._downloads.get(url)
+                is_owner = download is None
+                if download is None:
+                    download = (Future(), validators)
+                    self._downloads[url] = download
+            future, owner_validators = download
+
+            try:
+                if is_owner:
+                    try:
+                        content = self._fetch(url, validators, head_rewriter, modified_in_place)
+                    except Exception as e:
+                        future.set_exception(e)
+                        with self._lock:
+                            self._errors[url] = e
+                    else:
+                        future.set_result(content)
+                        self._record(url, content)
+                else:
+                    logger.debug(f'Reusing download of {url}')
+                content = future.result()
+            except NotModifiedError:
+                if is_owner or validators == owner_validators:
+                    # There is no file to hold.
+                    self.release(url)
+                    raise
+                # Not modified for the first requester, but this one needs the content: it is
+                # downloaded again, once for all requesters needing it.
+                with self._lock:
+                    if self._downloads.get(url) is download:
+                        del self._downloads[url]
+                validators = None
+            except Exception:
+                # Failed requesters get no file to hold.
+                self.release(url)
+                raise
+            else:
+                break
+
+        with self._lock:
+            # Last requester to come, and no other one still linking or copying the file.
+            is_last = url not in self._stored_urls and self._expected_counts[url] <= 0 and self._holder_counts[url] == 1
+            if is_last:
+                # Later requesters (if any) will download it again.
+                self._forget(url)
+        return content, is_last
+
+    def release(self, url: str) -> None:
+        """
+        Tells that a requester which is not the last one of the file downloaded from a given
+        URL is done with it. The file is deleted once all requesters are done with it, unless
+        it belongs to the store.
+
+        :param url: The URL of the downloaded resource.
+        """
+        with self._lock:
+            self._holder_counts[url] -= 1
+            if self._holder_counts[url] > 0 or self._expected_counts[url] > 0:
+                return
+            download = self._forget(url)
+            is_stored = url in self._stored_urls
+        if download is not None and not is_stored:
+            future, _ = download
+            if future.done() and future.exception() is None:
+                future.result().file.unlink(missing_ok=True)
+
+    def get_validators(self, url: str) -> dict[str, Any] | None:
+        """
+        Provides the validators of the content downloaded from a given URL during this run.
+
+        :param url: The URL of the downloaded resource.
+        :return: The validators of the content, or `None` if it has not been downloaded.
+        """
+        with self._lock:
+            content = self._contents.get(url)
+        return content.validators if content is not None else None
+
+    def get_head_key(self, url: str) -> str | None:
+        """
+        Provides the key of the head rewriter applied to the content downloaded from a given
+        URL during this run.
+
+        :param url: The URL of the downloaded resource.
+        :return: The key of the head rewriter, or `None` if the content has not been rewritten.
+        """
+        with self._lock:
+            content = self._contents.get(url)
+        return content.head_key if content is not None else None
+
+    def get_checksum(self, url: str) -> str | None:
+        """
+        Provides the SHA-256 checksum of the content downloaded from a given URL during this
+        run, computed while it was downloaded.
+
+        :param url: The URL of the downloaded resource.
+        :return: The checksum of the content, or `None` if it is unknown or the content has
+            not been downloaded.
+        """
+        with self._lock:
+            content = self._contents.get(url)
+        return content.checksum if content is not None else None
+
+    def get_extension(self, url: str) -> str | None:
+        """
+        Provides the extension of the format detected from the content downloaded from a
+        given URL during this run, see `DownloadedContent.extension`.
+
+        :param url: The URL of the downloaded resource.
+        :return: The extension of the content format, or `None` if it is unknown or the content
+            has not been downloaded.
+        """
+        with self._lock:
+            content = self._contents.get(url)
+        return content.extension if content is not None else None
+
+    def get_error(self, url: str) -> Exception | None:
+        """
+        Provides the error of the last download of a given URL, if it failed during this run.
+
+        :param url: The URL of the resource.
+        :return: The error, or `None` if the last download succeeded or there was none.
+        """
+        with self._lock:
+            return self._errors.get(url)
+
+    def _forget(self, url: str) -> tuple[Future[DownloadedContent], dict[str, Any] | None] | None:
+        # Must be called with the lock held.
+        self._expected_counts.pop(url, None)
+        self._holder_counts.pop(url, None)
+        return self._downloads.pop(url, None)
+
+    def _record(self, url: str, content: DownloadedContent) -> None:
+        with self._lock:
+            self._contents[url] = content
+            self._errors.pop(url, None)
+
+    def _fetch(
+        self,
+        url: str,
+        validators: dict[str, Any] | None = None,
+        head_rewriter: HeadRewriter | None = None,
+        modified_in_place: bool = False,
+    ) -> DownloadedContent:
+        if self._store is not None and (not modified_in_place or self._store.clones_supported):
+            with self._lock:
+                self._stored_urls.add(url)
+            if validators is None:
+                stored_content = self._store.find(url)
+                if stored_content is not None:
+                    logger.debug(f'Found {url} in store: {stored_content.file}')
+                    return stored_content
+            content = self._retry_policy.run(lambda: self._download(url, validators), f'download of {url}')
+            return self._store.add(url, content)
+        return self._retry_policy.run(lambda: self._download(url, validators, head_rewriter), f'download of {url}')
+
+    def _download(
+        self,
+        url: str,
+        validators: dict[str, Any] | None = None,
+        head_rewriter: HeadRewriter | None = None,
+    ) -> DownloadedContent:
+        with self._concurrency.slot(url) if self._concurrency is not None else nullcontext():
+            with self._metrics.timer('download'):
+                content = download_content(url, self._session, self._get_partial_file(url), validators, head_rewriter)
+        # Bytes actually received: not the part of a resumed download already there, nor tags written.
+        downloaded_size = content.downloaded_size
+        self._metrics.add('bytes', downloaded_size if downloaded_size is not None else content.file.stat().st_size)
+        return content
+
+    def _get_partial_file(self, url: str) -> Path | None:
+        return self._scratch.get_partial_file(url) if self._scratch is not None else None
+
+    def close(self) -> None:
+        """
+        Stops the worker pool, deletes downloaded files that were never handed to their last
+        requester, and closes the store.
+        """
+        if self._executor is not None:
+            self._executor.shutdown()
+        with self._lock:
+            for url, (future, _) in self._downloads.items():
+                # Stored files are kept, they may be linked by later backups.
+                if url not in self._stored_urls and future.done() and future.exception() is None:
+                    future.result().file.unlink(missing_ok=True)
+            self._downloads.clear()
+            self._expected_counts.clear()
+            self._holder_counts.clear()
+        if self._store is not None:
+            self._store.close()
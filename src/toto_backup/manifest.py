@@ -0,0 +1,197 @@
+#
+# SPDX-License-Identifier: MPL-2.0
+#
+# Copyright (c) 2025-2026 "Laurent Desgrange".
+#
+# This file is part of "toto-backup".
+# See "https://github.com/ldesgrange/toto-backup") for further information.
+#
+# This Source Code Form is subject to the terms of the
+# Mozilla Public License, v. 2.0. If a copy of the MPL
+# was not distributed with this file, You can obtain one
+# at https://mozilla.org/MPL/2.0/.
+#
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Any
+
+import structlog
+
+from toto_backup.utils import compute_checksum, content_url
+
+logger = structlog.stdlib.get_logger()
+
+MANIFEST_FILENAME = '.toto-backup.json'
+MANIFEST_VERSION = 1
+
+
+class Manifest:
+    """
+    Records the content backed up in a card directory (source URL, file name, size, checksum,
+    HTTP validators and tag state), so that an interrupted or partially failed backup can be
+    resumed without downloading again what is already there.
+
+    Content is identified by its destination path (without extension) and source URL, without
+    its query (see `content_url`). The manifest is saved each time an entry is recorded.
+
+    When refreshing, backed-up content is not trusted as is: it must be revalidated against
+    the server using its HTTP validators.
+    """
+
+    def __init__(self, directory: Path, refresh: bool = False):
+        self._file = directory / MANIFEST_FILENAME
+        self._refresh = refresh
+        self._lock = threading.Lock()
+        self._entries: dict[str, dict[str, Any]] = self._load()
+
+    @property
+    def file(self) -> Path:
+        return self._file
+
+    @property
+    def refresh(self) -> bool:
+        return self._refresh
+
+    def find(self, destination: Path, url: str) -> Path | None:
+        """
+        Looks for content already backed up from the given URL, and checks that it has not
+        been modified since. The checksum is only verified if the file size or modification
+        time changed.
+
+        :param destination: The destination path of the content, without extension.
+        :param url: The URL the content must have been downloaded from.
+        :return: The path of the backed-up content, or `None` if it is missing or invalid.
+        """
+        entry = self._get_entry(destination, url)
+        if entry is None:
+            return None
+
+        file = self._file.parent / entry['filename']
+        if not file.is_file():
+            return None
+        stat = file.stat()
+        if stat.st_size != entry.get('size'):
+            return None
+        if stat.st_mtime_ns != entry.get('mtime_ns') and compute_checksum(file) != entry.get('sha256'):
+            return None
+        return file
+
+    def get_validators(self, destination: Path, url: str) -> dict[str, Any] | None:
+        """
+        Provides the HTTP validators of backed-up content, to revalidate it.
+
+        :param destination: The destination path of the content, without extension.
+        :param url: The URL the content has been downloaded from.
+        :return: The validators, or `None` if there are none.
+        """
+        entry = self._get_entry(destination, url)
+        if entry is None or not any(entry.get('validators', {}).values()):
+            return None
+        return dict(entry['validators'])
+
+    def get_tags(self, destination: Path, url: str) -> str | None:
+        """
+        Provides the fingerprint of the tags of backed-up content.
+
+        :param destination: The destination path of the content, without extension.
+        :param url: The URL the content has been downloaded from.
+        :return: The fingerprint of the tags, or `None` if the content has not been tagged.
+        """
+        entry = self._get_entry(destination, url)
+        return entry.get('tags') if entry is not None else None
+
+    def record(  # noqa: PLR0913, PLR0917
+        self,
+        destination: Path,
+        url: str,
+        file: Path,
+        validators: dict[str, Any] | None = None,
+        tags: str | None = None,
+        checksum: str | None = None,
+    ) -> None:
+        """
+        Records content that has been downloaded, and saves the manifest.
+
+        :param destination: The destination path of the content, without extension.
+        :param url: The URL the content has been downloaded from.
+        :param file: The backed-up file, in the card directory.
+        :param validators: The HTTP validators of the content.
+        :param tags: The fingerprint of the tags written while downloading the content, if any.
+        :param checksum: The SHA-256 checksum of the content computed while downloading it, the
+            file is read to compute it if not provided.
+        """
+        entry = self._create_entry(url, file, checksum)
+        if validators is not None:
+            entry['validators'] = validators
+        if tags is not None:
+            entry['tags'] = tags
+        with self._lock:
+            self._entries[self._get_key(destination, url)] = entry
+            self._save()
+
+    def record_tags(self, destination: Path, url: str, file: Path, tags: str) -> None:
+        """
+        Records that backed-up content has been tagged, and saves the manifest.
+
+        :param destination: The destination path of the content, without extension.
+        :param url: The URL the content has been downloaded from.
+        :param file: The tagged file, in the card directory.
+        :param tags: The fingerprint of the tags.
+        """
+        entry = self._create_entry(url, file)
+        entry['tags'] = tags
+        with self._lock:
+            previous_entry = self._entries.get(self._get_key(destination, url), {})
+            if 'validators' in previous_entry:
+                entry['validators'] = previous_entry['validators']
+            self._entries[self._get_key(destination, url)] = entry
+            self._save()
+
+    def _get_entry(self, destination: Path, url: str) -> dict[str, Any] | None:
+        with self._lock:
+            entry = self._entries.get(self._get_key(destination, url))
+        if entry is None or content_url(entry.get('url') or '') != content_url(url):
+            return None
+        return entry
+
+    @staticmethod
+    def _get_key(destination: Path, url: str) -> str:
+        return f'{destination.name} <{content_url(url)}>'
+
+    @staticmethod
+    def _create_entry(url: str, file: Path, checksum: str | None = None) -> dict[str, Any]:
+        stat = file.stat()
+        return {
+            'url': url,
+            'filename': file.name,
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'sha256': checksum or compute_checksum(file),
+        }
+
+    def _load(self) -> dict[str, dict[str, Any]]:
+        if not self._file.exists():
+            return {}
+        try:
+            content = json.loads(self._file.read_text(encoding='utf-8'))
+        except ValueError:
+            logger.warning(f'Ignoring unreadable manifest: {self._file}')
+            return {}
+        if not isinstance(content, dict) or content.get('version') != MANIFEST_VERSION:
+            logger.warning(f'Ignoring unsupported manifest: {self._file}')
+            return {}
+        entries = {}
+        for key, entry in content.get('entries', {}).items():
+            # Keys of older manifests have the whole URL, with its query.
+            name = key.rpartition(' <')[0]
+            entries[self._get_key(Path(name), entry.get('url') or '')] = entry
+        return entries
+
+    def _save(self) -> None:
+        content = json.dumps({'version': MANIFEST_VERSION, 'entries': self._entries}, indent=2, ensure_ascii=False)
+        # Write then rename, so an interruption never leaves a truncated manifest.
+        temporary_file = self._file.with_name(f'{self._file.name}.tmp')
+        temporary_file.write_text(content, encoding='utf-8')
+        os.replace(temporary_file, self._file)
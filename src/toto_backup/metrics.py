@@ -0,0 +1,180 @@
+#
+# SPDX-License-Identifier: MPL-2.0
+#
+# Copyright (c) 2025-2026 "Laurent Desgrange".
+#
+# This file is part of "toto-backup".
+# See "https://github.com/ldesgrange/toto-backup") for further information.
+#
+# This Source Code Form is subject to the terms of the
+# Mozilla Public License, v. 2.0. If a copy of the MPL
+# was not distributed with this file, You can obtain one
+# at https://mozilla.org/MPL/2.0/.
+#
+import json
+import math
+import os
+import threading
+import time
+from collections import Counter, defaultdict
+from collections.abc import Iterator
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any
+
+# Prefix of the Prometheus metric names.
+METRIC_PREFIX = 'toto_backup'
+
+
+class Metrics:
+    """
+    Measures a backup run: the duration of each phase (fetching pages, downloading, tagging…),
+    the number of bytes downloaded, and counters such as retries or connections.
+
+    Metrics are recorded from any thread, and summarized at the end of the run (see `summary`),
+    as JSON or in the Prometheus text format (for the textfile collector of the node exporter).
+    """
+
+    def __init__(self) -> None:
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+        self._durations: defaultdict[str, list[float]] = defaultdict(list)
+        self._counters: Counter[str] = Counter()
+        self._concurrency_windows: dict[str, int] = {}
+
+    @contextmanager
+    def timer(self, phase: str) -> Iterator[None]:
+        """
+        Measures the duration of a phase, whether it succeeds or not.
+
+        :param phase: The name of the phase.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(phase, time.perf_counter() - start)
+
+    def record(self, phase: str, duration: float) -> None:
+        """
+        Records the duration of a phase.
+
+        :param phase: The name of the phase.
+        :param duration: The duration, in seconds.
+        """
+        with self._lock:
+            self._durations[phase].append(duration)
+
+    def add(self, counter: str, value: int = 1) -> None:
+        """
+        Increments a counter (e.g. `bytes`, `retries`).
+
+        :param counter: The name of the counter.
+        :param value: The increment.
+        """
+        with self._lock:
+            self._counters[counter] += value
+
+    def set_concurrency_windows(self, windows: dict[str, int]) -> None:
+        with self._lock:
+            self._concurrency_windows = dict(windows)
+
+    def summary(self) -> dict[str, Any]:
+        """
+        Summarizes the run so far.
+
+        :return: The duration of the run, the count, total and median/95th percentile durations
+            of each phase, the bytes downloaded and the effective throughput (bytes per second
+            over the whole run), the number of retries, HTTP connections opened and reused, and
+            the download concurrency of each host.
+        """
+        duration = time.perf_counter() - self._start
+        with self._lock:
+            phases = {
+                phase: {
+                    'count': len(durations),
+                    'total': sum(durations),
+                    'p50': _percentile(durations, 0.5),
+                    'p95': _percentile(durations, 0.95),
+                }
+                for phase, durations in sorted(self._durations.items())
+            }
+            counters = Counter(self._counters)
+            concurrency_windows = dict(self._concurrency_windows)
+        return {
+            'duration': duration,
+            'phases': phases,
+            'bytes': counters['bytes'],
+            'throughput': counters['bytes'] / duration if duration else 0.0,
+            'retries': counters['retries'],
+            'connections': {'opened': counters['connections_opened'], 'reused': counters['connections_reused']},
+            'concurrency': concurrency_windows,
+        }
+
+    def write_json(self, file: Path) -> None:
+        _write_atomically(file, json.dumps(self.summary(), indent=2))
+
+    def write_prometheus(self, file: Path) -> None:
+        """
+        Writes the summary in the Prometheus text format. The file is replaced atomically, as
+        expected by the textfile collector.
+        """
+        _write_atomically(file, format_prometheus(self.summary()))
+
+
+def format_prometheus(summary: dict[str, Any]) -> str:
+    """
+    Formats a summary of metrics (see `Metrics.summary`) in the Prometheus text format.
+    """
+    lines = [
+        f'# HELP {METRIC_PREFIX}_phase_duration_seconds Duration of the phases of the backup.',
+        f'# TYPE {METRIC_PREFIX}_phase_duration_seconds summary',
+    ]
+    for phase, phase_summary in summary['phases'].items():
+        labels = f'phase="{phase}"'
+        lines += [
+            f'{METRIC_PREFIX}_phase_duration_seconds{{{labels},quantile="0.5"}} {phase_summary["p50"]}',
+            f'{METRIC_PREFIX}_phase_duration_seconds{{{labels},quantile="0.95"}} {phase_summary["p95"]}',
+            f'{METRIC_PREFIX}_phase_duration_seconds_sum{{{labels}}} {phase_summary["total"]}',
+            f'{METRIC_PREFIX}_phase_duration_seconds_count{{{labels}}} {phase_summary["count"]}',
+        ]
+    lines += [
+        f'# HELP {METRIC_PREFIX}_duration_seconds Duration of the backup.',
+        f'# TYPE {METRIC_PREFIX}_duration_seconds gauge',
+        f'{METRIC_PREFIX}_duration_seconds {summary["duration"]}',
+        f'# HELP {METRIC_PREFIX}_downloaded_bytes Bytes downloaded.',
+        f'# TYPE {METRIC_PREFIX}_downloaded_bytes gauge',
+        f'{METRIC_PREFIX}_downloaded_bytes {summary["bytes"]}',
+        f'# HELP {METRIC_PREFIX}_throughput_bytes_per_second Bytes downloaded per second over the whole backup.',
+        f'# TYPE {METRIC_PREFIX}_throughput_bytes_per_second gauge',
+        f'{METRIC_PREFIX}_throughput_bytes_per_second {summary["throughput"]}',
+        f'# HELP {METRIC_PREFIX}_retries Downloads retried after a transient error.',
+        f'# TYPE {METRIC_PREFIX}_retries gauge',
+        f'{METRIC_PREFIX}_retries {summary["retries"]}',
+        f'# HELP {METRIC_PREFIX}_http_connections HTTP connections opened, and reused for another request.',
+        f'# TYPE {METRIC_PREFIX}_http_connections gauge',
+        f'{METRIC_PREFIX}_http_connections{{state="opened"}} {summary["connections"]["opened"]}',
+        f'{METRIC_PREFIX}_http_connections{{state="reused"}} {summary["connections"]["reused"]}',
+        f'# HELP {METRIC_PREFIX}_concurrency_window Downloads allowed in flight per host at the end of the backup.',
+        f'# TYPE {METRIC_PREFIX}_concurrency_window gauge',
+    ]
+    lines += [
+        f'{METRIC_PREFIX}_concurrency_window{{host="{host}"}} {window}'
+        for host, window in summary['concurrency'].items()
+    ]
+    return '\n'.join(lines) + '\n'
+
+
+def _percentile(values: list[float], percentile: float) -> float:
+    # Nearest-rank method: an actual value, never interpolated.
+    if not values:
+        return 0.0
+    sorted_values = sorted(values)
+    return sorted_values[max(0, math.ceil(percentile * len(sorted_values)) - 1)]
+
+
+def _write_atomically(file: Path, content: str) -> None:
+    # Write then rename, so that readers never see a truncated file.
+    temporary_file = file.with_name(f'.{file.name}.tmp')
+    temporary_file.write_text(content, encoding='utf-8')
+    os.replace(temporary_file, file)
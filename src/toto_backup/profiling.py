@@ -0,0 +1,128 @@
+#
+# SPDX-License-Identifier: MPL-2.0
+#
+# Copyright (c) 2025-2026 "Laurent Desgrange".
+#
+# This file is part of "toto-backup".
+# See "https://github.com/ldesgrange/toto-backup") for further information.
+#
+# This Source Code Form is subject to the terms of the
+# Mozilla Public License, v. 2.0. If a copy of the MPL
+# was not distributed with this file, You can obtain one
+# at https://mozilla.org/MPL/2.0/.
+#
+import cProfile
+import profile
+import pstats
+import sys
+import threading
+from collections.abc import Iterator
+from contextlib import contextmanager
+from pathlib import Path
+from pstats import SortKey
+from types import FrameType
+from typing import Any, ClassVar, TextIO
+
+# Number of functions listed in the summary of a profile.
+PROFILE_TOP_COUNT = 30
+# Since Python 3.12, cProfile profiles all threads at once (with `sys.monitoring`), mixing up
+# their calls. Each thread is then profiled with the pure Python profiler instead.
+CPROFILE_PER_THREAD = sys.version_info < (3, 12)
+
+
+class _ThreadProfile(profile.Profile):
+    """
+    Profile of the current thread with the pure Python profiler, started in the middle of
+    it: returns from the frames entered before are ignored.
+    """
+
+    def trace_dispatch_return(self, frame: FrameType, t: float) -> int:
+        parent_frame = self.cur[-2]  # type: ignore[attr-defined]
+        if frame is not parent_frame and frame is not parent_frame.f_back:
+            return 0
+        return super().trace_dispatch_return(frame, t)  # type: ignore[misc]
+
+    dispatch: ClassVar[dict[str, Any]] = {
+        **profile.Profile.dispatch,  # type: ignore[attr-defined]
+        'return': trace_dispatch_return,
+        'c_exception': trace_dispatch_return,
+        'c_return': trace_dispatch_return,
+    }
+
+
+class Profiler:
+    """
+    Profiles the program, including the threads started while it runs (download workers,
+    card workers…). Each thread gets its own profile, so that the calls of concurrent threads
+    are not mixed up.
+
+    Threads are profiled with cProfile until Python 3.11. Since Python 3.12, they are profiled
+    with the pure Python profiler: the program runs much slower, so durations are inflated
+    (mostly for functions making many calls), but call counts and call trees are exact.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._profiles: list[cProfile.Profile | profile.Profile] = []
+
+    def start(self) -> None:
+        self._start_profile()
+        # Called in each thread started from now on, at its first event.
+        threading.setprofile(self._profile_thread)
+
+    def stop(self, stream: TextIO | None = None) -> pstats.Stats:
+        """
+        Stops profiling.
+
+        :param stream: The stream the statistics are printed to, standard output by default.
+        :return: The statistics of all the threads profiled.
+        """
+        threading.setprofile(None)
+        if not CPROFILE_PER_THREAD:
+            sys.setprofile(None)
+        with self._lock:
+            profiles = list(self._profiles)
+        # Creating the statistics of a profile disables it.
+        stats = pstats.Stats(profiles[0], stream=stream)
+        for thread_profile in profiles[1:]:
+            stats.add(thread_profile)
+        return stats
+
+    def _start_profile(self) -> cProfile.Profile | profile.Profile:
+        thread_profile: cProfile.Profile | profile.Profile
+        if CPROFILE_PER_THREAD:
+            thread_profile = cProfile.Profile()
+            thread_profile.enable()
+        else:
+            thread_profile = _ThreadProfile()
+            sys.setprofile(thread_profile.dispatcher)  # type: ignore[attr-defined]
+        with self._lock:
+            self._profiles.append(thread_profile)
+        return thread_profile
+
+    def _profile_thread(self, frame: FrameType, event: str, arg: Any) -> None:
+        # Replaces this hook with a profiler of the current thread.
+        sys.setprofile(None)
+        thread_profile = self._start_profile()
+        if isinstance(thread_profile, _ThreadProfile):
+            # The pure Python profiler must see the call of the thread function, to see its return.
+            thread_profile.dispatcher(frame, event, arg)  # type: ignore[attr-defined]
+
+
+@contextmanager
+def profiled(file: Path, top_count: int = PROFILE_TOP_COUNT, stream: TextIO | None = None) -> Iterator[None]:
+    """
+    Profiles a block of code, even if it fails or exits.
+
+    :param file: The file to write the statistics to, for `pstats` or tools such as snakeviz.
+    :param top_count: The number of functions to list in the summary, by cumulative time.
+    :param stream: The stream to write the summary to, standard error by default.
+    """
+    profiler = Profiler()
+    profiler.start()
+    try:
+        yield
+    finally:
+        stats = profiler.stop(stream or sys.stderr)
+        stats.dump_stats(file)
+        stats.sort_stats(SortKey.CUMULATIVE).print_stats(top_count)
@@ -0,0 +1,148 @@
+#
+# SPDX-License-Identifier: MPL-2.0
+#
+# Copyright (c) 2025-2026 "Laurent Desgrange".
+#
+# This file is part of "toto-backup".
+# See "https://github.com/ldesgrange/toto-backup") for further information.
+#
+# This Source Code Form is subject to the terms of the
+# Mozilla Public License, v. 2.0. If a copy of the MPL
+# was not distributed with this file, You can obtain one
+# at https://mozilla.org/MPL/2.0/.
+#
+import random
+import threading
+import time
+from collections.abc import Callable
+from email.utils import parsedate_to_datetime
+from http import HTTPStatus
+from typing import TypeVar
+
+import requests
+import structlog
+from requests import HTTPError, Timeout
+from requests.exceptions import ChunkedEncodingError, ContentDecodingError
+
+logger = structlog.stdlib.get_logger()
+
+T = TypeVar('T')
+
+# Errors of the server or of an intermediary that usually go away by themselves.
+RETRYABLE_STATUS_CODES = {
+    HTTPStatus.REQUEST_TIMEOUT,
+    HTTPStatus.TOO_MANY_REQUESTS,
+    HTTPStatus.INTERNAL_SERVER_ERROR,
+    HTTPStatus.BAD_GATEWAY,
+    HTTPStatus.SERVICE_UNAVAILABLE,
+    HTTPStatus.GATEWAY_TIMEOUT,
+}
+# Network errors: the connection failed, timed out, or was dropped during the transfer.
+RETRYABLE_ERRORS = (requests.ConnectionError, Timeout, ChunkedEncodingError, ContentDecodingError)
+
+
+class RetryPolicy:
+    """
+    Retries operations failing with transient errors (network errors, and HTTP errors such as
+    "503 Service Unavailable"), waiting longer after each attempt. Other errors (e.g. "404 Not
+    Found") are raised immediately.
+
+    The delay before each retry grows exponentially from `base_delay`, up to `max_delay`, and
+    is randomized (full jitter) so that concurrent downloads failing together do not retry
+    together. A delay requested by the server with a `Retry-After` header is honoured, up to
+    `max_delay`.
+    """
+
+    def __init__(
+        self,
+        max_attempts: int = 3,
+        base_delay: float = 0.5,
+        max_delay: float = 30,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        self._max_attempts = max_attempts
+        self._base_delay = base_delay
+        self._max_delay = max_delay
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._retry_count = 0
+
+    @property
+    def max_attempts(self) -> int:
+        return self._max_attempts
+
+    @property
+    def retry_count(self) -> int:
+        """
+        The number of retries made so far with this policy.
+        """
+        with self._lock:
+            return self._retry_count
+
+    def run(self, operation: Callable[[], T], description: str = 'operation') -> T:
+        """
+        Runs an operation, retrying it while it fails with a retryable error.
+
+        :param operation: The operation to run.
+        :param description: The description of the operation, for logs.
+        :return: The result of the operation.
+        :raises Exception: The error of the last attempt, or the first error that is not retryable.
+        """
+        attempt = 1
+        while True:
+            try:
+                return operation()
+            except Exception as e:
+                if attempt >= self._max_attempts or not is_retryable(e):
+                    raise
+                delay = self.get_delay(attempt, e)
+                logger.info(
+                    f'Attempt {attempt}/{self._max_attempts} of {description} failed ({e}), retrying in {delay:.1f}s.'
+                )
+            self._sleep(delay)
+            attempt += 1
+            with self._lock:
+                self._retry_count += 1
+
+    def get_delay(self, attempt: int, error: Exception) -> float:
+        """
+        Computes the delay before retrying after a failed attempt.
+
+        :param attempt: The number of the failed attempt, starting from 1.
+        :param error: The error of the failed attempt.
+        :return: The delay in seconds.
+        """
+        retry_after = get_retry_after(error)
+        if retry_after is not None:
+            return min(retry_after, self._max_delay)
+        return random.uniform(0, min(self._max_delay, self._base_delay * 2 ** (attempt - 1)))
+
+
+def is_retryable(error: BaseException | None) -> bool:
+    """
+    Tells whether an operation failing with a given error may succeed if it is retried.
+    """
+    if isinstance(error, HTTPError):
+        return error.response is not None and error.response.status_code in RETRYABLE_STATUS_CODES
+    return isinstance(error, RETRYABLE_ERRORS)
+
+
+def get_retry_after(error: Exception) -> float | None:
+    """
+    Provides the delay requested by the server before retrying, from the `Retry-After` header
+    of an HTTP error (a number of seconds, or a date).
+
+    :return: The delay in seconds, or `None` if there is none.
+    """
+    if not isinstance(error, HTTPError) or error.response is None:
+        return None
+    value = error.response.headers.get('Retry-After')
+    if not value:
+        return None
+    if value.strip().isdigit():
+        return float(value)
+    try:
+        date = parsedate_to_datetime(value)
+    except ValueError:
+        return None
+    return max(0.0, date.timestamp() - time.time())
@@ -0,0 +1,99 @@
+#
+# SPDX-License-Identifier: MPL-2.0
+#
+# Copyright (c) 2025-2026 "Laurent Desgrange".
+#
+# This file is part of "toto-backup".
+# See "https://github.com/ldesgrange/toto-backup") for further information.
+#
+# This Source Code Form is subject to the terms of the
+# Mozilla Public License, v. 2.0. If a copy of the MPL
+# was not distributed with this file, You can obtain one
+# at https://mozilla.org/MPL/2.0/.
+#
+import hashlib
+import time
+from pathlib import Path
+
+import structlog
+
+from toto_backup.utils import content_url
+
+logger = structlog.stdlib.get_logger()
+
+PARTIAL_FILE_SUFFIX = '.part'
+PARTIAL_INFO_FILE_SUFFIX = '.part.json'
+# Files left by another run are only deleted once they have not been modified for this long,
+# so that runs sharing a scratch directory do not delete each other's downloads.
+ORPHAN_MIN_AGE = 60 * 60
+# Interrupted downloads are kept this long to be resumed, then deleted.
+PARTIAL_FILE_MAX_AGE = 7 * 24 * 60 * 60
+
+
+class ScratchSpace:
+    """
+    The directory downloads are made into before being moved to their destination.
+
+    It should be on the same filesystem as the card directories (and the object store, if
+    any), so that finished downloads are moved with a simple rename instead of being copied.
+
+    Each URL is downloaded into its own partial file, kept if the download is interrupted so
+    that the next download of the same URL resumes it. Files that will never be used again
+    (finished downloads never moved, resume information without its download, downloads
+    interrupted too long ago) are deleted when the scratch space is opened.
+    """
+
+    def __init__(self, directory: Path):
+        self._directory = directory
+        directory.mkdir(parents=True, exist_ok=True)
+        self.clean()
+
+    @property
+    def directory(self) -> Path:
+        return self._directory
+
+    def get_partial_file(self, url: str) -> Path:
+        """
+        Provides the file the content of a given URL is downloaded into. URLs of the same
+        content (see `content_url`) share their file, so that a download interrupted with an
+        expired URL is resumed with a new one.
+
+        :param url: The URL of the content.
+        :return: The partial file, it may contain an interrupted download of the URL.
+        """
+        return self._directory / f'{hashlib.sha256(content_url(url).encode("utf-8")).hexdigest()}{PARTIAL_FILE_SUFFIX}'
+
+    def clean(self) -> None:
+        """
+        Deletes orphan files from the scratch space.
+        """
+        now = time.time()
+        for file in self._directory.iterdir():
+            if not file.name.endswith((PARTIAL_FILE_SUFFIX, PARTIAL_INFO_FILE_SUFFIX)):
+                continue
+            try:
+                age = now - file.stat().st_mtime
+            except FileNotFoundError:
+                continue
+            if age > PARTIAL_FILE_MAX_AGE or (age > ORPHAN_MIN_AGE and self._is_orphan(file)):
+                logger.debug(f'Deleting orphan scratch file: {file}')
+                file.unlink(missing_ok=True)
+
+    def close(self) -> None:
+        """
+        Deletes the scratch directory if nothing is left to resume in it.
+        """
+        self.clean()
+        try:
+            self._directory.rmdir()
+        except OSError:
+            # Not empty.
+            pass
+
+    @staticmethod
+    def _is_orphan(file: Path) -> bool:
+        if file.name.endswith(PARTIAL_INFO_FILE_SUFFIX):
+            # Resume information without its download.
+            return not file.with_name(file.name.removesuffix('.json')).exists()
+        # Download without resume information: it finished, but was never moved.
+        return not file.with_name(f'{file.name}.json').exists()
@@ -0,0 +1,195 @@
+#
+# SPDX-License-Identifier: MPL-2.0
+#
+# Copyright (c) 2025-2026 "Laurent Desgrange".
+#
+# This file is part of "toto-backup".
+# See "https://github.com/ldesgrange/toto-backup") for further information.
+#
+# This Source Code Form is subject to the terms of the
+# Mozilla Public License, v. 2.0. If a copy of the MPL
+# was not distributed with this file, You can obtain one
+# at https://mozilla.org/MPL/2.0/.
+#
+import json
+import os
+import shutil
+import threading
+from pathlib import Path
+from typing import Any
+from uuid import uuid4
+
+import structlog
+
+from toto_backup.utils import compute_checksum, content_url, DownloadedContent
+
+logger = structlog.stdlib.get_logger()
+
+STORE_INDEX_FILENAME = 'index.json'
+# Index entries added since the index file was last written, one JSON object per line.
+STORE_JOURNAL_FILENAME = 'index.journal'
+STORE_INDEX_VERSION = 1
+
+
+class ObjectStore:
+    """
+    Stores downloaded content once, whatever the number of cards or URLs it comes from.
+
+    Objects are files named after the SHA-256 checksum of their content, in the `objects`
+    directory of the store. An index maps the URLs content has been downloaded from (see
+    `content_url`) to their object, MIME type and HTTP validators, so that content already in
+    the store does not need to be downloaded again.
+
+    Card directories get links to the objects: objects must never be modified in place.
+    Content modified in place once in a card directory (e.g. tagged tracks) cannot be hard
+    linked, it is only worth storing if objects can be cloned into card directories: it would
+    take twice its size otherwise.
+
+    Entries added to the index are appended to a journal, so that adding content does not
+    rewrite the whole index. The journal is merged into the index file when the store is
+    opened and closed. Several processes may share a store: an index entry lost when they
+    merge the journal at the same time only means its content is downloaded again (and
+    found identical to the stored object).
+    """
+
+    def __init__(self, directory: Path, clones_supported: bool = False):
+        self._directory = directory
+        self._clones_supported = clones_supported
+        self._objects_directory = directory / 'objects'
+        self._objects_directory.mkdir(parents=True, exist_ok=True)
+        self._index_file = directory / STORE_INDEX_FILENAME
+        self._journal_file = directory / STORE_JOURNAL_FILENAME
+        self._lock = threading.Lock()
+        self._entries: dict[str, dict[str, Any]] = self._load()
+        self._entries.update(self._read_journal(self._journal_file))
+        # Merge the journal of previous runs, so that it does not grow forever.
+        self._compact()
+
+    @property
+    def directory(self) -> Path:
+        return self._directory
+
+    @property
+    def clones_supported(self) -> bool:
+        """
+        Whether objects can be cloned into card directories (see `can_clone_files`).
+        """
+        return self._clones_supported
+
+    def find(self, url: str) -> DownloadedContent | None:
+        """
+        Looks for content downloaded from the given URL in the store.
+
+        :param url: The URL of the content.
+        :return: The stored content, or `None` if it is not in the store.
+        """
+        with self._lock:
+            entry = self._entries.get(content_url(url))
+        if entry is None:
+            return None
+        file = self._get_object_file(entry['sha256'])
+        if not file.is_file() or file.stat().st_size != entry.get('size'):
+            return None
+        return DownloadedContent(
+            file,
+            entry.get('mime_type'),
+            dict(entry.get('validators', {})),
+            entry['sha256'],
+            extension=entry.get('extension'),
+        )
+
+    def add(self, url: str, content: DownloadedContent) -> DownloadedContent:
+        """
+        Moves downloaded content into the store, unless identical content is already there,
+        and records the URL it has been downloaded from.
+
+        :param url: The URL the content has been downloaded from.
+        :param content: The downloaded content, its file is moved or deleted.
+        :return: The stored content.
+        """
+        checksum = content.checksum or compute_checksum(content.file)
+        file = self._get_object_file(checksum)
+        file.parent.mkdir(exist_ok=True)
+        # Move the content next to its object first (it may come from another filesystem), so
+        # that publishing it is atomic.
+        temporary_file = file.with_name(f'{file.name}.{uuid4()}.tmp')
+        shutil.move(content.file, temporary_file)
+        with self._lock:
+            if file.exists():
+                logger.debug(f'Content of {url} already stored: {file}')
+                temporary_file.unlink()
+            else:
+                os.replace(temporary_file, file)
+            entry = {
+                'sha256': checksum,
+                'size': file.stat().st_size,
+                'mime_type': content.mime_type,
+                'validators': content.validators,
+                'extension': content.extension,
+            }
+            self._entries[content_url(url)] = entry
+            with open(self._journal_file, 'a', encoding='utf-8') as journal:
+                journal.write(json.dumps({'url': url, **entry}, ensure_ascii=False) + '\n')
+        return DownloadedContent(file, content.mime_type, content.validators, checksum, extension=content.extension)
+
+    def close(self) -> None:
+        """
+        Merges the entries added during this run into the index file.
+        """
+        with self._lock:
+            self._compact()
+
+    def _get_object_file(self, checksum: str) -> Path:
+        # Spread objects in subdirectories, to keep directories small.
+        return self._objects_directory / checksum[:2] / checksum[2:]
+
+    def _load(self) -> dict[str, dict[str, Any]]:
+        if not self._index_file.exists():
+            return {}
+        try:
+            content = json.loads(self._index_file.read_text(encoding='utf-8'))
+        except ValueError:
+            logger.warning(f'Ignoring unreadable store index: {self._index_file}')
+            return {}
+        if not isinstance(content, dict) or content.get('version') != STORE_INDEX_VERSION:
+            logger.warning(f'Ignoring unsupported store index: {self._index_file}')
+            return {}
+        return {content_url(url): entry for url, entry in content.get('entries', {}).items()}
+
+    @staticmethod
+    def _read_journal(journal_file: Path) -> dict[str, dict[str, Any]]:
+        entries = {}
+        try:
+            lines = journal_file.read_text(encoding='utf-8').splitlines()
+        except FileNotFoundError:
+            return {}
+        for line in lines:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # Truncated by an interruption.
+                continue
+            if isinstance(entry, dict) and isinstance(entry.get('url'), str):
+                entries[content_url(entry.pop('url'))] = entry
+        return entries
+
+    def _compact(self) -> None:
+        # Take the journal over first: entries added meanwhile (by other processes) go to a new one.
+        journal_file = self._journal_file.with_name(f'{self._journal_file.name}.{uuid4()}.tmp')
+        try:
+            os.replace(self._journal_file, journal_file)
+        except FileNotFoundError:
+            return
+        # The index file may have been updated by other processes since it was loaded.
+        entries = self._load()
+        entries.update(self._read_journal(journal_file))
+        self._save(entries)
+        journal_file.unlink()
+
+    def _save(self, entries: dict[str, dict[str, Any]]) -> None:
+        content = json.dumps({'version': STORE_INDEX_VERSION, 'entries': entries}, indent=2, ensure_ascii=False)
+        # Write then rename, so an interruption never leaves a truncated index. Temporary files
+        # are unique, processes sharing the store must not write into each other's.
+        temporary_file = self._index_file.with_name(f'{self._index_file.name}.{uuid4()}.tmp')
+        temporary_file.write_text(content, encoding='utf-8')
+        os.replace(temporary_file, self._index_file)
@@ -11,43 +11,107 @@
 # was not distributed with this file, You can obtain one
 # at https://mozilla.org/MPL/2.0/.
 #
-import base64
+from __future__ import annotations
+
+import hashlib
+import io
+import json
 from pathlib import Path
+from typing import TYPE_CHECKING
 
 import structlog
-from mutagen.easyid3 import EasyID3
-from mutagen.flac import Picture
-from mutagen.id3 import ID3, Encoding, APIC, PictureType
-from mutagen.ogg import OggFileType
-from mutagen.oggopus import OggOpus, OggOpusHeaderError
-from mutagen.mp4 import MP4Tags, MP4Cover
-from mutagen.oggvorbis import OggVorbis, OggVorbisHeaderError
+from mutagen import MutagenError, PaddingInfo
+
+from toto_backup.cover import cover_cache
+from toto_backup.utils import is_mpeg_audio_frame, sniff_extension
+
+# Format-specific modules of mutagen are slow to import: they are only imported when a track of
+# their format is tagged.
+if TYPE_CHECKING:
+    from mutagen.id3 import ID3
+    from mutagen.ogg import OggFileType
 
 logger = structlog.stdlib.get_logger()
 
+# Padding reserved in tags, so that they can be updated (e.g. when metadata or cover change)
+# without rewriting the whole file.
+TAG_PADDING = 16 * 1024
+# Number of bytes read to detect the format of a track.
+SNIFF_SIZE = 4096
+ID3_HEADER_SIZE = 10
+ID3_FOOTER_FLAG = 0x10
+
 
 class Metadata:
-    author: str | None = None
-    title: str | None = None
-    track_name: str | None = None
-    track_number: int | None = None
-    track_total: int | None = None
-    disc_number: int | None = None
-    disc_total: int | None = None
-    cover_file: Path | None = None
-    card_url: str | None = None
-
-
-def tag_track(track_file: Path, track_metadata: Metadata) -> None:
-    if track_file.suffix == '.m4a':
+    __slots__ = (
+        'author',
+        'card_url',
+        'cover_file',
+        'disc_number',
+        'disc_total',
+        'title',
+        'track_name',
+        'track_number',
+        'track_total',
+    )
+
+    def __init__(self) -> None:
+        self.author: str | None = None
+        self.title: str | None = None
+        self.track_name: str | None = None
+        self.track_number: int | None = None
+        self.track_total: int | None = None
+        self.disc_number: int | None = None
+        self.disc_total: int | None = None
+        self.cover_file: Path | None = None
+        self.card_url: str | None = None
+
+
+def get_metadata_fingerprint(track_metadata: Metadata) -> str:
+    """
+    Computes a fingerprint of the metadata, to detect tracks whose tags are out of date. The
+    content of the cover file is part of the fingerprint.
+    """
+    values = [
+        track_metadata.author,
+        track_metadata.title,
+        track_metadata.track_name,
+        track_metadata.track_number,
+        track_metadata.track_total,
+        track_metadata.disc_number,
+        track_metadata.disc_total,
+        cover_cache.get(track_metadata.cover_file).checksum if track_metadata.cover_file else None,
+        track_metadata.card_url,
+    ]
+    return hashlib.sha256(json.dumps(values).encode('utf-8')).hexdigest()
+
+
+def tag_track(track_file: Path, track_metadata: Metadata, track_format: str | None = None) -> None:
+    """
+    Tags a track according to its actual format, whatever its extension.
+
+    :param track_file: The track to tag.
+    :param track_metadata: The metadata to write in the tags.
+    :param track_format: The extension of the format of the track, as detected when it was
+        downloaded. If not provided, it is detected from the first bytes of the file, then
+        from its extension.
+    """
+    if track_format is None:
+        with open(track_file, 'rb') as file:
+            track_format = sniff_extension(file.read(SNIFF_SIZE)) or track_file.suffix
+    if track_format in ['.m4a', '.mp4']:
         add_mp4_tags(track_file, track_metadata)
-    elif track_file.suffix == '.mp3':
+    elif track_format == '.mp3':
         add_id3_tags(track_file, track_metadata)
-    elif track_file.suffix in ['.ogg', '.oga', '.opus']:
+    elif track_format in ['.ogg', '.oga', '.opus']:
         add_ogg_tags(track_file, track_metadata)
+    else:
+        logger.warning(f'Failed to tag track of unsupported format {track_format}: {track_file}')
 
 
 def add_mp4_tags(track_file: Path, track_metadata: Metadata) -> None:
+    from mutagen.mp4 import MP4Tags  # noqa: PLC0415
+
     tags = MP4Tags()
     # See https://mutagen.readthedocs.io/en/latest/api/mp4.html#mutagen.mp4.MP4Tags
     if track_metadata.author:
@@ -65,59 +129,116 @@ def add_mp4_tags(track_file: Path, track_metadata: Metadata) -> None:
     if track_metadata.disc_number and track_metadata.disc_total:
         tags['disk'] = [(track_metadata.disc_number, track_metadata.disc_total)]
     if track_metadata.cover_file:
-        with open(track_metadata.cover_file, 'rb') as icon_file:
-            # Determine file format.
-            image_format = None
-            if track_metadata.cover_file.suffix == '.png':
-                image_format = MP4Cover.FORMAT_PNG
-            elif track_metadata.cover_file.suffix == '.jpg':
-                image_format = MP4Cover.FORMAT_JPEG
-            # Add cover.
-            if image_format is not None:
-                tags['covr'] = [MP4Cover(icon_file.read(), imageformat=image_format)]
-            else:
-                logger.warning(f'Unsupported cover file format: {track_metadata.cover_file}')
+        mp4_cover = cover_cache.get(track_metadata.cover_file).mp4_cover
+        # Add cover.
+        if mp4_cover is not None:
+            tags['covr'] = [mp4_cover]
+        else:
+            logger.warning(f'Unsupported cover file format: {track_metadata.cover_file}')
     # Save tags to file.
-    tags.save(track_file)
+    tags.save(track_file, padding=_reserve_padding)
 
 
 def add_id3_tags(track_file: Path, track_metadata: Metadata) -> None:
-    tags = EasyID3(track_file)
+    """
+    Writes ID3 tags, including the cover, in a single save.
+    """
+    from mutagen.id3 import ID3, ID3NoHeaderError  # noqa: PLC0415
+
+    try:
+        tags = ID3(track_file)
+    except ID3NoHeaderError:
+        tags = ID3()
+    _set_id3_frames(tags, track_metadata)
+    # Save tags to file.
+    tags.save(track_file, padding=_reserve_padding)
+
+
+class Id3TagInjector:
+    """
+    Adds ID3 tags to an MP3 track while it is downloaded (see `HeadRewriter`): the tags are
+    written in front of the audio data, merged with the ID3 tag of the downloaded track if it
+    has one. Other formats are left as is, to be tagged with `tag_track` once downloaded.
+    """
+
+    def __init__(self, track_metadata: Metadata):
+        self._track_metadata = track_metadata
+        self._key = get_metadata_fingerprint(track_metadata)
+
+    @property
+    def key(self) -> str:
+        """
+        The fingerprint of the metadata written in the tags.
+        """
+        return self._key
+
+    def rewrite_head(self, head: bytes) -> tuple[bytes, int] | None:
+        if len(head) < ID3_HEADER_SIZE:
+            return None
+        if head.startswith(b'ID3'):
+            # Header, tag (its size is a synchsafe integer), and footer if any.
+            tag_size = ID3_HEADER_SIZE + _decode_synchsafe_integer(head[6:10])
+            if head[5] & ID3_FOOTER_FLAG:
+                tag_size += ID3_HEADER_SIZE
+            if len(head) < tag_size:
+                return None
+        elif is_mpeg_audio_frame(head):
+            # No tag.
+            tag_size = 0
+        else:
+            return b'', 0
+
+        from mutagen.id3 import ID3  # noqa: PLC0415
+
+        tag_file = io.BytesIO(head[:tag_size])
+        try:
+            tags = ID3(tag_file) if tag_size else ID3()
+            _set_id3_frames(tags, self._track_metadata)
+            tags.save(tag_file, padding=_reserve_padding)
+        except MutagenError:
+            logger.debug('Failed to rewrite ID3 tag while downloading, the track will be tagged afterwards.')
+            return b'', 0
+        return tag_file.getvalue(), tag_size
+
+
+def _decode_synchsafe_integer(data: bytes) -> int:
+    value = 0
+    for byte in data:
+        value = (value << 7) | (byte & 0x7F)
+    return value
+
+
+def _set_id3_frames(tags: ID3, track_metadata: Metadata) -> None:
+    """
+    Sets the frames of the metadata the same way `EasyID3` does (UTF-8 text, replacing
+    existing frames).
+    """
+    from mutagen.id3 import TALB, TCON, TIT2, TPE1, TPE2, TPOS, TRCK, WOAR, Encoding  # noqa: PLC0415
+
     if track_metadata.author:
-        tags['artist'] = track_metadata.author
-        tags['albumartist'] = track_metadata.author
+        tags.setall('TPE1', [TPE1(encoding=Encoding.UTF8, text=track_metadata.author)])
+        tags.setall('TPE2', [TPE2(encoding=Encoding.UTF8, text=track_metadata.author)])
     if track_metadata.title:
-        tags['album'] = track_metadata.title
+        tags.setall('TALB', [TALB(encoding=Encoding.UTF8, text=track_metadata.title)])
     if track_metadata.track_name:
-        tags['title'] = track_metadata.track_name
-    tags['genre'] = 'Audiobook'
+        tags.setall('TIT2', [TIT2(encoding=Encoding.UTF8, text=track_metadata.track_name)])
+    tags.setall('TCON', [TCON(encoding=Encoding.UTF8, text='Audiobook')])
     if track_metadata.card_url:
-        tags['website'] = track_metadata.card_url
+        tags.setall('WOAR', [WOAR(url=track_metadata.card_url)])
     if track_metadata.track_number and track_metadata.track_total:
-        tags['tracknumber'] = f'{track_metadata.track_number}/{track_metadata.track_total}'
+        track_number = f'{track_metadata.track_number}/{track_metadata.track_total}'
+        tags.setall('TRCK', [TRCK(encoding=Encoding.UTF8, text=track_number)])
     if track_metadata.disc_number and track_metadata.disc_total:
-        tags['discnumber'] = f'{track_metadata.disc_number}/{track_metadata.disc_total}'
-    # Save tags to file.
-    tags.save()
+        disc_number = f'{track_metadata.disc_number}/{track_metadata.disc_total}'
+        tags.setall('TPOS', [TPOS(encoding=Encoding.UTF8, text=disc_number)])
 
     # Add cover.
     if track_metadata.cover_file:
-        with open(track_metadata.cover_file, 'rb') as icon_file:
-            mime_type = _cover_mime_type(track_metadata.cover_file)
-            # Add cover.
-            if mime_type is not None:
-                tags_for_cover = ID3(track_file)
-                tags_for_cover.add(
-                    APIC(
-                        encoding=Encoding.UTF8,
-                        mime=mime_type,
-                        type=PictureType.ILLUSTRATION,
-                        data=icon_file.read(),
-                    )
-                )
-                tags_for_cover.save()
-            else:
-                logger.warning(f'Unsupported cover file format: {track_metadata.cover_file}')
+        apic = cover_cache.get(track_metadata.cover_file).apic
+        if apic is not None:
+            tags.add(apic)
+        else:
+            logger.warning(f'Unsupported cover file format: {track_metadata.cover_file}')
 
 
 def add_ogg_tags(track_file: Path, track_metadata: Metadata) -> None:
@@ -138,20 +259,17 @@ def add_ogg_tags(track_file: Path, track_metadata: Metadata) -> None:
     _set_ogg_number_tag(tags, 'disctotal', track_metadata.disc_total)
 
     if track_metadata.cover_file:
-        with open(track_metadata.cover_file, 'rb') as icon_file:
-            mime_type = _cover_mime_type(track_metadata.cover_file)
-
-            if mime_type is not None:
-                picture = Picture()
-                picture.type = PictureType.COVER_FRONT
-                picture.mime = mime_type
-                picture.data = icon_file.read()
-                tags['metadata_block_picture'] = [base64.b64encode(picture.write()).decode('ascii')]
+        metadata_block_picture = cover_cache.get(track_metadata.cover_file).metadata_block_picture
+        if metadata_block_picture is not None:
+            tags['metadata_block_picture'] = [metadata_block_picture]
 
-    tags.save()
+    tags.save(padding=_reserve_padding)
 
 
 def _open_ogg_tags(track_file: Path) -> OggFileType | None:
+    from mutagen.oggopus import OggOpus, OggOpusHeaderError  # noqa: PLC0415
+    from mutagen.oggvorbis import OggVorbis, OggVorbisHeaderError  # noqa: PLC0415
+
     handlers = [
         ('OggVorbis', OggVorbis, OggVorbisHeaderError),
         ('OggOpus', OggOpus, OggOpusHeaderError),
@@ -179,10 +297,12 @@ def _set_ogg_number_tag(tags: OggFileType, key: str, value: int | None) -> None:
         tags[key] = str(value)
 
 
-def _cover_mime_type(cover_file: Path) -> str | None:
-    if cover_file.suffix == '.png':
-        return 'image/png'
-    elif cover_file.suffix == '.jpg':
-        return 'image/jpeg'
-    else:
-        return None
+def _reserve_padding(padding_info: PaddingInfo) -> int:
+    """
+    Padding strategy for saving tags: existing padding is kept as long as tags fit in it, so
+    that the audio data does not move. When it does not (e.g. first tagging), `TAG_PADDING`
+    bytes are reserved for later tag updates to be written in place.
+    """
+    if padding_info.padding >= 0:
+        return padding_info.padding
+    return TAG_PADDING
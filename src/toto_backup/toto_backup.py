@@ -14,24 +14,41 @@
 import logging
 import shutil
 import sys
+from collections.abc import Iterator
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
 from pathlib import Path
+from typing import Any, TextIO
 from uuid import uuid4
 
 import click
 import structlog
 from pathvalidate import sanitize_filename
-from requests import HTTPError
+from requests import RequestException, Session
 
 from toto_backup.card import parse_data, InvalidDataError, Card
-from toto_backup.tag import tag_track, Metadata
+from toto_backup.card_cache import CardCache, CARD_CACHE_TTL, CARD_CACHE_MAX_SIZE
+from toto_backup.downloader import Downloader
+from toto_backup.manifest import Manifest
+from toto_backup.profiling import profiled, PROFILE_TOP_COUNT
+from toto_backup.retry import is_retryable, RetryPolicy
+from toto_backup.scratch import ScratchSpace
+from toto_backup.store import ObjectStore
+from toto_backup.tag import tag_track, Metadata, get_metadata_fingerprint, Id3TagInjector
 from toto_backup.utils import (
-    download_content,
+    can_clone_files,
+    canonical_url,
+    create_session,
+    get_connection_stats,
     get_extension,
     fetch_page,
     find_data,
     should_overwrite_directory,
     similar_strings,
     format_base_filename,
+    link_or_copy,
+    move_file,
+    NotModifiedError,
 )
 
 structlog.stdlib.recreate_defaults(log_level=logging.INFO)
@@ -41,55 +58,404 @@ ERROR_INVALID_URL = 10
 ERROR_DATA_NOT_FOUND = 11
 ERROR_INVALID_DATA = 12
 ERROR_DIRECTORY_ALREADY_EXISTS = 13
+ERROR_UNEXPECTED = 14
+
+# Default scratch directory, next to the card directories: downloads are made there, then
+# moved to their card directory. Interrupted downloads are kept there, to be resumed by the next backup.
+SCRATCH_DIRECTORY = Path('.toto-backup-scratch')
 
 
 @click.command()
-@click.argument('url')
-def main(url: str) -> None:
+@click.option(
+    '--jobs',
+    '-j',
+    type=click.IntRange(min=1),
+    default=1,
+    show_default=True,
+    help='Number of tracks downloaded in parallel.',
+)
+@click.option(
+    '--resume',
+    is_flag=True,
+    default=False,
+    help='Resume the backup in an existing card directory, only downloading what is missing or invalid.',
+)
+@click.option(
+    '--refresh',
+    is_flag=True,
+    default=False,
+    help='Refresh the backup in an existing card directory, only downloading what changed since the last backup.',
+)
+@click.option(
+    '--batch',
+    type=click.File('r', encoding='utf-8'),
+    help='Back up the card URLs listed in a file, one per line (use "-" to read them from standard input).',
+)
+@click.option(
+    '--cards',
+    type=click.IntRange(min=1),
+    default=1,
+    show_default=True,
+    help='Number of cards backed up in parallel in batch mode.',
+)
+@click.option(
+    '--store',
+    type=click.Path(file_okay=False, path_type=Path),
+    help=(
+        'Directory storing downloaded content once for all cards, card directories get links to it. '
+        'Tracks are tagged per card: they are only stored if the filesystem can clone files (e.g. Btrfs, XFS).'
+    ),
+)
+@click.option(
+    '--scratch-dir',
+    type=click.Path(file_okay=False, path_type=Path),
+    default=SCRATCH_DIRECTORY,
+    show_default=True,
+    help='Directory downloads are made into, on the same filesystem as the card directories.',
+)
+@click.option(
+    '--cache-dir',
+    type=click.Path(file_okay=False, path_type=Path),
+    help='Directory caching the data of card pages, so that backing up a card again does not fetch its page.',
+)
+@click.option(
+    '--cache-ttl',
+    type=click.IntRange(min=0),
+    default=CARD_CACHE_TTL,
+    show_default=True,
+    help='Seconds the data of a card page is cached for (track URLs it contains may expire).',
+)
+@click.option(
+    '--cache-max-size',
+    type=click.IntRange(min=1),
+    default=CARD_CACHE_MAX_SIZE // (1024 * 1024),
+    show_default=True,
+    help='Size of the card page cache in MiB, least recently used pages are evicted beyond it.',
+)
+@click.option(
+    '--metrics',
+    type=click.Path(dir_okay=False, path_type=Path),
+    help='Write metrics of the run (durations of each phase, bytes downloaded, retries…) to a JSON file.',
+)
+@click.option(
+    '--prometheus',
+    type=click.Path(dir_okay=False, path_type=Path),
+    help='Write metrics of the run to a file for the Prometheus textfile collector (e.g. toto_backup.prom).',
+)
+@click.option(
+    '--profile',
+    type=click.Path(dir_okay=False, path_type=Path),
+    help='Profile the run (including download workers) and write the statistics to a pstats file.',
+)
+@click.option(
+    '--profile-top',
+    type=click.IntRange(min=1),
+    default=PROFILE_TOP_COUNT,
+    show_default=True,
+    help='Number of functions listed in the profile summary, printed on the standard error.',
+)
+@click.argument('url', required=False)
+def main(  # noqa: PLR0913, PLR0917
+    url: str | None,
+    jobs: int,
+    resume: bool,
+    refresh: bool,
+    batch: TextIO | None,
+    cards: int,
+    store: Path | None,
+    scratch_dir: Path,
+    cache_dir: Path | None,
+    cache_ttl: int,
+    cache_max_size: int,
+    metrics: Path | None,
+    prometheus: Path | None,
+    profile: Path | None,
+    profile_top: int,
+) -> None:
     """Simple backup tool for your Yoto cards.
 
     URL is the URL of the Yoto card to back up (e.g., https://yoto.io/XXXXX?ABCDEFGHIJKL=MNOPQRSTUVWXY).
+    To back up several cards at once, list their URLs in a file and use --batch instead.
     """
-    # Fetch card HTML page.
-    print(f'Fetching page at: {url}')
-    page_content = fetch_page(url)
-    if not page_content:
-        sys.exit(ERROR_INVALID_URL)
-    # Extract JSON content out of it.
-    print('Find data…')
-    data = find_data(page_content)
-    if not data:
-        sys.exit(ERROR_DATA_NOT_FOUND)
+    if (url is None) == (batch is None):
+        click.get_current_context().fail('Either a card URL or --batch must be provided.')
+    if profile is not None:
+        # Stops profiling when the command exits.
+        click.get_current_context().with_resource(profiled(profile, profile_top))
+    card_cache = CardCache(cache_dir, cache_ttl, cache_max_size * 1024 * 1024) if cache_dir is not None else None
+
+    # Card threads fetch pages while download workers are busy: both need connections.
+    with (
+        create_session(jobs + cards) as session,
+        closing(ScratchSpace(scratch_dir)) as scratch,
+        closing(Downloader(session, jobs, scratch, open_store(store) if store else None, RetryPolicy())) as downloader,
+    ):
+        try:
+            if batch is not None:
+                card_backups = backup_cards(read_card_urls(batch), downloader, cards, resume, refresh, card_cache)
+            else:
+                try:
+                    card_backup = backup_card(str(url), downloader, resume, refresh, card_cache=card_cache)
+                except CardBackupError as e:
+                    sys.exit(e.exit_code)
+        finally:
+            # Failed runs are measured too.
+            write_run_metrics(session, downloader, metrics, prometheus)
+
+    # Work is finished, exit.
+    if batch is not None:
+        print_card_backups(card_backups)
+        sys.exit(next((card_backup.exit_code for card_backup in card_backups if card_backup.exit_code), 0))
+    print(
+        f'Card backup completed, {card_backup.successful_track_count} tracks backed up successfully, '
+        f'{card_backup.failed_track_count} failed.'
+    )
+    sys.exit()
+
+
+if __name__ == '__main__':
+    main()
+
+
+def open_store(directory: Path) -> ObjectStore:
+    """
+    Opens the object store shared by backups, checking whether its objects can be cloned into
+    the card directories (see `ObjectStore`).
+
+    :param directory: The directory of the store.
+    :return: The store.
+    """
+    directory.mkdir(parents=True, exist_ok=True)
+    clones_supported = can_clone_files(directory, Path.cwd())
+    if not clones_supported:
+        logger.warning(
+            f'Files cannot be cloned from {directory} to card directories: tracks are not stored, '
+            'only covers and icons are.'
+        )
+    return ObjectStore(directory, clones_supported)
+
+
+def write_run_metrics(
+    session: Session, downloader: Downloader, metrics: Path | None = None, prometheus: Path | None = None
+) -> None:
+    """
+    Completes the metrics of a backup run with connection, concurrency and retry counters,
+    and writes them.
+
+    :param session: The HTTP session of the run.
+    :param downloader: The downloader of the run.
+    :param metrics: The JSON file to write the metrics to, if any.
+    :param prometheus: The Prometheus textfile to write the metrics to, if any.
+    """
+    opened_connection_count, reused_connection_count = get_connection_stats(session)
+    logger.info(f'HTTP connections: {opened_connection_count} opened, {reused_connection_count} reused.')
+    if downloader.concurrency is not None:
+        for host, window in downloader.concurrency.get_windows().items():
+            logger.info(f'Download concurrency for {host}: {window}/{downloader.jobs} requests in flight at the end.')
+        downloader.metrics.set_concurrency_windows(downloader.concurrency.get_windows())
+    downloader.metrics.add('retries', downloader.retry_policy.retry_count)
+    downloader.metrics.add('connections_opened', opened_connection_count)
+    downloader.metrics.add('connections_reused', reused_connection_count)
+    if metrics is not None:
+        downloader.metrics.write_json(metrics)
+    if prometheus is not None:
+        downloader.metrics.write_prometheus(prometheus)
+
+
+class CardBackupError(Exception):
+    def __init__(self, url: str, exit_code: int, reason: str):
+        super().__init__(f'Failed to back up card {url}: {reason}')
+        self.exit_code = exit_code
+        self.reason = reason
+
+
+class CardBackup:
+    """
+    The result of the backup of a card: the number of tracks backed up, or the reason why the
+    card could not be backed up at all.
+    """
+
+    def __init__(self, url: str, successful_track_count: int = 0, failed_track_count: int = 0):
+        self.url = url
+        self.successful_track_count = successful_track_count
+        self.failed_track_count = failed_track_count
+        # Exit code of the first error preventing the backup, 0 if the card was backed up.
+        self.exit_code = 0
+        self.reason: str | None = None
+
+
+def backup_card(  # noqa: PLR0913, PLR0917
+    url: str,
+    downloader: Downloader,
+    resume: bool = False,
+    refresh: bool = False,
+    interactive: bool = True,
+    card_cache: CardCache | None = None,
+) -> CardBackup:
+    """
+    Backs up a card in a directory of the current working directory.
+
+    :param url: The URL of the card.
+    :param downloader: The downloader of the backup run, shared by all cards.
+    :param resume: Whether to resume the backup in an existing card directory.
+    :param refresh: Whether to revalidate content already backed up in an existing card directory.
+    :param interactive: Whether the user may be asked to overwrite an existing card directory.
+    :param card_cache: The cache of card data, the card page is always fetched if not provided.
+    :return: The result of the backup.
+    :raises CardBackupError: If the card could not be backed up.
+    """
+    metrics = downloader.metrics
+    cached_card = card_cache.get(url) if card_cache is not None else None
+    if cached_card is None:
+        data = fetch_card_data(url, downloader, card_cache)
+    elif cached_card.data is None:
+        print(f'Card at {url} failed recently: {cached_card.reason}')
+        raise CardBackupError(url, cached_card.exit_code, cached_card.reason or 'unknown error')
+    else:
+        print(f'Using cached data of page at: {url}')
+        data = cached_card.data
     # Convert JSON content to a Card object.
     try:
-        card = parse_data(data)
-    except InvalidDataError:
+        with metrics.timer('parse_data'):
+            card = parse_data(data)
+    except InvalidDataError as e:
         logger.exception('Error while parsing data. This card may not be supported.')
-        sys.exit(ERROR_INVALID_DATA)
+        if card_cache is not None:
+            card_cache.put_error(url, ERROR_INVALID_DATA, 'invalid data')
+        raise CardBackupError(url, ERROR_INVALID_DATA, 'invalid data') from e
     # Create a directory to download tracks into.
-    card_directory = create_card_directory(Path.cwd(), card)
+    with metrics.timer('create_card_directory'):
+        card_directory = create_card_directory(Path.cwd(), card, resume or refresh, interactive)
     if not card_directory:
         logger.warning('Aborted!')
-        sys.exit(ERROR_DIRECTORY_ALREADY_EXISTS)
+        raise CardBackupError(url, ERROR_DIRECTORY_ALREADY_EXISTS, 'directory already exists')
+    # Keep track of what has been backed up, to resume later if needed.
+    manifest = Manifest(card_directory, refresh)
     # Download card cover art.
     print('Downloading card cover…')
-    if download_and_move_content(card.cover_url, card_directory / 'cover') is None:
+    if download_and_record_content(card.cover_url, card_directory / 'cover', downloader, manifest) is None:
         logger.warning('Failed to download card cover.')
     # Download tracks and their cover arts.
-    successful_track_count, failed_track_count = download_tracks(card, card_directory, url)
+    successful_track_count, failed_track_count = download_tracks(card, card_directory, url, downloader, manifest)
+    return CardBackup(url, successful_track_count, failed_track_count)
 
-    # Work is finished, exit.
-    print(
-        f'Card backup completed, {successful_track_count} tracks backed up successfully, {failed_track_count} failed.'
-    )
-    sys.exit()
 
+def fetch_card_data(url: str, downloader: Downloader, card_cache: CardCache | None = None) -> Any:
+    """
+    Fetches the page of a card and extracts its JSON data.
 
-if __name__ == '__main__':
-    main()
+    :param url: The URL of the card.
+    :param downloader: The downloader of the backup run, its session and retry policy are used.
+    :param card_cache: The cache the data is stored into, and errors that will not go away
+        by retrying (page not found, no data in the page).
+    :return: The JSON data of the card page.
+    :raises CardBackupError: If the page could not be fetched, or has no data.
+    """
+    # Fetch card HTML page.
+    print(f'Fetching page at: {url}')
+    metrics = downloader.metrics
+    try:
+        with metrics.timer('fetch_page'):
+            page_content = downloader.retry_policy.run(lambda: fetch_page(url, downloader.session), f'fetch of {url}')
+    except RequestException as e:
+        # Network or server error, the page may be fetched next time: not cached.
+        logger.debug(f'Failed to fetch {url}', exc_info=True)
+        raise CardBackupError(url, ERROR_INVALID_URL, 'page not found') from e
+    if not page_content:
+        if card_cache is not None:
+            card_cache.put_error(url, ERROR_INVALID_URL, 'page not found')
+        raise CardBackupError(url, ERROR_INVALID_URL, 'page not found')
+    # Extract JSON content out of it.
+    print('Find data…')
+    with metrics.timer('find_data'):
+        data = find_data(page_content)
+    if not data:
+        if card_cache is not None:
+            card_cache.put_error(url, ERROR_DATA_NOT_FOUND, 'data not found')
+        raise CardBackupError(url, ERROR_DATA_NOT_FOUND, 'data not found')
+    if card_cache is not None:
+        card_cache.put(url, data)
+    return data
 
 
-def create_card_directory(parent_directory: Path, card: Card) -> Path | None:
+def read_card_urls(file: TextIO) -> list[str]:
+    """
+    Reads card URLs, one per line. Blank lines and lines starting with `#` are ignored, and so
+    are URLs identical (once canonicalized) to a previous one.
+
+    :param file: The file to read URLs from.
+    :return: The card URLs, in file order.
+    """
+    urls: dict[str, str] = {}
+    for line in file:
+        url = line.strip()
+        if not url or url.startswith('#'):
+            continue
+        urls.setdefault(canonical_url(url), url)
+    return list(urls.values())
+
+
+def backup_cards(  # noqa: PLR0913, PLR0917
+    urls: list[str],
+    downloader: Downloader,
+    cards: int = 1,
+    resume: bool = False,
+    refresh: bool = False,
+    card_cache: CardCache | None = None,
+) -> list[CardBackup]:
+    """
+    Backs up several cards, without asking anything to the user. Cards are processed
+    concurrently, their tracks sharing the session and worker pool of the downloader.
+
+    :param urls: The URLs of the cards.
+    :param downloader: The downloader shared by all cards.
+    :param cards: The number of cards backed up in parallel.
+    :param resume: Whether to resume backups in existing card directories.
+    :param refresh: Whether to revalidate content already backed up in existing card directories.
+    :param card_cache: The cache of card data shared by all cards, if any.
+    :return: The result of the backup of each card, in URL order.
+    """
+
+    def backup(url: str) -> CardBackup:
+        try:
+            return backup_card(url, downloader, resume, refresh, interactive=False, card_cache=card_cache)
+        except CardBackupError as e:
+            card_backup = CardBackup(url)
+            card_backup.exit_code = e.exit_code
+            card_backup.reason = e.reason
+            return card_backup
+        except Exception as e:
+            # Other cards must still be backed up.
+            logger.exception(f'Unexpected error while backing up card {url}')
+            card_backup = CardBackup(url)
+            card_backup.exit_code = ERROR_UNEXPECTED
+            card_backup.reason = f'unexpected error: {e}'
+            return card_backup
+
+    # Cards get their own workers: they wait for their tracks, which run on the downloader workers.
+    with ThreadPoolExecutor(max_workers=cards, thread_name_prefix='card') as executor:
+        return list(executor.map(backup, urls))
+
+
+def print_card_backups(card_backups: list[CardBackup]) -> None:
+    failed_card_count = len([card_backup for card_backup in card_backups if card_backup.exit_code])
+    print(
+        f'Batch backup completed, {len(card_backups) - failed_card_count} cards backed up successfully, '
+        f'{failed_card_count} failed.'
+    )
+    print(f'{"Status":<8} {"Tracks":>6} {"Failed":>6}  Card')
+    for card_backup in card_backups:
+        status = 'OK' if not card_backup.exit_code else 'FAILED'
+        reason = f' ({card_backup.reason})' if card_backup.reason else ''
+        print(
+            f'{status:<8} {card_backup.successful_track_count:>6} {card_backup.failed_track_count:>6}  '
+            f'{card_backup.url}{reason}'
+        )
+
+
+def create_card_directory(
+    parent_directory: Path, card: Card, resume: bool = False, interactive: bool = True
+) -> Path | None:
     print('Creating card directory…')
     card_directory_name = ' - '.join(filter(None, [card.author, card.title]))
     if not card_directory_name:
@@ -97,7 +463,9 @@ def create_card_directory(parent_directory: Path, card: Card) -> Path | None:
     sanitized_card_directory_name = sanitize_filename(card_directory_name, validate_after_sanitize=True)
     card_directory = parent_directory / sanitized_card_directory_name
     if card_directory.exists():
-        if should_overwrite_directory(card_directory):
+        if resume:
+            return card_directory
+        if interactive and should_overwrite_directory(card_directory):
             shutil.rmtree(card_directory)
         else:
             return None
@@ -105,26 +473,116 @@ def create_card_directory(parent_directory: Path, card: Card) -> Path | None:
     return card_directory
 
 
-def download_and_move_content(url: str, destination: Path) -> Path | None:
+def download_and_move_content(
+    url: str,
+    destination: Path,
+    downloader: Downloader | None = None,
+    track_metadata: Metadata | None = None,
+    validators: dict[str, Any] | None = None,
+) -> Path | None:
+    """
+    Downloads content from a given URL and moves it to its destination, with an extension
+    matching its file type.
+
+    :param url: The URL of the resource to download.
+    :param destination: The destination path of the content, without extension.
+    :param downloader: The downloader of the backup run, used to fetch identical URLs once.
+    :param track_metadata: The metadata of the track, if the content is a track. MP3 tracks
+        are tagged while downloaded (see `Downloader.get_head_key`), and tracks will be
+        modified in place, so they cannot share their storage with another copy of the same
+        content.
+    :param validators: The validators of a previous download of the content, to only
+        download it if it has been modified.
+    :return: The final path of the content, or `None` if the download failed.
+    :raises NotModifiedError: If the content has not been modified since the previous download.
+    """
+    downloader = downloader or Downloader()
     try:
-        temporary_file, mime_type = download_content(url)
-        extension = get_extension(mime_type, temporary_file) or ''
-        sanitized_filename = sanitize_filename(f'{destination.name}{extension}', validate_after_sanitize=True)
-        final_destination = destination.with_name(sanitized_filename)
-        shutil.move(temporary_file, final_destination)
-    except HTTPError:
+        head_rewriter = Id3TagInjector(track_metadata) if track_metadata is not None else None
+        content, is_last = downloader.download(url, validators, head_rewriter, track_metadata is not None)
+        try:
+            with downloader.metrics.timer('get_extension'):
+                extension = get_extension(content.mime_type, content.file, content.extension) or ''
+            sanitized_filename = sanitize_filename(f'{destination.name}{extension}', validate_after_sanitize=True)
+            final_destination = destination.with_name(sanitized_filename)
+            if is_last:
+                move_file(content.file, final_destination)
+            else:
+                # Replace content left by a previous backup, if any.
+                final_destination.unlink(missing_ok=True)
+                link_or_copy(content.file, final_destination, hardlink=track_metadata is None)
+        finally:
+            if not is_last:
+                # The file may be moved by the last requester, or deleted, from now on.
+                downloader.release(url)
+    except RequestException:
+        logger.debug(f'Failed to download {url}', exc_info=True)
         return None
     else:
         return final_destination
 
 
-def download_tracks(card, card_directory, url) -> tuple[int, int]:
+def download_and_record_content(
+    url: str,
+    destination: Path,
+    downloader: Downloader,
+    manifest: Manifest | None = None,
+    track_metadata: Metadata | None = None,
+) -> Path | None:
+    """
+    Downloads content like `download_and_move_content`, unless the manifest shows it has
+    already been backed up (and, when refreshing, that it has not been modified since).
+    Downloaded content is recorded in the manifest, along with the tags written while it
+    was downloaded.
+
+    :param url: The URL of the resource to download.
+    :param destination: The destination path of the content, without extension.
+    :param downloader: The downloader of the backup run.
+    :param manifest: The manifest of the card directory.
+    :param track_metadata: The metadata of the track, if the content is a track.
+    :return: The final path of the content, or `None` if the download failed.
+    """
+    if manifest is None:
+        return download_and_move_content(url, destination, downloader, track_metadata)
+
+    existing_file = manifest.find(destination, url)
+    if existing_file is not None and not manifest.refresh:
+        logger.debug(f'Already backed up: {existing_file}')
+        return existing_file
+
+    validators = manifest.get_validators(destination, url) if existing_file is not None else None
+    try:
+        file = download_and_move_content(url, destination, downloader, track_metadata, validators)
+    except NotModifiedError:
+        logger.debug(f'Not modified since last backup: {existing_file}')
+        return existing_file
+
+    if file is not None:
+        manifest.record(
+            destination,
+            url,
+            file,
+            downloader.get_validators(url),
+            downloader.get_head_key(url),
+            downloader.get_checksum(url),
+        )
+    return file
+
+
+def download_tracks(
+    card: Card,
+    card_directory: Path,
+    url: str,
+    downloader: Downloader,
+    manifest: Manifest | None = None,
+) -> tuple[int, int]:
     successful_track_download_count = 0
     failed_track_download_count = 0
     print('Downloading tracks…')
     disc_number = 1
     disc_total = 1
     track_number = 0
+    track_downloads: list[TrackDownload] = []
     for chapter in card.chapters:
         for track in chapter.tracks:
             track_number += 1
@@ -136,30 +594,116 @@ def download_tracks(card, card_directory, url) -> tuple[int, int]:
 
             base_filename = format_base_filename(disc_number, disc_total, track_number, card.track_total, track_name)
 
-            # Download icon.
-            icon_file = download_and_move_content(chapter.icon_url, card_directory / base_filename)
-            if icon_file is None:
-                logger.warning(f'Icon not found for track {track_number}/{card.track_total}.')
-
-            # Download track.
-            track_file = download_and_move_content(track.url, card_directory / base_filename)
-            if track_file is not None:
-                # Tag file.
-                track_metadata = Metadata()
-                track_metadata.author = card.author
-                track_metadata.title = card.title
-                track_metadata.track_name = track_name
-                track_metadata.track_number = track_number
-                track_metadata.track_total = card.track_total
-                track_metadata.disc_number = disc_number
-                track_metadata.disc_total = disc_total
-                track_metadata.cover_file = icon_file
-                track_metadata.card_url = url
-                tag_track(track_file, track_metadata)
-
-                print(f'Track {track_number}/{card.track_total} successfully downloaded to {track_file}')
-                successful_track_download_count += 1
-            else:
-                logger.exception(f'Failed to download track {track_number}/{card.track_total}')
-                failed_track_download_count += 1
+            track_metadata = Metadata()
+            track_metadata.author = card.author
+            track_metadata.title = card.title
+            track_metadata.track_name = track_name
+            track_metadata.track_number = track_number
+            track_metadata.track_total = card.track_total
+            track_metadata.disc_number = disc_number
+            track_metadata.disc_total = disc_total
+            track_metadata.card_url = url
+            track_downloads.append(
+                TrackDownload(chapter.icon_url, track.url, card_directory / base_filename, track_metadata)
+            )
+
+    # Tracks failing with transient errors (once the downloader gave up retrying them) are
+    # retried once more at the end, rather than holding up a worker.
+    deferred_track_downloads: list[TrackDownload] = []
+    for track_download, track_file in _run_track_downloads(track_downloads, downloader, manifest):
+        track_metadata = track_download.metadata
+        if track_file is None and is_retryable(downloader.get_error(track_download.track_url)):
+            logger.info(
+                f'Failed to download track {track_metadata.track_number}/{track_metadata.track_total}, '
+                'retrying it at the end.'
+            )
+            deferred_track_downloads.append(track_download)
+        elif _report_track_download(track_metadata, track_file):
+            successful_track_download_count += 1
+        else:
+            failed_track_download_count += 1
+
+    for track_download, track_file in _run_track_downloads(deferred_track_downloads, downloader, manifest):
+        if _report_track_download(track_download.metadata, track_file):
+            successful_track_download_count += 1
+        else:
+            failed_track_download_count += 1
     return successful_track_download_count, failed_track_download_count
+
+
+class TrackDownload:
+    """
+    A track to download, with everything needed to download it independently of other tracks.
+    """
+
+    def __init__(self, icon_url: str, track_url: str, destination: Path, metadata: Metadata):
+        self.icon_url = icon_url
+        self.track_url = track_url
+        # Destination path of the track and its icon, without extension.
+        self.destination = destination
+        self.metadata = metadata
+
+
+def download_track(
+    track_download: TrackDownload, downloader: Downloader, manifest: Manifest | None = None
+) -> Path | None:
+    """
+    Downloads a single track along with its icon, then tags the track. This is the unit of
+    work run by the worker pool of `download_tracks`, so it must not depend on other tracks.
+
+    :param track_download: The track to download, its metadata cover file is set here.
+    :param downloader: The downloader shared by all tracks.
+    :param manifest: The manifest of the card directory, content already backed up is skipped.
+    :return: The path of the downloaded track, or `None` if the download failed.
+    """
+    destination = track_download.destination
+    track_metadata = track_download.metadata
+
+    # Download icon.
+    icon_file = download_and_record_content(track_download.icon_url, destination, downloader, manifest)
+    if icon_file is None:
+        logger.warning(f'Icon not found for track {track_metadata.track_number}/{track_metadata.track_total}.')
+
+    # Download track, tagging it on the fly if possible.
+    track_metadata.cover_file = icon_file
+    track_url = track_download.track_url
+    track_file = download_and_record_content(track_url, destination, downloader, manifest, track_metadata)
+    if track_file is not None:
+        # Tag file, unless it is already tagged with the same metadata.
+        tags = get_metadata_fingerprint(track_metadata)
+        current_tags = manifest.get_tags(destination, track_url) if manifest else downloader.get_head_key(track_url)
+        if current_tags != tags:
+            with downloader.metrics.timer('tag_track'):
+                tag_track(track_file, track_metadata, downloader.get_extension(track_url))
+            if manifest is not None:
+                manifest.record_tags(destination, track_url, track_file, tags)
+    return track_file
+
+
+def _run_track_downloads(
+    track_downloads: list[TrackDownload], downloader: Downloader, manifest: Manifest | None
+) -> Iterator[tuple[TrackDownload, Path | None]]:
+    """
+    Downloads tracks concurrently, and provides their results in track order, whatever the
+    completion order.
+    """
+    # Icons are shared by all tracks of a chapter, and some cards repeat tracks: announce
+    # every URL so that each one is downloaded only once.
+    for track_download in track_downloads:
+        downloader.expect(track_download.icon_url)
+        downloader.expect(track_download.track_url)
+
+    futures = [
+        downloader.executor.submit(download_track, track_download, downloader, manifest)
+        for track_download in track_downloads
+    ]
+    for future, track_download in zip(futures, track_downloads, strict=True):
+        yield track_download, future.result()
+
+
+def _report_track_download(track_metadata: Metadata, track_file: Path | None) -> bool:
+    if track_file is None:
+        logger.exception(f'Failed to download track {track_metadata.track_number}/{track_metadata.track_total}')
+        return False
+    print(f'Track {track_metadata.track_number}/{track_metadata.track_total} successfully downloaded to {track_file}')
+    return True
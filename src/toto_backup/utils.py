@@ -11,21 +11,41 @@
 # was not distributed with this file, You can obtain one
 # at https://mozilla.org/MPL/2.0/.
 #
+import codecs
+import errno
+import hashlib
+import itertools
 import json
+import os
+import re
+import shutil
+import sys
 import unicodedata
+from collections.abc import Iterator
 from http import HTTPStatus
 from mimetypes import guess_extension
 from pathlib import Path
 from tempfile import NamedTemporaryFile
-from typing import Any
+from typing import Any, Protocol
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
 
 import click
 import requests
 import structlog
-from bs4 import BeautifulSoup, Tag
-from puremagic import magic_file, PureError
+from requests.adapters import HTTPAdapter
 from requests.structures import CaseInsensitiveDict
 
+from toto_backup.retry import RETRYABLE_STATUS_CODES
+
+if sys.platform == 'linux':
+    import fcntl
+
+try:
+    # Optional, faster JSON decoder.
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads  # type: ignore[assignment]
+
 logger = structlog.stdlib.get_logger()
 
 CANONICAL_EXTENSION_BY_MIME_TYPE = {
@@ -34,6 +54,132 @@ CANONICAL_EXTENSION_BY_MIME_TYPE = {
     'audio/ogg': '.ogg',
 }
 
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+CONTENT_RANGE_PATTERN = re.compile(r'bytes (?P<start>\d+)-(?P<end>\d+)/(?P<length>\d+|\*)')
+# Maximum size of the beginning of content read to rewrite it, see `HeadRewriter`.
+MAX_HEAD_SIZE = 1024 * 1024
+# Number of distinct hosts a session keeps connection pools for (card page, covers, icons, tracks…).
+SESSION_HOST_COUNT = 10
+# Script element containing the JSON data of a card page (Next.js).
+NEXT_DATA_PATTERN = re.compile(
+    r'<script\b[^>]*\bid\s*=\s*["\']?__NEXT_DATA__["\']?[^>]*>(?P<data>.*?)</script\s*>',
+    re.DOTALL | re.IGNORECASE,
+)
+# Signatures of the formats detected from the first bytes of content (offset, signature and
+# extension), see `sniff_extension`. An Opus stream is an Ogg stream whose first page (27-byte
+# header and 1 segment) holds the Opus identification header.
+FORMAT_SIGNATURES = [
+    (0, b'ID3', '.mp3'),
+    (4, b'ftyp', '.m4a'),
+    (28, b'OpusHead', '.opus'),
+    (0, b'OggS', '.ogg'),
+    (0, b'\x89PNG\r\n\x1a\n', '.png'),
+    (0, b'\xff\xd8\xff', '.jpg'),
+]
+# Linux ioctl cloning a file, see: https://man7.org/linux/man-pages/man2/ioctl_ficlone.2.html
+FICLONE = 0x40049409
+
+
+class NotModifiedError(Exception):
+    def __init__(self, url: str):
+        super().__init__(f'Content not modified: {url}')
+
+
+class DownloadedContent:
+    """
+    Content downloaded by `download_content`.
+    """
+
+    def __init__(  # noqa: PLR0913, PLR0917
+        self,
+        file: Path,
+        mime_type: str | None,
+        validators: dict[str, Any],
+        checksum: str | None = None,
+        head_key: str | None = None,
+        extension: str | None = None,
+        downloaded_size: int | None = None,
+    ):
+        self._file = file
+        self._mime_type = mime_type
+        self._validators = validators
+        self._checksum = checksum
+        self._head_key = head_key
+        self._extension = extension
+        self._downloaded_size = downloaded_size
+
+    @property
+    def file(self) -> Path:
+        return self._file
+
+    @property
+    def mime_type(self) -> str | None:
+        return self._mime_type
+
+    @property
+    def validators(self) -> dict[str, Any]:
+        """
+        The HTTP validators of the content (`etag`, `last_modified` and `content_length`),
+        used to check later whether it has been modified.
+        """
+        return self._validators
+
+    @property
+    def checksum(self) -> str | None:
+        """
+        The SHA-256 checksum of the content, computed while downloading it.
+        """
+        return self._checksum
+
+    @property
+    def downloaded_size(self) -> int | None:
+        """
+        The number of bytes received from the server to download the content, less than the
+        file size if the download was resumed or its head rewritten. `None` if unknown.
+        """
+        return self._downloaded_size
+
+    @property
+    def head_key(self) -> str | None:
+        """
+        The key of the `HeadRewriter` that rewrote the beginning of the content while it was
+        downloaded, or `None` if the content is as served.
+        """
+        return self._head_key
+
+    @property
+    def extension(self) -> str | None:
+        """
+        The extension of the content format, detected from its first bytes (see
+        `sniff_extension`), or `None` if it is unknown.
+        """
+        return self._extension
+
+
+class HeadRewriter(Protocol):
+    """
+    Rewrites the beginning of content while it is downloaded (e.g. to add tags to a track), so
+    that the final content is written in a single pass.
+    """
+
+    @property
+    def key(self) -> str:
+        """
+        Identifies what the rewriting does (e.g. a fingerprint of the tags added).
+        """
+        ...
+
+    def rewrite_head(self, head: bytes) -> tuple[bytes, int] | None:
+        """
+        Rewrites the beginning of the content.
+
+        :param head: The beginning of the content received so far.
+        :return: `None` if more content is needed. Otherwise, a tuple containing the new head,
+            and the size of the part of `head` it replaces. An empty new head leaves the
+            content as is.
+        """
+        ...
+
 
 def get_mime_type(headers: CaseInsensitiveDict[str]) -> str | None:
     mime_type = headers.get('Content-Type', '').partition(';')[0].strip()
@@ -46,7 +192,20 @@ def get_mime_type(headers: CaseInsensitiveDict[str]) -> str | None:
     return mime_type or None
 
 
-def get_extension(mime_type: str | None, file: Path | None) -> str | None:
+def get_validators(headers: CaseInsensitiveDict[str]) -> dict[str, Any]:
+    content_length = headers.get('Content-Length', '')
+    return {
+        'etag': headers.get('ETag'),
+        'last_modified': headers.get('Last-Modified'),
+        'content_length': int(content_length) if content_length.isdigit() else None,
+    }
+
+
+def get_extension(mime_type: str | None, file: Path | None, detected_extension: str | None = None) -> str | None:
+    """
+    Provides the extension of content from its MIME type or, if it is unknown, from its
+    detected extension (see `sniff_extension`) or the magic bytes of its file.
+    """
     extension = None
 
     if mime_type:
@@ -59,7 +218,12 @@ def get_extension(mime_type: str | None, file: Path | None) -> str | None:
     if extension in ['.bin']:
         extension = None
 
+    if not extension:
+        extension = detected_extension
+
     if not extension and file:
+        from puremagic import magic_file, PureError  # noqa: PLC0415
+
         try:
             results = magic_file(file)
             logger.debug(f'File {file} has MIME type {results}.')
@@ -73,33 +237,404 @@ def get_extension(mime_type: str | None, file: Path | None) -> str | None:
     return extension
 
 
-def download_content(url: str) -> tuple[Path, str | None]:
+def is_mpeg_audio_frame(head: bytes) -> bool:
+    """
+    Tells whether content starts with an MPEG audio (MP3) frame header: a frame sync, and a
+    layer. ADTS (AAC) frames have the same frame sync, but no layer.
+    """
+    return len(head) > 1 and head[0] == 0xFF and head[1] & 0xE0 == 0xE0 and head[1] & 0x06 != 0  # noqa: PLR2004
+
+
+def sniff_extension(head: bytes) -> str | None:
+    """
+    Detects the format of content from its first bytes, whatever its name or MIME type.
+    Audio formats that can be tagged are recognized first; other formats are left to
+    `puremagic`.
+
+    :param head: The first bytes of the content, usually its first downloaded chunk.
+    :return: The extension of the format, or `None` if it is unknown.
+    """
+    if not head:
+        return None
+    for offset, signature, extension in FORMAT_SIGNATURES:
+        if head.startswith(signature, offset):
+            return extension
+    if is_mpeg_audio_frame(head):
+        # Without ID3 tag.
+        return '.mp3'
+    from puremagic import magic_string, PureError  # noqa: PLC0415
+
+    try:
+        results = magic_string(head)
+    except PureError:
+        return None
+    return results[0].extension if results else None
+
+
+def create_session(pool_size: int = 1) -> requests.Session:
+    """
+    Creates an HTTP session reusing connections across requests. Each host gets its own pool
+    of keep-alive connections, sized so that `pool_size` concurrent downloads can run without
+    opening throwaway connections.
+
+    :param pool_size: The maximum number of connections kept alive per host, usually the
+        download concurrency.
+    :return: A configured `requests.Session`, to be closed once the backup is done.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=SESSION_HOST_COUNT, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def get_connection_stats(session: requests.Session) -> tuple[int, int]:
+    """
+    Counts the connections opened by a session and how many requests reused an already
+    opened connection.
+
+    :param session: A session created by `create_session`.
+    :return: A tuple containing the number of opened connections and the number of reused
+        connections.
+    """
+    opened_count = 0
+    request_count = 0
+    adapters = {id(adapter): adapter for adapter in session.adapters.values()}.values()
+    for adapter in adapters:
+        if not isinstance(adapter, HTTPAdapter):
+            continue
+        pools = adapter.poolmanager.pools
+        # The pool container does not support iteration, only listing its keys.
+        for key in pools.keys():
+            pool = pools[key]
+            opened_count += pool.num_connections
+            request_count += pool.num_requests
+    return opened_count, max(0, request_count - opened_count)
+
+
+def download_content(
+    url: str,
+    session: requests.Session | None = None,
+    partial_file: Path | None = None,
+    validators: dict[str, Any] | None = None,
+    head_rewriter: HeadRewriter | None = None,
+) -> DownloadedContent:
     """
     Downloads content from a given URL and saves it to a temporary file. Provides the file
-    path and MIME type of the content as output.
+    path, MIME type, HTTP validators and checksum of the content as output.
+
+    The content is streamed to the file in chunks of `DOWNLOAD_CHUNK_SIZE` bytes, so memory
+    usage does not depend on the size of the resource. Its checksum is computed on the fly.
+
+    If a partial file is provided, the content is downloaded into it and kept there if the
+    transfer is interrupted (otherwise, it is downloaded into a temporary file, deleted if the
+    transfer fails). The next call resumes the transfer with a range request, as long
+    as the server still serves the same content (same `ETag`/`Last-Modified` and length);
+    otherwise, the content is downloaded again in full.
+
+    If validators of a previous download are provided, the request is conditional: content
+    that has not been modified since is not downloaded again.
+
+    If a head rewriter is provided, it may rewrite the beginning of the content before it is
+    written. A resumed download keeps the head written by the interrupted one.
+
+    The format of the content is detected from its first chunk (see `sniff_extension`), so
+    that the file does not need to be read again to find it.
 
     :param url: The URL of the resource to download.
-    :return: A tuple containing the path to the downloaded temporary file and the MIME type
-        of the resource.
+    :param session: The HTTP session to use, a new connection is opened if not provided.
+    :param partial_file: The file to download the content into, resuming a previous transfer.
+    :param validators: The validators of a previous download of the content.
+    :param head_rewriter: Rewrites the beginning of the content.
+    :return: The downloaded content.
+    :raises NotModifiedError: If the content has not been modified since the previous download.
+    """
+    if partial_file is None:
+        # Not resumable: the temporary file is deleted whatever happens to the download.
+        with NamedTemporaryFile(delete=False) as temp_file:
+            temp_partial_file = Path(temp_file.name)
+        try:
+            return download_content(url, session, temp_partial_file, validators, head_rewriter)
+        except BaseException:
+            _discard_partial_file(temp_partial_file, temp_partial_file.with_name(f'{temp_partial_file.name}.json'))
+            raise
+
+    partial_info_file = partial_file.with_name(f'{partial_file.name}.json')
+
+    headers, offset = _get_resume_headers(url, partial_file, partial_info_file)
+    if not offset and validators:
+        headers = _get_conditional_headers(validators)
+    with _http_get(url, session, stream=True, headers=headers) as response:
+        if response.status_code == HTTPStatus.NOT_MODIFIED:
+            raise NotModifiedError(url)
+        if offset and response.status_code == HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE:
+            logger.debug(f'Cannot resume download of {url}, downloading it again.')
+            _discard_partial_file(partial_file, partial_info_file)
+            return download_content(url, session, partial_file, validators, head_rewriter)
+        response.raise_for_status()
+
+        if response.status_code == HTTPStatus.PARTIAL_CONTENT:
+            partial_info = _load_partial_info(partial_info_file) or {}
+            if not _is_valid_resumed_response(response, offset, partial_info):
+                logger.debug(f'Unexpected resumed content for {url}, downloading it again.')
+                _discard_partial_file(partial_file, partial_info_file)
+                return download_content(url, session, partial_file, validators, head_rewriter)
+            logger.debug(f'Resuming download of {url} from byte {offset}.')
+            content_validators = {key: partial_info.get(key) for key in ['etag', 'last_modified', 'content_length']}
+            head_key = partial_info.get('head_key')
+            extension = partial_info.get('extension')
+            # The checksum covers the whole content, including the part already downloaded.
+            checksum = hashlib.sha256()
+            for chunk in _read_chunks(partial_file):
+                checksum.update(chunk)
+            received_chunks = _ChunkCounter(response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE))
+            chunks: Iterator[bytes] = received_chunks
+            mode = 'ab'
+        else:
+            # Full content: the server ignored the range, or the content changed.
+            content_validators = get_validators(response.headers)
+            received_chunks = _ChunkCounter(response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE))
+            chunks, extension = _sniff_chunks(received_chunks)
+            partial_info = {'url': url, **content_validators, 'extension': extension}
+            partial_info_file.write_text(json.dumps(partial_info), encoding='utf-8')
+            head_key = None
+            checksum = hashlib.sha256()
+            mode = 'wb'
+
+        if mode == 'wb' and head_rewriter is not None:
+            head, head_key = _rewrite_head(chunks, head_rewriter, partial_info, partial_info_file)
+            chunks = itertools.chain([head], chunks)
+        with open(partial_file, mode) as file:
+            for chunk in chunks:
+                file.write(chunk)
+                checksum.update(chunk)
+
+    partial_info_file.unlink(missing_ok=True)
+    return DownloadedContent(
+        partial_file,
+        get_mime_type(response.headers),
+        content_validators,
+        checksum.hexdigest(),
+        head_key,
+        extension,
+        received_chunks.byte_count,
+    )
+
+
+class _ChunkCounter:
+    """
+    Counts the bytes of the chunks received from the server.
     """
-    response = requests.get(url)
-    response.raise_for_status()
 
-    with NamedTemporaryFile(delete=False) as temp_file:
-        temp_file.write(response.content)
+    def __init__(self, chunks: Iterator[bytes]):
+        self._chunks = chunks
+        self.byte_count = 0
+
+    def __iter__(self) -> Iterator[bytes]:
+        return self
+
+    def __next__(self) -> bytes:
+        chunk = next(self._chunks)
+        self.byte_count += len(chunk)
+        return chunk
+
+
+def _sniff_chunks(chunks: Iterator[bytes]) -> tuple[Iterator[bytes], str | None]:
+    # Detect the format from the first chunk, without consuming it.
+    first_chunk = next(chunks, b'')
+    return itertools.chain([first_chunk], chunks), sniff_extension(first_chunk)
+
+
+def _rewrite_head(
+    chunks: Iterator[bytes],
+    head_rewriter: HeadRewriter,
+    partial_info: dict[str, Any],
+    partial_info_file: Path,
+) -> tuple[bytes, str | None]:
+    """
+    Reads the beginning of the content until the head rewriter can rewrite it. The remaining
+    chunks are left in the iterator.
+
+    :param chunks: The chunks of the content.
+    :param head_rewriter: Rewrites the beginning of the content.
+    :param partial_info: The information needed to resume the download.
+    :param partial_info_file: The file to save the information needed to resume the download into.
+    :return: A tuple containing the head to write, and the key of the head rewriter, or `None`
+        if the head has not been rewritten.
+    """
+    head = b''
+    for chunk in chunks:
+        head += chunk
+        result = head_rewriter.rewrite_head(head)
+        if result is None and len(head) <= MAX_HEAD_SIZE:
+            continue
+        if result is None or not result[0]:
+            break
+        new_head, replaced_size = result
+        # Resuming must take the size difference of the rewritten head into account.
+        partial_info.update({'head_key': head_rewriter.key, 'head_delta': len(new_head) - replaced_size})
+        partial_info_file.write_text(json.dumps(partial_info), encoding='utf-8')
+        return new_head + head[replaced_size:], head_rewriter.key
+    return head, None
+
+
+def _get_conditional_headers(validators: dict[str, Any]) -> dict[str, str]:
+    headers = {}
+    if validators.get('etag'):
+        headers['If-None-Match'] = validators['etag']
+    if validators.get('last_modified'):
+        headers['If-Modified-Since'] = validators['last_modified']
+    return headers
+
+
+def _get_resume_headers(url: str, partial_file: Path, partial_info_file: Path) -> tuple[dict[str, str], int]:
+    """
+    Builds the headers of a range request resuming the download into a partial file.
+
+    :return: A tuple containing the request headers and the offset the download resumes from,
+        or no headers and 0 if the download cannot be resumed.
+    """
+    file_size = partial_file.stat().st_size if partial_file.exists() else 0
+    partial_info = _load_partial_info(partial_info_file)
+    if not file_size or partial_info is None or content_url(partial_info.get('url') or '') != content_url(url):
+        return {}, 0
+    # Offset in the content as served, before its head was rewritten.
+    offset = file_size - partial_info.get('head_delta', 0)
+
+    # Only strong validators can be used to resume a download.
+    etag = partial_info.get('etag')
+    validator = etag if etag and not etag.startswith('W/') else partial_info.get('last_modified')
+    content_length = partial_info.get('content_length')
+    if not validator or (content_length is not None and offset >= content_length):
+        return {}, 0
+
+    return {'Range': f'bytes={offset}-', 'If-Range': validator}, offset
 
-    return Path(temp_file.name), get_mime_type(response.headers)
 
+def _is_valid_resumed_response(response: requests.Response, offset: int, partial_info: dict[str, Any]) -> bool:
+    match = CONTENT_RANGE_PATTERN.fullmatch(response.headers.get('Content-Range', '').strip())
+    if match is None or int(match.group('start')) != offset:
+        return False
 
-def fetch_page(url: str) -> str | None:
-    response = requests.get(url)
-    if response.status_code != HTTPStatus.OK:
-        logger.error('Error while fetching page: %d', response.status_code)
+    expected_content_length = partial_info.get('content_length')
+    if match.group('length') != '*' and expected_content_length is not None:
+        if int(match.group('length')) != expected_content_length:
+            return False
+
+    etag = response.headers.get('ETag')
+    return not (etag and partial_info.get('etag') and etag != partial_info['etag'])
+
+
+def _load_partial_info(partial_info_file: Path) -> dict[str, Any] | None:
+    if not partial_info_file.exists():
+        return None
+    try:
+        partial_info = json.loads(partial_info_file.read_text(encoding='utf-8'))
+    except ValueError:
         return None
-    return response.text
+    return partial_info if isinstance(partial_info, dict) else None
+
+
+def _discard_partial_file(partial_file: Path, partial_info_file: Path) -> None:
+    partial_file.unlink(missing_ok=True)
+    partial_info_file.unlink(missing_ok=True)
+
+
+def canonical_url(url: str) -> str:
+    """
+    Normalizes a URL, so that different spellings of the same URL are equal: the scheme and
+    host are lowercased, default ports, trailing slashes and fragments are removed, and query
+    parameters are sorted.
+
+    :param url: The URL to normalize.
+    :return: The canonical form of the URL.
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    netloc = parts.hostname or ''
+    if parts.port is not None and (scheme, parts.port) not in [('http', 80), ('https', 443)]:
+        netloc = f'{netloc}:{parts.port}'
+    path = parts.path.rstrip('/')
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((scheme, netloc, path, query, ''))
+
+
+def content_url(url: str) -> str:
+    """
+    Identifies content across backups by its URL: the canonical URL (see `canonical_url`)
+    without its query. The query of content URLs may carry a signature that changes each
+    time the card page is fetched, while the content stays the same.
+
+    :param url: The URL of the content.
+    :return: The URL identifying the content.
+    """
+    parts = urlsplit(canonical_url(url))
+    return urlunsplit((parts.scheme, parts.netloc, parts.path, '', ''))
+
+
+def fetch_page(url: str, session: requests.Session | None = None) -> str | None:
+    """
+    Fetches the HTML content of a card page.
+
+    The page is streamed and decoded incrementally. Reading stops as soon as the script
+    element containing the card data has been received, so the rest of the page is neither
+    transferred nor decoded (the connection is closed instead of being reused).
+
+    :param url: The URL of the page.
+    :param session: The HTTP session to use, a new connection is opened if not provided.
+    :return: The HTML content of the page, up to the end of its data script element if it
+        has one, or `None` if the page could not be fetched.
+    :raises HTTPError: If the server failed with a transient error (e.g. "503 Service
+        Unavailable"), the page may be fetched if retried.
+    """
+    with _http_get(url, session, stream=True) as response:
+        if response.status_code in RETRYABLE_STATUS_CODES:
+            response.raise_for_status()
+        if response.status_code != HTTPStatus.OK:
+            logger.error('Error while fetching page: %d', response.status_code)
+            return None
+        decoder = codecs.getincrementaldecoder(response.encoding or 'utf-8')(errors='replace')
+        page_content = ''
+        for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+            # Closing tags may be split between chunks: look for them a bit before the new text.
+            search_start = max(len(page_content) - len('</script'), 0)
+            page_content += decoder.decode(chunk)
+            if page_content.find('</script', search_start) != -1 and NEXT_DATA_PATTERN.search(page_content):
+                logger.debug(f'Data found, stopping the transfer of {url}.')
+                return page_content
+        return page_content + decoder.decode(b'', final=True)
+
+
+def _http_get(url: str, session: requests.Session | None, **kwargs: Any) -> requests.Response:
+    if session is None:
+        return requests.get(url, **kwargs)
+    return session.get(url, **kwargs)
 
 
 def find_data(html: str) -> Any:
+    """
+    Extracts the JSON data of a card page, embedded in its `__NEXT_DATA__` script element.
+
+    The script element is looked up with a regular expression, which is much faster than
+    parsing the whole page. If it is not found that way, or its content is not valid JSON,
+    the page is parsed with BeautifulSoup instead.
+
+    :param html: The HTML content of the page.
+    :return: The JSON data, or `None` if it was not found.
+    """
+    match = NEXT_DATA_PATTERN.search(html)
+    if match is not None:
+        try:
+            return json_loads(match.group('data'))
+        except ValueError:
+            logger.debug('Error while parsing JSON data found by the fast path, parsing HTML.')
+    return _find_data_with_beautiful_soup(html)
+
+
+def _find_data_with_beautiful_soup(html: str) -> Any:
+    # Slow to import, and rarely needed: only imported when the fast path fails.
+    from bs4 import BeautifulSoup, Tag  # noqa: PLC0415
+
     soup = BeautifulSoup(html, 'html.parser')
     tag = soup.find('script', id='__NEXT_DATA__')
     if not tag or not isinstance(tag, Tag) or not tag.string:
@@ -112,6 +647,101 @@ def find_data(html: str) -> Any:
         return None
 
 
+def compute_checksum(file: Path) -> str:
+    """
+    Computes the SHA-256 checksum of a file, reading it in chunks.
+
+    :param file: The file to compute the checksum of.
+    :return: The hexadecimal checksum.
+    """
+    checksum = hashlib.sha256()
+    for chunk in _read_chunks(file):
+        checksum.update(chunk)
+    return checksum.hexdigest()
+
+
+def _read_chunks(file: Path) -> Iterator[bytes]:
+    with open(file, 'rb') as f:
+        yield from iter(lambda: f.read(DOWNLOAD_CHUNK_SIZE), b'')
+
+
+def move_file(source: Path, destination: Path) -> None:
+    """
+    Moves a file to its destination, replacing any existing file. On the same filesystem, the
+    file is renamed atomically: the destination is never left half-written.
+
+    :param source: The file to move.
+    :param destination: The new path of the file.
+    """
+    try:
+        os.replace(source, destination)
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+        # Different filesystems: fall back to a copy.
+        logger.debug(f'Failed to rename {source} to {destination}, copying it.')
+        shutil.move(source, destination)
+
+
+def link_or_copy(source: Path, destination: Path, hardlink: bool = True) -> None:
+    """
+    Makes the content of a file available at another path, sharing storage when possible.
+
+    :param source: The file to link or copy.
+    :param destination: The path of the new file.
+    :param hardlink: Whether a hard link may be created. Content that will be modified in
+        place (e.g. tagged tracks) must not be hard linked: it is cloned (copy-on-write) where
+        the filesystem supports it, and copied otherwise.
+    """
+    if hardlink:
+        try:
+            os.link(source, destination)
+        except OSError:
+            # Different filesystems, or links not supported: fall back to a copy.
+            logger.debug(f'Failed to link {source} to {destination}, copying it.')
+        else:
+            return
+    elif _clone_file(source, destination):
+        return
+    shutil.copyfile(source, destination)
+
+
+def _clone_file(source: Path, destination: Path) -> bool:
+    """
+    Clones a file (reflink), sharing its storage until one of the copies is modified. Only
+    supported on Linux, by filesystems such as Btrfs or XFS.
+
+    :return: Whether the file has been cloned.
+    """
+    if sys.platform != 'linux':
+        return False
+    try:
+        with open(source, 'rb') as source_file, open(destination, 'wb') as destination_file:
+            fcntl.ioctl(destination_file.fileno(), FICLONE, source_file.fileno())
+    except OSError:
+        destination.unlink(missing_ok=True)
+        return False
+    return True
+
+
+def can_clone_files(source_directory: Path, destination_directory: Path) -> bool:
+    """
+    Tells whether files of a directory can be cloned (see `_clone_file`) into another one.
+
+    :param source_directory: The directory of the files to clone, it must exist.
+    :param destination_directory: The directory of the clones, it must exist.
+    :return: Whether files can be cloned.
+    """
+    with NamedTemporaryFile(dir=source_directory, prefix='.clone-') as source_file:
+        source_file.write(b'clone')
+        source_file.flush()
+        destination = destination_directory / Path(source_file.name).name
+        try:
+            return _clone_file(Path(source_file.name), destination)
+        finally:
+            destination.unlink(missing_ok=True)
+
+
 def should_overwrite_directory(directory: Path) -> bool:
     """
     Prompt the user to confirm overwriting an existing directory.
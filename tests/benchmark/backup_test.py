@@ -0,0 +1,299 @@
+#
+# SPDX-License-Identifier: MPL-2.0
+#
+# Copyright (c) 2025-2026 "Laurent Desgrange".
+#
+# This file is part of "toto-backup".
+# See "https://github.com/ldesgrange/toto-backup") for further information.
+#
+# This Source Code Form is subject to the terms of the
+# Mozilla Public License, v. 2.0. If a copy of the MPL
+# was not distributed with this file, You can obtain one
+# at https://mozilla.org/MPL/2.0/.
+#
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler
+from pathlib import Path
+from typing import Any, ClassVar
+
+import pytest
+
+from utils import (
+    generate_card_data,
+    generate_card_page,
+    generate_large_track,
+    get_dummy_m4a_file,
+    get_dummy_mp3_file,
+    get_dummy_png_file,
+    get_project_root,
+    local_http_server,
+)
+
+logger = logging.getLogger(__name__)
+
+pytestmark = pytest.mark.skipif(sys.platform == 'win32', reason='Resource usage of child processes is POSIX only.')
+
+# Results of each run are appended to this file, one JSON object per line, to compare runs.
+RESULTS_FILE = Path(os.environ.get('TOTO_BACKUP_BENCHMARK_RESULTS', get_project_root() / '.benchmarks/backup.jsonl'))
+# Chunk size of responses, and unit of bandwidth shaping.
+RESPONSE_CHUNK_SIZE = 64 * 1024
+CONTENT_TYPES = {'.m4a': 'audio/x-m4a', '.mp3': 'audio/mpeg'}
+
+
+class Scenario:
+    """
+    A card served by the stand-in server, and how the server behaves.
+    """
+
+    def __init__(  # noqa: PLR0913
+        self,
+        name: str,
+        chapter_count: int,
+        *,
+        track_count_per_chapter: int = 1,
+        track_size: int = 1024 * 1024,
+        track_format: str = '.m4a',
+        latency: float = 0.0,
+        bandwidth: int | None = None,
+        error_rate: float = 0.0,
+        jobs: int = 4,
+    ):
+        self.name = name
+        self.chapter_count = chapter_count
+        self.track_count_per_chapter = track_count_per_chapter
+        self.track_size = track_size
+        self.track_format = track_format
+        # Delay before each response, in seconds.
+        self.latency = latency
+        # Bytes per second per connection, unlimited if `None`.
+        self.bandwidth = bandwidth
+        # Share of content requests failing with "503 Service Unavailable".
+        self.error_rate = error_rate
+        self.jobs = jobs
+
+    @property
+    def track_count(self) -> int:
+        return self.chapter_count * self.track_count_per_chapter
+
+    def __repr__(self) -> str:
+        return self.name
+
+
+SCENARIOS = [
+    # Lots of small tracks: per-request overhead, parsing and tagging dominate.
+    Scenario('small-tracks', chapter_count=50, track_size=256 * 1024),
+    # A real-sized card on a fast local network.
+    Scenario('real-card', chapter_count=20, track_size=8 * 1024 * 1024, latency=0.02),
+    # MP3 tracks, tagged while downloading.
+    Scenario('mp3-tracks', chapter_count=20, track_size=8 * 1024 * 1024, track_format='.mp3', latency=0.02),
+    # A distant server with limited bandwidth per connection: concurrency matters.
+    Scenario('slow-server', chapter_count=8, track_size=2 * 1024 * 1024, latency=0.1, bandwidth=8 * 1024 * 1024),
+    # A server failing every now and then: retries matter.
+    Scenario('flaky-server', chapter_count=20, track_size=1024 * 1024, latency=0.02, error_rate=0.1),
+    # Chapters of many tracks sharing their icon, downloaded by many workers at once.
+    Scenario('shared-icons', chapter_count=4, track_count_per_chapter=12, track_size=256 * 1024, jobs=12),
+]
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """
+    Serves the page, cover, icons and tracks of the card of a scenario, like the Yoto servers.
+    Configured by subclassing (see `create_handler_class`).
+    """
+
+    protocol_version = 'HTTP/1.1'
+    scenario: ClassVar[Scenario]
+    track: ClassVar[bytes]
+    image: ClassVar[bytes]
+    lock: ClassVar[threading.Lock]
+    random: ClassVar[random.Random]
+    request_count: ClassVar[int]
+    sent_byte_count: ClassVar[int]
+
+    def do_GET(self):
+        with self.lock:
+            type(self).request_count += 1
+            fail = self.path != '/card' and self.random.random() < self.scenario.error_rate
+        time.sleep(self.scenario.latency)
+        if fail:
+            self.send_response(503)
+            self.send_header('Retry-After', '0')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+        elif self.path == '/card':
+            self.send_body(self.generate_page(), 'text/html; charset=utf-8')
+        elif '-track-' in self.path:
+            self.send_body(self.track, CONTENT_TYPES[self.scenario.track_format])
+        elif self.path.endswith(('/cover', '-icon')):
+            self.send_body(self.image, 'image/png')
+        else:
+            self.send_error(404)
+
+    def generate_page(self) -> bytes:
+        scenario = self.scenario
+        base_url = f'http://127.0.0.1:{self.server.server_address[1]}'
+        data = generate_card_data(scenario.chapter_count, scenario.track_count_per_chapter, base_url)
+        # Real-sized page, with markup around the data.
+        return generate_card_page(data, 100 * scenario.chapter_count).encode()
+
+    def send_body(self, body: bytes, content_type: str) -> None:
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        try:
+            for start in range(0, len(body), RESPONSE_CHUNK_SIZE):
+                chunk = body[start : start + RESPONSE_CHUNK_SIZE]
+                self.wfile.write(chunk)
+                with self.lock:
+                    type(self).sent_byte_count += len(chunk)
+                if self.scenario.bandwidth is not None:
+                    time.sleep(len(chunk) / self.scenario.bandwidth)
+        except OSError:
+            # Client closed the connection.
+            pass
+
+    def log_message(self, *_args):
+        pass
+
+
+def create_handler_class(scenario: Scenario, track_file: Path) -> type[StandInHandler]:
+    return type(
+        f'{scenario.name}Handler',
+        (StandInHandler,),
+        {
+            'scenario': scenario,
+            'track': track_file.read_bytes(),
+            'image': get_dummy_png_file().read_bytes(),
+            'lock': threading.Lock(),
+            'random': random.Random(scenario.name),
+            'request_count': 0,
+            'sent_byte_count': 0,
+        },
+    )
+
+
+@pytest.mark.parametrize('scenario', SCENARIOS, ids=repr)
+def test_backup_benchmark(scenario: Scenario, tmp_path: Path):
+    dummy_track_file = get_dummy_mp3_file() if scenario.track_format == '.mp3' else get_dummy_m4a_file()
+    track_file = generate_large_track(dummy_track_file, tmp_path / f'track{scenario.track_format}', scenario.track_size)
+    backup_directory = tmp_path / 'backup'
+    backup_directory.mkdir()
+    server = create_handler_class(scenario, track_file)
+
+    with local_http_server(server) as base_url:
+        result = run_backup(f'{base_url}/card', scenario.jobs, backup_directory)
+
+    assert result['exit_code'] == 0, result['output']
+    assert f'{scenario.track_count} tracks backed up successfully, 0 failed.' in result['output']
+    record = {
+        'timestamp': time.time(),
+        'commit': get_commit(),
+        'python': platform.python_version(),
+        'scenario': scenario.name,
+        'parameters': {key: value for key, value in vars(scenario).items() if key != 'name'},
+        'wall_time': result['wall_time'],
+        'cpu_time': result['cpu_time'],
+        'peak_memory': result['peak_memory'],
+        'request_count': server.request_count,
+        'bytes': server.sent_byte_count,
+        'throughput': server.sent_byte_count / result['wall_time'],
+        'retries': result['metrics']['retries'],
+        'phases': result['metrics']['phases'],
+    }
+    previous_record = get_previous_record(scenario.name)
+    save_record(record)
+
+    print(
+        f'\nBackup of {scenario.name} ({scenario.track_count} tracks): {record["wall_time"]:.2f} s, '
+        f'{record["throughput"] / 1024 / 1024:.1f} MB/s, {record["request_count"]} requests, '
+        f'CPU {record["cpu_time"]:.2f} s, peak memory {record["peak_memory"] / 1024 / 1024:.0f} MB'
+        + (
+            f' (previous run: {previous_record["wall_time"]:.2f} s, '
+            f'{previous_record["peak_memory"] / 1024 / 1024:.0f} MB)'
+            if previous_record is not None
+            else ''
+        )
+    )
+
+
+def run_backup(url: str, jobs: int, directory: Path) -> dict[str, Any]:
+    """
+    Backs up a card with the real command, in a child process so that its resources are
+    measured apart from the server.
+
+    :return: The exit code, output, wall and CPU time (in seconds), peak memory (in bytes) and
+        metrics (see `--metrics`) of the backup.
+    """
+    metrics_file = directory / 'metrics.json'
+    command = [
+        sys.executable,
+        '-c',
+        'from toto_backup.toto_backup import main; main()',
+        '--jobs',
+        str(jobs),
+        '--metrics',
+        str(metrics_file),
+        url,
+    ]
+    python_path = os.pathsep.join(filter(None, [str(get_project_root() / 'src'), os.environ.get('PYTHONPATH')]))
+    start_time = time.perf_counter()
+    process = subprocess.Popen(
+        command,
+        cwd=directory,
+        env={**os.environ, 'PYTHONPATH': python_path},
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+    )
+    output = process.stdout.read().decode() if process.stdout is not None else ''
+    # Unlike `resource.getrusage`, `wait4` measures this child only.
+    _, status, usage = os.wait4(process.pid, 0)
+    wall_time = time.perf_counter() - start_time
+    process.returncode = os.waitstatus_to_exitcode(status)
+    # Kilobytes on Linux, bytes on macOS.
+    peak_memory = usage.ru_maxrss if sys.platform == 'darwin' else usage.ru_maxrss * 1024
+    return {
+        'exit_code': process.returncode,
+        'output': output,
+        'wall_time': wall_time,
+        'cpu_time': usage.ru_utime + usage.ru_stime,
+        'peak_memory': peak_memory,
+        'metrics': json.loads(metrics_file.read_text()) if metrics_file.exists() else {},
+    }
+
+
+def get_commit() -> str | None:
+    try:
+        result = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=get_project_root(),
+            capture_output=True,
+            text=True,
+            check=False,
+        )
+    except OSError:
+        # Git is not installed.
+        return None
+    return result.stdout.strip() if result.returncode == 0 else None
+
+
+def get_previous_record(scenario_name: str) -> dict[str, Any] | None:
+    if not RESULTS_FILE.exists():
+        return None
+    records = [json.loads(line) for line in RESULTS_FILE.read_text().splitlines() if line]
+    return next((record for record in reversed(records) if record['scenario'] == scenario_name), None)
+
+
+def save_record(record: dict[str, Any]) -> None:
+    RESULTS_FILE.parent.mkdir(parents=True, exist_ok=True)
+    with RESULTS_FILE.open('a', encoding='utf-8') as file:
+        file.write(json.dumps(record) + '\n')
@@ -0,0 +1,45 @@
+#
+# SPDX-License-Identifier: MPL-2.0
+#
+# Copyright (c) 2025-2026 "Laurent Desgrange".
+#
+# This file is part of "toto-backup".
+# See "https://github.com/ldesgrange/toto-backup") for further information.
+#
+# This Source Code Form is subject to the terms of the
+# Mozilla Public License, v. 2.0. If a copy of the MPL
+# was not distributed with this file, You can obtain one
+# at https://mozilla.org/MPL/2.0/.
+#
+import logging
+
+import pytest
+
+from toto_backup.utils import find_data, _find_data_with_beautiful_soup, json_loads
+from utils import generate_card_data, generate_card_page, measure_time
+
+logger = logging.getLogger(__name__)
+
+
+@pytest.mark.parametrize(
+    ('chapter_count', 'element_count'),
+    [
+        (10, 100),  # Small card, ~12 KB page.
+        (100, 1000),  # Real-sized card, ~120 KB page.
+        (1000, 10000),  # Large card, ~1.2 MB page.
+    ],
+)
+def test_find_data_benchmark(chapter_count: int, element_count: int):
+    data = generate_card_data(chapter_count)
+    html = generate_card_page(data, element_count)
+    assert find_data(html) == _find_data_with_beautiful_soup(html) == data
+
+    fast_time = measure_time(lambda: find_data(html))
+    beautiful_soup_time = measure_time(lambda: _find_data_with_beautiful_soup(html), repeat=3)
+
+    print(
+        f'\nfind_data on a {len(html) // 1024} KB page ({json_loads.__module__}): '
+        f'fast path {fast_time * 1000:.2f} ms, BeautifulSoup {beautiful_soup_time * 1000:.2f} ms '
+        f'({beautiful_soup_time / fast_time:.0f}x faster)'
+    )
+    assert fast_time < beautiful_soup_time
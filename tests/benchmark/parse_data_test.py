@@ -0,0 +1,104 @@
+#
+# SPDX-License-Identifier: MPL-2.0
+#
+# Copyright (c) 2025-2026 "Laurent Desgrange".
+#
+# This file is part of "toto-backup".
+# See "https://github.com/ldesgrange/toto-backup") for further information.
+#
+# This Source Code Form is subject to the terms of the
+# Mozilla Public License, v. 2.0. If a copy of the MPL
+# was not distributed with this file, You can obtain one
+# at https://mozilla.org/MPL/2.0/.
+#
+import logging
+import tracemalloc
+from collections.abc import Callable
+from typing import Any
+
+import pytest
+
+from toto_backup.card import Card, Chapter, parse_data, Track
+from toto_backup.tag import Metadata
+from utils import generate_card_data, measure_time
+
+logger = logging.getLogger(__name__)
+
+OBJECT_COUNT = 10_000
+
+
+@pytest.mark.parametrize(
+    ('chapter_count', 'track_count_per_chapter'),
+    [
+        (100, 10),  # 1k tracks.
+        (1000, 10),  # 10k tracks.
+        (10000, 10),  # 100k tracks, in many chapters.
+        (1, 100000),  # 100k tracks, in a single chapter.
+    ],
+)
+def test_parse_data_benchmark(chapter_count: int, track_count_per_chapter: int):
+    track_count = chapter_count * track_count_per_chapter
+    data = generate_card_data(chapter_count, track_count_per_chapter)
+
+    parse_time = measure_time(lambda: parse_data(data), repeat=3)
+    memory = measure_memory(lambda: parse_data(data))
+
+    print(
+        f'\nparse_data of {track_count} tracks in {chapter_count} chapters: {parse_time * 1000:.2f} ms '
+        f'({parse_time / track_count * 1_000_000:.2f} µs and {memory / track_count:.0f} bytes per track)'
+    )
+
+
+def test_parse_data_should_scale_linearly():
+    small_data = generate_card_data(1000, 10)
+    large_data = generate_card_data(10000, 10)
+
+    small_time = measure_time(lambda: parse_data(small_data), repeat=3)
+    large_time = measure_time(lambda: parse_data(large_data), repeat=3)
+
+    print(f'\nparse_data of 10 times more tracks: {large_time / small_time:.1f} times longer')
+    # Quadratic duplicate checks would make it about 100 times longer.
+    assert large_time / small_time < 50  # noqa: PLR2004
+
+
+def create_metadata() -> Metadata:
+    track_metadata = Metadata()
+    track_metadata.author = 'Author'
+    track_metadata.title = 'Title'
+    track_metadata.track_name = 'Track Name'
+    track_metadata.track_number = 1
+    track_metadata.track_total = 1
+    track_metadata.card_url = 'https://example.url/card'
+    return track_metadata
+
+
+@pytest.mark.parametrize(
+    'create_object',
+    [
+        lambda: Track(1, 'Track 1', 'https://example.url/track'),
+        lambda: Chapter(1, 'Chapter 1', 'https://example.url/icon'),
+        lambda: Card('Title', 'Author', 'https://example.url/cover'),
+        create_metadata,
+    ],
+    ids=['Track', 'Chapter', 'Card', 'Metadata'],
+)
+def test_object_memory_benchmark(create_object: Callable[[], Any]):
+    memory = measure_memory(lambda: [create_object() for _ in range(OBJECT_COUNT)])
+
+    print(f'\n{type(create_object()).__name__}: {memory / OBJECT_COUNT:.0f} bytes per object')
+
+
+def measure_memory(function: Callable[[], Any]) -> int:
+    """
+    Measures the memory allocated by a function for its result (the result is kept while measuring).
+
+    :return: The allocated memory, in bytes.
+    """
+    tracemalloc.start()
+    try:
+        result = function()
+        memory, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del result
+    return memory
@@ -0,0 +1,101 @@
+#
+# SPDX-License-Identifier: MPL-2.0
+#
+# Copyright (c) 2025-2026 "Laurent Desgrange".
+#
+# This file is part of "toto-backup".
+# See "https://github.com/ldesgrange/toto-backup") for further information.
+#
+# This Source Code Form is subject to the terms of the
+# Mozilla Public License, v. 2.0. If a copy of the MPL
+# was not distributed with this file, You can obtain one
+# at https://mozilla.org/MPL/2.0/.
+#
+import logging
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+from utils import get_project_root
+
+logger = logging.getLogger(__name__)
+
+REPEAT = 5
+# Budget of the import time of the command, in milliseconds. Machine-dependent: override it
+# with `TOTO_BACKUP_BENCHMARK_STARTUP_BUDGET` on slower machines.
+STARTUP_BUDGET = float(os.environ.get('TOTO_BACKUP_BENCHMARK_STARTUP_BUDGET', '500'))
+# Modules only needed to tag tracks of a given format or to parse unusual pages.
+LAZY_MODULES = [
+    'bs4',
+    'mutagen.flac',
+    'mutagen.id3',
+    'mutagen.mp4',
+    'mutagen.ogg',
+    'mutagen.oggopus',
+    'mutagen.oggvorbis',
+    'puremagic',
+]
+
+
+@pytest.mark.parametrize(
+    'arguments',
+    [
+        ['--help'],
+        # Fails immediately: neither a card URL nor --batch.
+        [],
+    ],
+    ids=['help', 'no-op'],
+)
+def test_startup_benchmark(arguments: list[str]):
+    interpreter_imports = measure_imports('pass')
+    wall_time = float('inf')
+    for _ in range(REPEAT):
+        start_time = time.perf_counter()
+        imports = measure_imports('from toto_backup.toto_backup import main; main()', arguments)
+        wall_time = min(wall_time, time.perf_counter() - start_time)
+
+    # Modules imported by the command, not by the interpreter itself (`site`…).
+    import_time = sum(
+        cumulative for name, (depth, cumulative) in imports.items() if depth == 0 and name not in interpreter_imports
+    )
+    slowest_imports = sorted(
+        ((cumulative, name) for name, (depth, cumulative) in imports.items() if depth == 1), reverse=True
+    )[:5]
+    print(
+        f'\nStartup of toto_backup {" ".join(arguments) or "without arguments"}: {wall_time * 1000:.0f} ms, '
+        f'{import_time / 1000:.0f} ms importing modules (slowest: '
+        + ', '.join(f'{name} {cumulative / 1000:.0f} ms' for cumulative, name in slowest_imports)
+        + ')'
+    )
+    assert [module for module in LAZY_MODULES if module in imports] == []
+    assert import_time / 1000 < STARTUP_BUDGET
+
+
+def measure_imports(code: str, arguments: list[str] | None = None) -> dict[str, tuple[int, int]]:
+    """
+    Runs Python code in a new interpreter with `-X importtime`.
+
+    :param code: The code to run.
+    :param arguments: The command line arguments of the code.
+    :return: The depth and the cumulative import time (in microseconds) of each module imported.
+    """
+    python_path = os.pathsep.join(filter(None, [str(get_project_root() / 'src'), os.environ.get('PYTHONPATH')]))
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code, *(arguments or [])],
+        env={**os.environ, 'PYTHONPATH': python_path},
+        capture_output=True,
+        text=True,
+        check=False,
+    )
+    imports = {}
+    # Lines like `import time:       270 |        504 |   io`, nested imports being indented.
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        _, cumulative, name = line.removeprefix('import time:').split('|')
+        if cumulative.strip().isdigit():
+            imports[name.strip()] = ((len(name) - len(name.lstrip()) - 1) // 2, int(cumulative))
+    return imports
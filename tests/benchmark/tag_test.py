@@ -0,0 +1,228 @@
+#
+# SPDX-License-Identifier: MPL-2.0
+#
+# Copyright (c) 2025-2026 "Laurent Desgrange".
+#
+# This file is part of "toto-backup".
+# See "https://github.com/ldesgrange/toto-backup") for further information.
+#
+# This Source Code Form is subject to the terms of the
+# Mozilla Public License, v. 2.0. If a copy of the MPL
+# was not distributed with this file, You can obtain one
+# at https://mozilla.org/MPL/2.0/.
+#
+import logging
+import os
+import shutil
+import time
+from collections.abc import Callable
+from pathlib import Path
+
+import pytest
+from mutagen.easyid3 import EasyID3
+from mutagen.id3 import ID3, APIC, Encoding, PictureType
+
+from toto_backup.cover import cover_cache
+from toto_backup.tag import tag_track, Metadata
+from utils import (
+    generate_large_cover,
+    generate_large_track,
+    get_dummy_m4a_file,
+    get_dummy_mp3_file,
+    get_dummy_ogg_opus_file,
+    get_dummy_ogg_vorbis_file,
+    get_dummy_png_file,
+    get_io_counters,
+)
+
+logger = logging.getLogger(__name__)
+
+TRACK_SIZE = 64 * 1024 * 1024
+REPEAT = 3
+MB = 1024 * 1024
+# Sizes of the generated tracks and covers, in MB, and number of tracks tagged in a row, e.g.:
+# `TOTO_BACKUP_BENCHMARK_TRACK_SIZES=1,16,256 mise run bench`
+TRACK_SIZES = [float(size) for size in os.environ.get('TOTO_BACKUP_BENCHMARK_TRACK_SIZES', '1,16,64').split(',')]
+COVER_SIZES = [float(size) for size in os.environ.get('TOTO_BACKUP_BENCHMARK_COVER_SIZES', '0.1,1,4').split(',')]
+TRACK_COUNT = int(os.environ.get('TOTO_BACKUP_BENCHMARK_TRACK_COUNT', '50'))
+DUMMY_FILES = [get_dummy_mp3_file, get_dummy_m4a_file, get_dummy_ogg_vorbis_file, get_dummy_ogg_opus_file]
+
+
+@pytest.mark.parametrize('get_dummy_file', DUMMY_FILES)
+def test_tag_track_benchmark(get_dummy_file: Callable[[], Path], tmp_path: Path):
+    large_track_file = generate_large_track(get_dummy_file(), tmp_path / f'large{get_dummy_file().suffix}', TRACK_SIZE)
+    track_file = tmp_path / f'track{large_track_file.suffix}'
+    track_metadata = create_metadata()
+
+    first_tagging_time = measure_tagging_time(
+        large_track_file, track_file, lambda: tag_track(track_file, track_metadata)
+    )
+    # Tag again with other metadata, as when refreshing a backup.
+    track_metadata.track_name = 'Track Name, updated'
+    retagging_time = measure_tagging_time(track_file, track_file, lambda: tag_track(track_file, track_metadata))
+
+    print(
+        f'\ntag_track on a {TRACK_SIZE // 1024 // 1024} MB {large_track_file.suffix} track: '
+        f'first tagging {first_tagging_time * 1000:.2f} ms, re-tagging {retagging_time * 1000:.2f} ms'
+    )
+    assert retagging_time < first_tagging_time
+
+
+@pytest.mark.parametrize('track_size', TRACK_SIZES)
+@pytest.mark.parametrize('get_dummy_file', DUMMY_FILES)
+def test_tag_track_scaling_benchmark(get_dummy_file: Callable[[], Path], track_size: float, tmp_path: Path):
+    suffix = get_dummy_file().suffix
+    large_track_file = generate_large_track(get_dummy_file(), tmp_path / f'large{suffix}', int(track_size * MB))
+    track_file = tmp_path / f'track{suffix}'
+    track_metadata = create_metadata()
+
+    first_tagging = measure_tagging(large_track_file, track_file, lambda: tag_track(track_file, track_metadata))
+    track_metadata.track_name = 'Track Name, updated'
+    retagging = measure_tagging(track_file, track_file, lambda: tag_track(track_file, track_metadata))
+
+    size = large_track_file.stat().st_size
+    print(
+        f'\ntag_track on a {track_size:g} MB {suffix} track: '
+        f'first tagging {format_tagging(first_tagging, size)}, re-tagging {format_tagging(retagging, size)}'
+    )
+    if retagging.written is not None:
+        # Tags fit in the padding reserved by the first tagging: the file is not rewritten.
+        assert retagging.written < size / 2
+
+
+@pytest.mark.parametrize('cover_size', COVER_SIZES)
+@pytest.mark.parametrize('get_dummy_file', DUMMY_FILES)
+def test_tag_track_cover_size_benchmark(get_dummy_file: Callable[[], Path], cover_size: float, tmp_path: Path):
+    suffix = get_dummy_file().suffix
+    large_track_file = generate_large_track(get_dummy_file(), tmp_path / f'large{suffix}', 16 * MB)
+    track_file = tmp_path / f'track{suffix}'
+    track_metadata = create_metadata()
+    track_metadata.cover_file = generate_large_cover(tmp_path / 'cover.png', int(cover_size * MB))
+
+    first_tagging = measure_tagging(large_track_file, track_file, lambda: tag_track(track_file, track_metadata))
+
+    print(
+        f'\ntag_track on a 16 MB {suffix} track with a {cover_size:g} MB cover: '
+        f'{format_tagging(first_tagging, large_track_file.stat().st_size)}'
+    )
+
+
+@pytest.mark.parametrize('get_dummy_file', DUMMY_FILES)
+def test_tag_tracks_benchmark(get_dummy_file: Callable[[], Path], tmp_path: Path):
+    suffix = get_dummy_file().suffix
+    large_track_file = generate_large_track(get_dummy_file(), tmp_path / f'large{suffix}', MB)
+    track_files = [tmp_path / f'track{track_number}{suffix}' for track_number in range(TRACK_COUNT)]
+    for track_file in track_files:
+        shutil.copyfile(large_track_file, track_file)
+    track_metadata = create_metadata()
+    # Tracks of a card share its cover.
+    track_metadata.cover_file = generate_large_cover(tmp_path / 'cover.png', MB)
+    cover_cache.clear()
+
+    def tag_tracks() -> None:
+        for track_number, track_file in enumerate(track_files, 1):
+            track_metadata.track_number = track_number
+            tag_track(track_file, track_metadata)
+
+    tagging = measure_tagging(large_track_file, large_track_file, tag_tracks, repeat=1)
+
+    print(
+        f'\ntag_track on {TRACK_COUNT} 1 MB {suffix} tracks sharing a 1 MB cover: '
+        f'{tagging.time / TRACK_COUNT * 1000:.2f} ms per track, '
+        f'{format_tagging(tagging, large_track_file.stat().st_size * TRACK_COUNT)}'
+    )
+
+
+def test_add_id3_tags_benchmark(tmp_path: Path):
+    large_track_file = generate_large_track(get_dummy_mp3_file(), tmp_path / 'large.mp3', TRACK_SIZE)
+    track_file = tmp_path / 'track.mp3'
+    track_metadata = create_metadata()
+
+    single_save_time = measure_tagging_time(large_track_file, track_file, lambda: tag_track(track_file, track_metadata))
+    two_saves_time = measure_tagging_time(large_track_file, track_file, lambda: add_id3_tags_in_two_saves(track_file))
+
+    print(
+        f'\nFirst ID3 tagging of a {TRACK_SIZE // 1024 // 1024} MB track: '
+        f'single save {single_save_time * 1000:.2f} ms, EasyID3 then ID3 saves {two_saves_time * 1000:.2f} ms'
+    )
+
+
+class Tagging:
+    """
+    The measures of a tagging: the best time, and the bytes read and written (`None` where
+    unknown).
+    """
+
+    def __init__(self, time: float, read: int | None, written: int | None):
+        self.time = time
+        self.read = read
+        self.written = written
+
+
+def measure_tagging(source_file: Path, track_file: Path, tag: Callable[[], None], repeat: int = REPEAT) -> Tagging:
+    """
+    Measures the time and I/O to tag a track, starting from a copy of the source track each time.
+    """
+    best_time = float('inf')
+    read = written = None
+    for _ in range(repeat):
+        if source_file != track_file:
+            shutil.copyfile(source_file, track_file)
+        counters_before = get_io_counters()
+        start_time = time.perf_counter()
+        tag()
+        best_time = min(best_time, time.perf_counter() - start_time)
+        counters_after = get_io_counters()
+        if counters_before is not None and counters_after is not None:
+            read, written = (after - before for after, before in zip(counters_after, counters_before, strict=True))
+    return Tagging(best_time, read, written)
+
+
+def measure_tagging_time(source_file: Path, track_file: Path, tag: Callable[[], None]) -> float:
+    """
+    Measures the time to tag a track, starting from a copy of the source track each time.
+    """
+    return measure_tagging(source_file, track_file, tag).time
+
+
+def format_tagging(tagging: Tagging, size: int) -> str:
+    """
+    Formats the measures of a tagging, with the throughput over the size of the tagged tracks.
+    """
+    io = (
+        f', {tagging.read / MB:.2f} MB read, {tagging.written / MB:.2f} MB written'
+        if tagging.read is not None and tagging.written is not None
+        else ''
+    )
+    return f'{tagging.time * 1000:.2f} ms ({size / MB / tagging.time:.0f} MB/s{io})'
+
+
+def add_id3_tags_in_two_saves(track_file: Path) -> None:
+    # Former implementation of `add_id3_tags`, with the default padding.
+    tags = EasyID3(track_file)
+    tags['artist'] = 'Author'
+    tags['album'] = 'Title'
+    tags['title'] = 'Track Name'
+    tags.save()
+    tags_for_cover = ID3(track_file)
+    tags_for_cover.add(
+        APIC(
+            encoding=Encoding.UTF8,
+            mime='image/png',
+            type=PictureType.ILLUSTRATION,
+            data=get_dummy_png_file().read_bytes(),
+        )
+    )
+    tags_for_cover.save()
+
+
+def create_metadata() -> Metadata:
+    track_metadata = Metadata()
+    track_metadata.author = 'Author'
+    track_metadata.title = 'Title'
+    track_metadata.track_name = 'Track Name'
+    track_metadata.track_number = 1
+    track_metadata.track_total = 1
+    track_metadata.card_url = 'https://example.com/card'
+    track_metadata.cover_file = get_dummy_png_file()
+    return track_metadata
@@ -11,17 +11,21 @@
 # was not distributed with this file, You can obtain one
 # at https://mozilla.org/MPL/2.0/.
 #
+import json
 import logging
 import os
 import platform
+import pstats
 from pathlib import Path
+from unittest import mock
+from unittest.mock import Mock
 
 import pytest
 import responses
 from _pytest.logging import LogCaptureFixture
 from click.testing import CliRunner
 
-from toto_backup.toto_backup import main
+from toto_backup.toto_backup import main, ERROR_DIRECTORY_ALREADY_EXISTS, ERROR_INVALID_URL
 from utils import get_dummy_png_file, get_dummy_m4a_file
 
 logger = logging.getLogger(__name__)
@@ -39,19 +43,417 @@ def test_main_help(setup_teardown):
     result = runner.invoke(main, ['--help'])
     assert result.exit_code == 0
     assert result.output == (
-        'Usage: main [OPTIONS] URL\n'
+        'Usage: main [OPTIONS] [URL]\n'
         '\n'
         '  Simple backup tool for your Yoto cards.\n'
         '\n'
         '  URL is the URL of the Yoto card to back up (e.g.,\n'
-        '  https://yoto.io/XXXXX?ABCDEFGHIJKL=MNOPQRSTUVWXY).\n'
-        '\nOptions:'
-        '\n  --help  Show this message and exit.\n'
+        '  https://yoto.io/XXXXX?ABCDEFGHIJKL=MNOPQRSTUVWXY). To back up several cards at\n'
+        '  once, list their URLs in a file and use --batch instead.\n'
+        '\n'
+        'Options:\n'
+        '  -j, --jobs INTEGER RANGE        Number of tracks downloaded in parallel.\n'
+        '                                  [default: 1; x>=1]\n'
+        '  --resume                        Resume the backup in an existing card\n'
+        '                                  directory, only downloading what is missing or\n'
+        '                                  invalid.\n'
+        '  --refresh                       Refresh the backup in an existing card\n'
+        '                                  directory, only downloading what changed since\n'
+        '                                  the last backup.\n'
+        '  --batch FILENAME                Back up the card URLs listed in a file, one\n'
+        '                                  per line (use "-" to read them from standard\n'
+        '                                  input).\n'
+        '  --cards INTEGER RANGE           Number of cards backed up in parallel in batch\n'
+        '                                  mode.  [default: 1; x>=1]\n'
+        '  --store DIRECTORY               Directory storing downloaded content once for\n'
+        '                                  all cards, card directories get links to it.\n'
+        '                                  Tracks are tagged per card: they are only\n'
+        '                                  stored if the filesystem can clone files (e.g.\n'
+        '                                  Btrfs, XFS).\n'
+        '  --scratch-dir DIRECTORY         Directory downloads are made into, on the same\n'
+        '                                  filesystem as the card directories.  [default:\n'
+        '                                  .toto-backup-scratch]\n'
+        '  --cache-dir DIRECTORY           Directory caching the data of card pages, so\n'
+        '                                  that backing up a card again does not fetch\n'
+        '                                  its page.\n'
+        '  --cache-ttl INTEGER RANGE       Seconds the data of a card page is cached for\n'
+        '                                  (track URLs it contains may expire).\n'
+        '                                  [default: 900; x>=0]\n'
+        '  --cache-max-size INTEGER RANGE  Size of the card page cache in MiB, least\n'
+        '                                  recently used pages are evicted beyond it.\n'
+        '                                  [default: 64; x>=1]\n'
+        '  --metrics FILE                  Write metrics of the run (durations of each\n'
+        '                                  phase, bytes downloaded, retries…) to a JSON\n'
+        '                                  file.\n'
+        '  --prometheus FILE               Write metrics of the run to a file for the\n'
+        '                                  Prometheus textfile collector (e.g.\n'
+        '                                  toto_backup.prom).\n'
+        '  --profile FILE                  Profile the run (including download workers)\n'
+        '                                  and write the statistics to a pstats file.\n'
+        '  --profile-top INTEGER RANGE     Number of functions listed in the profile\n'
+        '                                  summary, printed on the standard error.\n'
+        '                                  [default: 30; x>=1]\n'
+        '  --help                          Show this message and exit.\n'
     )
 
 
 @responses.activate
-def test_main(caplog: LogCaptureFixture, setup_teardown):
+@pytest.mark.parametrize('jobs', ['1', '2'])
+def test_main(caplog: LogCaptureFixture, setup_teardown, jobs: str):
+    mock_card_responses()
+
+    runner = CliRunner()
+    with runner.isolated_filesystem() as tmp_dir:
+        expected_tmp_dir = tmp_dir
+        # Resolve the real path on macos.
+        if platform.system() == 'Darwin':
+            expected_tmp_dir = os.path.realpath(tmp_dir)
+        result = runner.invoke(main, ['--jobs', jobs, 'https://example.url/xxx'])
+        assert result.exit_code == 0
+        assert result.output == (
+            'Fetching page at: https://example.url/xxx\n'
+            'Find data…\n'
+            'Creating card directory…\n'
+            'Downloading card cover…\n'
+            'Downloading tracks…\n'
+            f'Track 1/2 successfully downloaded to {expected_tmp_dir}{os.sep}Author Name - The Card Title{os.sep}'
+            '1-01_Chapter 1 - Introduction.m4a\n'
+            f'Track 2/2 successfully downloaded to {expected_tmp_dir}{os.sep}Author Name - The Card Title{os.sep}'
+            '1-02_Chapter 2.m4a\n'
+            'Card backup completed, 2 tracks backed up successfully, 0 failed.\n'
+        )
+        assert (Path(expected_tmp_dir) / 'Author Name - The Card Title' / 'cover.png').exists()
+        assert (Path(expected_tmp_dir) / 'Author Name - The Card Title' / '1-01_Chapter 1 - Introduction.m4a').exists()
+        assert (Path(expected_tmp_dir) / 'Author Name - The Card Title' / '1-01_Chapter 1 - Introduction.png').exists()
+        assert (Path(expected_tmp_dir) / 'Author Name - The Card Title' / '1-02_Chapter 2.m4a').exists()
+        assert (Path(expected_tmp_dir) / 'Author Name - The Card Title' / '1-02_Chapter 2.png').exists()
+        # Nothing is left to resume.
+        assert not (Path(expected_tmp_dir) / '.toto-backup-scratch').exists()
+
+
+@responses.activate
+def test_main_should_resume_failed_backup(setup_teardown):
+    mock_card_responses()
+    track_2_url = 'https://example.url/card/chapter-2-track-1'
+    track_2_response = responses.replace(responses.GET, track_2_url, status=404)
+
+    runner = CliRunner()
+    with runner.isolated_filesystem() as tmp_dir:
+        card_directory = Path(tmp_dir) / 'Author Name - The Card Title'
+
+        result = runner.invoke(main, ['https://example.url/xxx'])
+        assert result.exit_code == 0
+        assert result.output.endswith('Card backup completed, 1 tracks backed up successfully, 1 failed.\n')
+        assert (card_directory / '1-02_Chapter 2.m4a').exists() is False
+
+        # Resume the backup once the track is available.
+        responses.replace(
+            responses.GET,
+            track_2_url,
+            status=200,
+            content_type='audio/x-m4a',
+            body=get_dummy_m4a_file().read_bytes(),
+        )
+        result = runner.invoke(main, ['--resume', 'https://example.url/xxx'])
+        assert result.exit_code == 0
+        assert result.output.endswith('Card backup completed, 2 tracks backed up successfully, 0 failed.\n')
+        assert (card_directory / '1-02_Chapter 2.m4a').exists() is True
+        # Content already backed up has not been downloaded again.
+        for downloaded_url in [
+            'https://example.url/card/cover',
+            'https://example.url/card/chapter-1-icon',
+            'https://example.url/card/chapter-1-track-1',
+            'https://example.url/card/chapter-2-icon',
+        ]:
+            assert len([call for call in responses.calls if call.request.url == downloaded_url]) == 1
+        assert track_2_response.call_count == 1
+
+
+@responses.activate
+def test_main_should_resume_failed_backup_with_new_track_urls(setup_teardown):
+    mock_card_responses()
+    track_2_url = 'https://example.url/card/chapter-2-track-1'
+    responses.replace(responses.GET, track_2_url, status=404)
+
+    runner = CliRunner()
+    with runner.isolated_filesystem() as tmp_dir:
+        # Track URLs are signed, their signature changes each time the card page is fetched.
+        responses.replace(responses.GET, 'https://example.url/xxx', body=generate_card_page_body('Signature=1'))
+        result = runner.invoke(main, ['https://example.url/xxx'])
+        assert result.output.endswith('Card backup completed, 1 tracks backed up successfully, 1 failed.\n')
+
+        responses.replace(responses.GET, 'https://example.url/xxx', body=generate_card_page_body('Signature=2'))
+        responses.replace(
+            responses.GET, track_2_url, status=200, content_type='audio/x-m4a', body=get_dummy_m4a_file().read_bytes()
+        )
+        result = runner.invoke(main, ['--resume', 'https://example.url/xxx'])
+        assert result.exit_code == 0
+        assert result.output.endswith('Card backup completed, 2 tracks backed up successfully, 0 failed.\n')
+        assert (Path(tmp_dir) / 'Author Name - The Card Title' / '1-02_Chapter 2.m4a').exists() is True
+        # The track backed up with its previous URL has not been downloaded again.
+        track_1_calls = [call for call in responses.calls if '/chapter-1-track-1' in call.request.url]
+        assert [call.request.url for call in track_1_calls] == [
+            'https://example.url/card/chapter-1-track-1?Signature=1'
+        ]
+
+
+@responses.activate
+def test_main_should_retry_transient_errors(setup_teardown):
+    mock_card_responses()
+    track_2_url = 'https://example.url/card/chapter-2-track-1'
+    # Service unavailable until the end of the card: tried 3 times, then once more at the end.
+    responses.replace(responses.GET, track_2_url, status=503, headers={'Retry-After': '0'})
+    for _ in range(2):
+        responses.add(responses.GET, track_2_url, status=503, headers={'Retry-After': '0'})
+    responses.add(
+        responses.GET, track_2_url, status=200, content_type='audio/x-m4a', body=get_dummy_m4a_file().read_bytes()
+    )
+
+    runner = CliRunner()
+    with runner.isolated_filesystem() as tmp_dir:
+        result = runner.invoke(main, ['--metrics', 'metrics.json', 'https://example.url/xxx'])
+
+        assert result.exit_code == 0
+        assert result.output.endswith('Card backup completed, 2 tracks backed up successfully, 0 failed.\n')
+        assert (Path(tmp_dir) / 'Author Name - The Card Title' / '1-02_Chapter 2.m4a').exists() is True
+        assert len([call for call in responses.calls if call.request.url == track_2_url]) == 4  # noqa: PLR2004
+        assert json.loads((Path(tmp_dir) / 'metrics.json').read_text())['retries'] == 2  # noqa: PLR2004
+
+
+@responses.activate
+def test_main_should_write_metrics(setup_teardown):
+    mock_card_responses()
+
+    runner = CliRunner()
+    with runner.isolated_filesystem() as tmp_dir:
+        result = runner.invoke(
+            main, ['--metrics', 'metrics.json', '--prometheus', 'toto_backup.prom', 'https://example.url/xxx']
+        )
+
+        assert result.exit_code == 0
+        metrics = json.loads((Path(tmp_dir) / 'metrics.json').read_text())
+        assert set(metrics['phases']) == {
+            'fetch_page',
+            'find_data',
+            'parse_data',
+            'create_card_directory',
+            'download',
+            'get_extension',
+            'tag_track',
+        }
+        assert metrics['phases']['download']['count'] == 5  # noqa: PLR2004
+        assert metrics['phases']['tag_track']['count'] == 2  # noqa: PLR2004
+        # The cover, two icons and two tracks.
+        assert metrics['bytes'] == 3 * get_dummy_png_file().stat().st_size + 2 * get_dummy_m4a_file().stat().st_size
+        assert metrics['retries'] == 0
+        # Mocked responses do not go through connection pools.
+        assert metrics['connections'] == {'opened': 0, 'reused': 0}
+        prometheus = (Path(tmp_dir) / 'toto_backup.prom').read_text()
+        assert f'toto_backup_downloaded_bytes {metrics["bytes"]}\n' in prometheus
+        assert 'toto_backup_phase_duration_seconds_count{phase="download"} 5\n' in prometheus
+
+
+@responses.activate
+def test_main_should_write_metrics_of_failed_backup(setup_teardown):
+    responses.add(responses.GET, 'https://example.url/unknown', status=404)
+
+    runner = CliRunner()
+    with runner.isolated_filesystem() as tmp_dir:
+        result = runner.invoke(main, ['--metrics', 'metrics.json', 'https://example.url/unknown'])
+
+        assert result.exit_code == ERROR_INVALID_URL
+        metrics = json.loads((Path(tmp_dir) / 'metrics.json').read_text())
+        assert metrics['phases']['fetch_page']['count'] == 1
+        assert metrics['bytes'] == 0
+
+
+@responses.activate
+def test_main_should_profile_download_workers(setup_teardown):
+    mock_card_responses()
+
+    runner = CliRunner()
+    with runner.isolated_filesystem() as tmp_dir:
+        result = runner.invoke(
+            main, ['--jobs', '2', '--profile', 'run.pstats', '--profile-top', '5', 'https://example.url/xxx']
+        )
+
+        assert result.exit_code == 0
+        assert 'due to restriction <5>' in result.stderr
+        stats = pstats.Stats(str(Path(tmp_dir) / 'run.pstats'))
+        function_names = {function_name for _, _, function_name in stats.stats}  # type: ignore[attr-defined]
+        # Parsing happens in the main thread, downloads in workers.
+        assert {'parse_data', 'download_content', 'tag_track'} <= function_names
+
+
+@responses.activate
+def test_main_should_refresh_modified_content_only(setup_teardown):
+    mock_card_responses()
+
+    runner = CliRunner()
+    with runner.isolated_filesystem() as tmp_dir:
+        card_directory = Path(tmp_dir) / 'Author Name - The Card Title'
+        result = runner.invoke(main, ['https://example.url/xxx'])
+        assert result.exit_code == 0
+        track_1_mtime_ns = (card_directory / '1-01_Chapter 1 - Introduction.m4a').stat().st_mtime_ns
+
+        # Only the track of chapter 2 has been modified since.
+        content_urls = [
+            'https://example.url/card/cover',
+            'https://example.url/card/chapter-1-icon',
+            'https://example.url/card/chapter-1-track-1',
+            'https://example.url/card/chapter-2-icon',
+        ]
+        for content_url in content_urls:
+            etag = f'"{content_url.rsplit("/", 1)[1]}"'
+            responses.replace(
+                responses.GET,
+                content_url,
+                status=304,
+                match=[responses.matchers.header_matcher({'If-None-Match': etag})],
+            )
+        responses.replace(
+            responses.GET,
+            'https://example.url/card/chapter-2-track-1',
+            status=200,
+            content_type='audio/x-m4a',
+            headers={'ETag': '"chapter-2-track-1-v2"'},
+            body=get_dummy_m4a_file().read_bytes(),
+        )
+        responses.calls.reset()
+
+        result = runner.invoke(main, ['--refresh', 'https://example.url/xxx'])
+        assert result.exit_code == 0
+        assert result.output.endswith('Card backup completed, 2 tracks backed up successfully, 0 failed.\n')
+        # Content not modified is neither downloaded nor tagged again.
+        assert [call.response.status_code for call in responses.calls if call.request.url in content_urls] == [304] * 4
+        assert (card_directory / '1-01_Chapter 1 - Introduction.m4a').stat().st_mtime_ns == track_1_mtime_ns
+        assert (card_directory / '1-02_Chapter 2.m4a').exists() is True
+
+
+@responses.activate
+def test_main_should_back_up_cards_in_batch(setup_teardown):
+    mock_card_responses()
+    responses.add(responses.GET, 'https://example.url/unknown', status=404)
+
+    runner = CliRunner()
+    with runner.isolated_filesystem() as tmp_dir:
+        result = runner.invoke(
+            main,
+            ['--batch', '-', '--cards', '2'],
+            input='https://example.url/xxx\nhttps://example.url/unknown\nhttps://EXAMPLE.url/xxx#duplicate\n',
+        )
+        assert result.exit_code == ERROR_INVALID_URL
+        assert result.output.endswith(
+            'Batch backup completed, 1 cards backed up successfully, 1 failed.\n'
+            'Status   Tracks Failed  Card\n'
+            'OK            2      0  https://example.url/xxx\n'
+            'FAILED        0      0  https://example.url/unknown (page not found)\n'
+        )
+        # The duplicate URL has been backed up once.
+        assert len([call for call in responses.calls if call.request.url == 'https://example.url/xxx']) == 1
+        assert (Path(tmp_dir) / 'Author Name - The Card Title' / '1-02_Chapter 2.m4a').exists()
+
+        # Existing card directories are not overwritten without asking.
+        result = runner.invoke(main, ['--batch', '-'], input='https://example.url/xxx\n')
+        assert result.exit_code == ERROR_DIRECTORY_ALREADY_EXISTS
+        assert result.output.endswith('FAILED        0      0  https://example.url/xxx (directory already exists)\n')
+
+
+@responses.activate
+def test_main_should_reuse_cached_card_data(setup_teardown):
+    mock_card_responses()
+    responses.add(responses.GET, 'https://example.url/unknown', status=404)
+
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        for _ in range(2):
+            result = runner.invoke(
+                main,
+                ['--cache-dir', 'cache', '--resume', '--batch', '-'],
+                input='https://example.url/xxx\nhttps://example.url/unknown\n',
+            )
+            assert result.exit_code == ERROR_INVALID_URL
+            assert result.output.endswith(
+                'OK            2      0  https://example.url/xxx\n'
+                'FAILED        0      0  https://example.url/unknown (page not found)\n'
+            )
+
+        # Pages, found or not, have been fetched once.
+        assert len([call for call in responses.calls if call.request.url == 'https://example.url/xxx']) == 1
+        assert len([call for call in responses.calls if call.request.url == 'https://example.url/unknown']) == 1
+
+        # Expired data is fetched again.
+        result = runner.invoke(
+            main, ['--cache-dir', 'cache', '--cache-ttl', '0', '--resume', 'https://example.url/xxx']
+        )
+        assert result.exit_code == 0
+        assert len([call for call in responses.calls if call.request.url == 'https://example.url/xxx']) == 2  # noqa: PLR2004
+
+
+def test_main_should_require_either_url_or_batch(setup_teardown):
+    runner = CliRunner()
+    assert runner.invoke(main, []).exit_code == 2  # noqa: PLR2004
+    assert runner.invoke(main, ['--batch', '-', 'https://example.url/xxx'], input='').exit_code == 2  # noqa: PLR2004
+
+
+@responses.activate
+@mock.patch('toto_backup.toto_backup.can_clone_files', return_value=True)
+def test_main_should_share_stored_content_between_backups(clone_mock: Mock, setup_teardown, tmp_path: Path):
+    mock_card_responses()
+    store_directory = tmp_path / 'store'
+
+    runner = CliRunner()
+    with runner.isolated_filesystem(temp_dir=tmp_path):
+        first_card_directory = Path.cwd() / 'first'
+        first_card_directory.mkdir()
+        os.chdir(first_card_directory)
+        result = runner.invoke(main, ['--store', str(store_directory), 'https://example.url/xxx'])
+        assert result.exit_code == 0
+        responses.calls.reset()
+
+        second_card_directory = first_card_directory.parent / 'second'
+        second_card_directory.mkdir()
+        os.chdir(second_card_directory)
+        result = runner.invoke(main, ['--store', str(store_directory), 'https://example.url/xxx'])
+        assert result.exit_code == 0
+        assert result.output.endswith('Card backup completed, 2 tracks backed up successfully, 0 failed.\n')
+
+        # Only the card page has been fetched again.
+        assert [call.request.url for call in responses.calls] == ['https://example.url/xxx']
+        # Identical icons and covers are links to a single stored object.
+        files = [
+            directory / 'Author Name - The Card Title' / name
+            for directory in [first_card_directory, second_card_directory]
+            for name in ['cover.png', '1-01_Chapter 1 - Introduction.png', '1-02_Chapter 2.png']
+        ]
+        assert len({file.stat().st_ino for file in files}) == 1
+        # Tracks are tagged in place, so they are not links.
+        track_file = second_card_directory / 'Author Name - The Card Title' / '1-02_Chapter 2.m4a'
+        assert track_file.stat().st_nlink == 1
+
+
+@responses.activate
+@mock.patch('toto_backup.toto_backup.can_clone_files', return_value=False)
+def test_main_should_not_store_tracks_if_files_cannot_be_cloned(clone_mock: Mock, setup_teardown, tmp_path: Path):
+    mock_card_responses()
+    store_directory = tmp_path / 'store'
+
+    runner = CliRunner()
+    with runner.isolated_filesystem(temp_dir=tmp_path):
+        result = runner.invoke(main, ['--store', str(store_directory), 'https://example.url/xxx'])
+        assert result.exit_code == 0
+        assert result.output.endswith('Card backup completed, 2 tracks backed up successfully, 0 failed.\n')
+
+        # Tracks would take twice their size: only covers and icons are stored.
+        card_directory = Path.cwd() / 'Author Name - The Card Title'
+        assert (card_directory / 'cover.png').stat().st_nlink > 1
+        assert (card_directory / '1-01_Chapter 1 - Introduction.m4a').exists() is True
+        assert (card_directory / '1-02_Chapter 2.m4a').exists() is True
+        stored_files = [file for file in (store_directory / 'objects').rglob('*') if file.is_file()]
+        assert len(stored_files) == 1
+
+
+def mock_card_responses() -> None:
     # Mock HTTP response for card page.
     responses.add(
         responses.Response(
@@ -69,6 +471,7 @@ def test_main(caplog: LogCaptureFixture, setup_teardown):
             url='https://example.url/card/cover',
             status=200,
             content_type='image/png',
+            headers={'ETag': '"cover"'},
             body=get_dummy_png_file().read_bytes(),
         )
     )
@@ -80,6 +483,7 @@ def test_main(caplog: LogCaptureFixture, setup_teardown):
                 url=f'https://example.url/card/chapter-{chapter_number}-icon',
                 status=200,
                 content_type='image/png',
+                headers={'ETag': f'"chapter-{chapter_number}-icon"'},
                 body=get_dummy_png_file().read_bytes(),
             )
         )
@@ -89,39 +493,14 @@ def test_main(caplog: LogCaptureFixture, setup_teardown):
                 url=f'https://example.url/card/chapter-{chapter_number}-track-1',
                 status=200,
                 content_type='audio/x-m4a',
+                headers={'ETag': f'"chapter-{chapter_number}-track-1"'},
                 body=get_dummy_m4a_file().read_bytes(),
             )
         )
 
-    runner = CliRunner()
-    with runner.isolated_filesystem() as tmp_dir:
-        expected_tmp_dir = tmp_dir
-        # Resolve the real path on macos.
-        if platform.system() == 'Darwin':
-            expected_tmp_dir = os.path.realpath(tmp_dir)
-        result = runner.invoke(main, ['https://example.url/xxx'])
-        assert result.exit_code == 0
-        assert result.output == (
-            'Fetching page at: https://example.url/xxx\n'
-            'Find data…\n'
-            'Creating card directory…\n'
-            'Downloading card cover…\n'
-            'Downloading tracks…\n'
-            f'Track 1/2 successfully downloaded to {expected_tmp_dir}{os.sep}Author Name - The Card Title{os.sep}'
-            '1-01_Chapter 1 - Introduction.m4a\n'
-            f'Track 2/2 successfully downloaded to {expected_tmp_dir}{os.sep}Author Name - The Card Title{os.sep}'
-            '1-02_Chapter 2.m4a\n'
-            'Card backup completed, 2 tracks backed up successfully, 0 failed.\n'
-        )
-        assert (Path(expected_tmp_dir) / 'Author Name - The Card Title' / 'cover.png').exists()
-        assert (Path(expected_tmp_dir) / 'Author Name - The Card Title' / '1-01_Chapter 1 - Introduction.m4a').exists()
-        assert (Path(expected_tmp_dir) / 'Author Name - The Card Title' / '1-01_Chapter 1 - Introduction.png').exists()
-        assert (Path(expected_tmp_dir) / 'Author Name - The Card Title' / '1-02_Chapter 2.m4a').exists()
-        assert (Path(expected_tmp_dir) / 'Author Name - The Card Title' / '1-02_Chapter 2.png').exists()
-
 
-def generate_card_page_body() -> str:
-    return """
+def generate_card_page_body(track_url_query: str = '') -> str:
+    body = """
         <html><body><script id="__NEXT_DATA__" type="application/json">{
             "props": {
                 "pageProps": {
@@ -176,3 +555,6 @@ def generate_card_page_body() -> str:
             }
         }</script></body></html>
     """
+    if track_url_query:
+        body = body.replace('-track-1"', f'-track-1?{track_url_query}"')
+    return body
@@ -0,0 +1,90 @@
+#
+# SPDX-License-Identifier: MPL-2.0
+#
+# Copyright (c) 2025-2026 "Laurent Desgrange".
+#
+# This file is part of "toto-backup".
+# See "https://github.com/ldesgrange/toto-backup") for further information.
+#
+# This Source Code Form is subject to the terms of the
+# Mozilla Public License, v. 2.0. If a copy of the MPL
+# was not distributed with this file, You can obtain one
+# at https://mozilla.org/MPL/2.0/.
+#
+import logging
+import os
+from pathlib import Path
+from unittest import mock
+
+from toto_backup.card_cache import CardCache
+
+logger = logging.getLogger(__name__)
+
+
+def test_get_should_return_cached_data(tmp_path: Path):
+    cache = CardCache(tmp_path / 'cache')
+    cache.put('https://example.url/xxx', {'title': 'Café'})
+
+    cached_card = cache.get('https://example.url/xxx')
+
+    assert cached_card.data == {'title': 'Café'}
+    assert cached_card.exit_code == 0
+    assert cached_card.reason is None
+    # Cards are identified by their canonical URL.
+    assert cache.get('https://EXAMPLE.url/xxx#fragment').data == {'title': 'Café'}
+    assert cache.get('https://example.url/yyy') is None
+
+
+def test_get_should_return_cached_errors(tmp_path: Path):
+    cache = CardCache(tmp_path)
+    cache.put_error('https://example.url/unknown', 10, 'page not found')
+
+    cached_card = cache.get('https://example.url/unknown')
+
+    assert cached_card.data is None
+    assert cached_card.exit_code == 10  # noqa: PLR2004
+    assert cached_card.reason == 'page not found'
+
+
+def test_get_should_ignore_expired_entries(tmp_path: Path):
+    cache = CardCache(tmp_path, ttl=60)
+    with mock.patch('time.time', return_value=1000):
+        cache.put('https://example.url/xxx', {'title': 'Café'})
+
+    with mock.patch('time.time', return_value=1060):
+        assert cache.get('https://example.url/xxx') is not None
+    with mock.patch('time.time', return_value=1061):
+        assert cache.get('https://example.url/xxx') is None
+
+
+def test_get_should_ignore_unreadable_entries(tmp_path: Path):
+    cache = CardCache(tmp_path)
+    cache.put('https://example.url/xxx', {'title': 'Café'})
+    cache.put('https://example.url/yyy', {'title': 'Café'})
+    (entry_1, entry_2) = sorted(tmp_path.glob('*.json'))
+    entry_1.write_text('{"version": 1, "data": {"tit')
+    entry_2.write_text('{"version": 0, "data": {}}')
+
+    assert cache.get('https://example.url/xxx') is None
+    assert cache.get('https://example.url/yyy') is None
+
+
+def test_put_should_evict_least_recently_used_entries(tmp_path: Path):
+    urls = [f'https://example.url/{n}' for n in range(3)]
+    cache = CardCache(tmp_path)
+    for url in urls[:2]:
+        cache.put(url, {'title': url * 10})
+    entries = sorted(tmp_path.glob('*.json'), key=lambda entry: entry.read_text())
+    for n, entry in enumerate(entries):
+        os.utime(entry, (n, n))
+    # Room for two entries only.
+    cache = CardCache(tmp_path, max_size=sum(entry.stat().st_size for entry in entries) + 10)
+    # Recently used entries are kept.
+    assert cache.get(urls[0]) is not None
+
+    cache.put(urls[2], {'title': urls[2] * 10})
+
+    assert cache.get(urls[0]) is not None
+    assert cache.get(urls[1]) is None
+    assert cache.get(urls[2]) is not None
+    assert not list(tmp_path.glob('*.tmp'))
@@ -41,6 +41,18 @@ def test_chapter_add_track_should_raise_error_when_track_number_already_exists()
     assert str(e.value) == 'Track 1 already exists in chapter 1.'
 
 
+def test_chapter_add_track_should_accept_tracks_in_any_order():
+    chapter = Chapter(1, 'Chapter 1', 'icon_url')
+    for track_number in [3, 1, 2]:
+        chapter.add_track(Track(track_number, f'Track {track_number}', f'url_{track_number}'))
+
+    assert [track.track_number for track in chapter.tracks] == [3, 1, 2]
+    with pytest.raises(DuplicateTrackError):
+        chapter.add_track(Track(1, 'Track 1', 'url_1'))
+    # Rejected tracks are not added.
+    assert len(chapter.tracks) == 3  # noqa: PLR2004
+
+
 def test_card_add_chapter_should_raise_error_when_chapter_has_no_tracks():
     chapter = Chapter(1, 'Chapter 1', 'icon_url')
     card = Card('title', 'author', 'cover_url')
@@ -64,6 +76,20 @@ def test_card_add_chapter_should_raise_error_when_chapter_number_already_exists(
     assert str(e.value) == 'Chapter 1 already exists.'
 
 
+def test_card_add_chapter_should_detect_duplicates_added_out_of_order():
+    card = Card('title', 'author', 'cover_url')
+    for chapter_number in [2, 1, 3]:
+        chapter = Chapter(chapter_number, f'Chapter {chapter_number}', 'icon_url')
+        chapter.add_track(Track(1, 'Track 1', 'url_1'))
+        card.add_chapter(chapter)
+
+    duplicate_chapter = Chapter(2, 'Chapter 2', 'icon_url')
+    duplicate_chapter.add_track(Track(1, 'Track 1', 'url_1'))
+    with pytest.raises(DuplicateChapterError):
+        card.add_chapter(duplicate_chapter)
+    assert [chapter.chapter_number for chapter in card.chapters] == [2, 1, 3]
+
+
 def test_card_track_total_should_return_track_count():
     track_1 = Track(1, 'Track 1', 'url_1')
     track_2 = Track(2, 'Track 2', 'url_2')
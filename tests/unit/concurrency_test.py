@@ -0,0 +1,96 @@
+#
+# SPDX-License-Identifier: MPL-2.0
+#
+# Copyright (c) 2025-2026 "Laurent Desgrange".
+#
+# This file is part of "toto-backup".
+# See "https://github.com/ldesgrange/toto-backup") for further information.
+#
+# This Source Code Form is subject to the terms of the
+# Mozilla Public License, v. 2.0. If a copy of the MPL
+# was not distributed with this file, You can obtain one
+# at https://mozilla.org/MPL/2.0/.
+#
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import responses
+
+from toto_backup.concurrency import ConcurrencyController, INITIAL_WINDOW
+from toto_backup.utils import create_session
+
+logger = logging.getLogger(__name__)
+
+URL = 'https://cdn.example.com/track.mp3'
+
+
+def test_record_response_should_increase_window_additively():
+    controller = ConcurrencyController(max_window=4)
+
+    windows = []
+    for _ in range(8):
+        controller.record_response(URL, 0.01, 200)
+        windows.append(controller.get_windows()['cdn.example.com'])
+
+    # About one more request in flight once a whole window of responses arrived, up to the maximum.
+    assert windows == [2, 2, 3, 3, 3, 4, 4, 4]
+
+
+def test_record_response_should_decrease_window_multiplicatively_on_throttling():
+    controller = ConcurrencyController(max_window=16)
+    for _ in range(200):
+        controller.record_response(URL, 0.01, 200)
+    assert controller.get_windows() == {'cdn.example.com': 16}
+
+    controller.record_response(URL, 0.01, 429)
+    assert controller.get_windows() == {'cdn.example.com': 8}
+    # Responses to requests already in flight do not decrease it again.
+    controller.record_response(URL, 0.01, 503)
+    assert controller.get_windows() == {'cdn.example.com': 8}
+
+
+def test_record_response_should_decrease_window_on_latency_spikes():
+    controller = ConcurrencyController(max_window=16)
+    for _ in range(200):
+        controller.record_response(URL, 0.1, 200)
+
+    controller.record_response(URL, 1, 200)
+
+    assert controller.get_windows() == {'cdn.example.com': 8}
+
+
+def test_slot_should_limit_requests_in_flight_per_host():
+    controller = ConcurrencyController(max_window=8)
+    lock = threading.Lock()
+    in_flight = {'cdn.example.com': 0, 'other.example.com': 0}
+    max_in_flight = dict(in_flight)
+
+    def request(url: str) -> None:
+        host = url.split('/')[2]
+        with controller.slot(url):
+            with lock:
+                in_flight[host] += 1
+                max_in_flight[host] = max(max_in_flight[host], in_flight[host])
+            time.sleep(0.01)
+            with lock:
+                in_flight[host] -= 1
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(request, [URL] * 8 + ['https://other.example.com/icon.png'] * 8))
+
+    # Hosts have their own window.
+    assert max_in_flight == {'cdn.example.com': INITIAL_WINDOW, 'other.example.com': INITIAL_WINDOW}
+
+
+@responses.activate
+def test_attach_should_record_session_responses():
+    responses.add(responses.GET, URL, status=429)
+    controller = ConcurrencyController(max_window=8)
+
+    with create_session() as session:
+        controller.attach(session)
+        session.get(URL)
+
+    assert controller.get_windows() == {'cdn.example.com': 1}
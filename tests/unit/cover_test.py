@@ -0,0 +1,92 @@
+#
+# SPDX-License-Identifier: MPL-2.0
+#
+# Copyright (c) 2025-2026 "Laurent Desgrange".
+#
+# This file is part of "toto-backup".
+# See "https://github.com/ldesgrange/toto-backup") for further information.
+#
+# This Source Code Form is subject to the terms of the
+# Mozilla Public License, v. 2.0. If a copy of the MPL
+# was not distributed with this file, You can obtain one
+# at https://mozilla.org/MPL/2.0/.
+#
+import base64
+import hashlib
+import logging
+import os
+import shutil
+from pathlib import Path
+from unittest import mock
+
+from mutagen.flac import Picture
+from mutagen.mp4 import MP4Cover
+
+from toto_backup.cover import CoverCache
+from utils import get_dummy_png_file
+
+logger = logging.getLogger(__name__)
+
+
+def test_get_should_prepare_cover_objects():
+    cover = CoverCache().get(get_dummy_png_file())
+
+    data = get_dummy_png_file().read_bytes()
+    assert cover.checksum == hashlib.sha256(data).hexdigest()
+    assert cover.mp4_cover == data
+    assert cover.mp4_cover.imageformat == MP4Cover.FORMAT_PNG
+    assert cover.apic.mime == 'image/png'
+    assert cover.apic.data == data
+    picture = Picture(base64.b64decode(cover.metadata_block_picture))
+    assert picture.mime == 'image/png'
+    assert picture.data == data
+
+
+def test_get_should_ignore_unsupported_formats(tmp_path: Path):
+    cover_file = tmp_path / 'cover.gif'
+    cover_file.write_bytes(b'GIF89a')
+
+    cover = CoverCache().get(cover_file)
+
+    assert cover.mp4_cover is None
+    assert cover.apic is None
+    assert cover.metadata_block_picture is None
+
+
+def test_get_should_read_each_cover_once(tmp_path: Path):
+    cover_files = [tmp_path / f'icon{n}.png' for n in range(3)]
+    for cover_file in cover_files:
+        shutil.copy(get_dummy_png_file(), cover_file)
+    cache = CoverCache()
+
+    with mock.patch.object(Path, 'read_bytes', autospec=True, side_effect=Path.read_bytes) as read_mock:
+        covers = [cache.get(cover_file) for cover_file in cover_files * 2]
+
+    # Files are read once, and identical content is shared.
+    assert read_mock.call_count == len(cover_files)
+    assert all(cover is covers[0] for cover in covers)
+    assert cache.size == get_dummy_png_file().stat().st_size
+
+    # Modified files are read again.
+    cover_files[0].write_bytes(b'modified')
+    os.utime(cover_files[0], ns=(0, 0))
+    assert cache.get(cover_files[0]).data == b'modified'
+
+
+def test_get_should_evict_least_recently_used_covers(tmp_path: Path):
+    cover_files = [tmp_path / f'icon{n}.png' for n in range(3)]
+    for n, cover_file in enumerate(cover_files):
+        cover_file.write_bytes(bytes([n]) * 10)
+    cache = CoverCache(max_size=20)
+
+    first_cover = cache.get(cover_files[0])
+    cache.get(cover_files[1])
+    # Recently used covers are kept.
+    assert cache.get(cover_files[0]) is first_cover
+    cache.get(cover_files[2])
+
+    assert cache.size == 20  # noqa: PLR2004
+    assert cache.get(cover_files[0]) is first_cover
+    with mock.patch.object(Path, 'read_bytes', autospec=True, side_effect=Path.read_bytes) as read_mock:
+        cache.get(cover_files[1])
+    read_mock.assert_called_once()
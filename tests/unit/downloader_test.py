@@ -0,0 +1,232 @@
+#
+# SPDX-License-Identifier: MPL-2.0
+#
+# Copyright (c) 2025-2026 "Laurent Desgrange".
+#
+# This file is part of "toto-backup".
+# See "https://github.com/ldesgrange/toto-backup") for further information.
+#
+# This Source Code Form is subject to the terms of the
+# Mozilla Public License, v. 2.0. If a copy of the MPL
+# was not distributed with this file, You can obtain one
+# at https://mozilla.org/MPL/2.0/.
+#
+import hashlib
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from unittest import mock
+from unittest.mock import Mock
+
+import pytest
+from requests import ConnectionError as RequestsConnectionError, HTTPError
+
+from toto_backup.downloader import Downloader
+from toto_backup.retry import RetryPolicy
+from toto_backup.store import ObjectStore
+from toto_backup.utils import DownloadedContent, NotModifiedError
+
+logger = logging.getLogger(__name__)
+
+
+@mock.patch('toto_backup.downloader.download_content')
+def test_download_should_fetch_identical_urls_once(download_mock: Mock, tmp_path: Path):
+    temp_download_file = tmp_path / 'tmpfile'
+    temp_download_file.write_bytes(b'content')
+    requester_count = 4
+    download_started = threading.Event()
+
+    def download(
+        _url: str, _session: None, _partial_file: None, _validators: None, _head_rewriter: None
+    ) -> DownloadedContent:
+        download_started.set()
+        # Let other requesters find the download in flight.
+        time.sleep(0.1)
+        return DownloadedContent(temp_download_file, 'image/png', {})
+
+    download_mock.side_effect = download
+    downloader = Downloader()
+    for _ in range(requester_count):
+        downloader.expect('https://example.com/icon.png')
+
+    def request() -> tuple[DownloadedContent, bool]:
+        content, is_last = downloader.download('https://example.com/icon.png')
+        if not is_last:
+            downloader.release('https://example.com/icon.png')
+        return content, is_last
+
+    with ThreadPoolExecutor(max_workers=requester_count) as executor:
+        owner_future = executor.submit(request)
+        download_started.wait(timeout=5)
+        futures = [executor.submit(request) for _ in range(3)]
+        results = [future.result() for future in [owner_future, *futures]]
+
+    download_mock.assert_called_once_with('https://example.com/icon.png', None, None, None, None)
+    assert {(content.file, content.mime_type) for content, _ in results} == {(temp_download_file, 'image/png')}
+    # At most one requester is told it is the last one, and owns the file. Otherwise, the
+    # file is deleted once all requesters released it.
+    last_requester_count = [is_last for _, is_last in results].count(True)
+    assert last_requester_count <= 1
+    assert temp_download_file.exists() is (last_requester_count == 1)
+
+
+@mock.patch('toto_backup.downloader.download_content')
+def test_release_should_keep_file_until_last_requester(download_mock: Mock, tmp_path: Path):
+    temp_download_file = tmp_path / 'tmpfile'
+    temp_download_file.write_bytes(b'content')
+    download_mock.return_value = DownloadedContent(temp_download_file, 'image/png', {})
+    downloader = Downloader()
+    for _ in range(3):
+        downloader.expect('https://example.com/icon.png')
+
+    # Both requesters hold the file: neither of them may move it.
+    assert downloader.download('https://example.com/icon.png')[1] is False
+    assert downloader.download('https://example.com/icon.png')[1] is False
+    downloader.release('https://example.com/icon.png')
+    downloader.release('https://example.com/icon.png')
+    assert temp_download_file.exists() is True
+    # The last requester gets the file once the others released it.
+    assert downloader.download('https://example.com/icon.png')[1] is True
+    assert temp_download_file.exists() is True
+    download_mock.assert_called_once()
+
+
+@mock.patch('toto_backup.downloader.download_content')
+def test_download_should_fetch_again_unexpected_urls(download_mock: Mock, tmp_path: Path):
+    (tmp_path / 'tmpfile').write_bytes(b'data')
+    download_mock.return_value = DownloadedContent(tmp_path / 'tmpfile', 'image/png', {})
+    downloader = Downloader()
+
+    assert downloader.download('https://example.com/icon.png')[1] is True
+    assert downloader.download('https://example.com/icon.png')[1] is True
+    assert download_mock.call_count == 2  # noqa: PLR2004
+    assert downloader.metrics.summary()['bytes'] == len(b'data') * 2
+    assert downloader.metrics.summary()['phases']['download']['count'] == 2  # noqa: PLR2004
+
+
+@mock.patch('toto_backup.downloader.download_content')
+def test_download_should_retry_transient_errors(download_mock: Mock, tmp_path: Path):
+    download_mock.side_effect = [RequestsConnectionError(), RequestsConnectionError(), RequestsConnectionError()]
+    downloader = Downloader(retry_policy=RetryPolicy(max_attempts=2, sleep=Mock()))
+
+    with pytest.raises(RequestsConnectionError):
+        downloader.download('https://example.com/icon.png')
+    assert download_mock.call_count == 2  # noqa: PLR2004
+    assert isinstance(downloader.get_error('https://example.com/icon.png'), RequestsConnectionError)
+
+    # A later successful download clears the error.
+    download_mock.side_effect = None
+    (tmp_path / 'tmpfile').write_bytes(b'data')
+    download_mock.return_value = DownloadedContent(tmp_path / 'tmpfile', 'image/png', {})
+    downloader.download('https://example.com/icon.png')
+    assert downloader.get_error('https://example.com/icon.png') is None
+
+
+@mock.patch('toto_backup.downloader.download_content')
+def test_download_should_share_errors(download_mock: Mock):
+    download_mock.side_effect = HTTPError()
+    downloader = Downloader()
+    downloader.expect('https://example.com/icon.png')
+    downloader.expect('https://example.com/icon.png')
+
+    with pytest.raises(HTTPError):
+        downloader.download('https://example.com/icon.png')
+    with pytest.raises(HTTPError):
+        downloader.download('https://example.com/icon.png')
+    download_mock.assert_called_once_with('https://example.com/icon.png', None, None, None, None)
+
+
+@mock.patch('toto_backup.downloader.download_content')
+def test_download_should_fetch_not_modified_content_for_requesters_without_it(download_mock: Mock, tmp_path: Path):
+    (tmp_path / 'tmpfile').write_bytes(b'data')
+    content = DownloadedContent(tmp_path / 'tmpfile', 'image/png', {'etag': '"v1"'})
+    download_mock.side_effect = [NotModifiedError('https://example.com/icon.png'), content]
+    downloader = Downloader()
+    downloader.expect('https://example.com/icon.png')
+    downloader.expect('https://example.com/icon.png')
+
+    with pytest.raises(NotModifiedError):
+        downloader.download('https://example.com/icon.png', {'etag': '"v1"'})
+    # The second requester has no copy of the content, so it must download it.
+    assert downloader.download('https://example.com/icon.png') == (content, True)
+    assert download_mock.call_args_list == [
+        mock.call('https://example.com/icon.png', None, None, {'etag': '"v1"'}, None),
+        mock.call('https://example.com/icon.png', None, None, None, None),
+    ]
+
+
+@mock.patch('toto_backup.downloader.download_content')
+def test_download_should_fetch_not_modified_content_once_for_requesters_without_it(download_mock: Mock, tmp_path: Path):
+    (tmp_path / 'tmpfile').write_bytes(b'data')
+    content = DownloadedContent(tmp_path / 'tmpfile', 'image/png', {'etag': '"v1"'})
+    download_mock.side_effect = [NotModifiedError('https://example.com/icon.png'), content]
+    downloader = Downloader()
+    for _ in range(3):
+        downloader.expect('https://example.com/icon.png')
+
+    with pytest.raises(NotModifiedError):
+        downloader.download('https://example.com/icon.png', {'etag': '"v1"'})
+    # Both requesters without the content share its download, and its file.
+    assert downloader.download('https://example.com/icon.png') == (content, False)
+    assert downloader.download('https://example.com/icon.png') == (content, False)
+    assert download_mock.call_count == 2  # noqa: PLR2004
+    downloader.release('https://example.com/icon.png')
+    downloader.release('https://example.com/icon.png')
+    assert content.file.exists() is False
+
+
+@mock.patch('toto_backup.downloader.download_content')
+def test_download_should_keep_content_in_store(download_mock: Mock, tmp_path: Path):
+    temp_download_file = tmp_path / 'tmpfile'
+    temp_download_file.write_bytes(b'content')
+    download_mock.return_value = DownloadedContent(temp_download_file, 'image/png', {'etag': '"v1"'})
+    downloader = Downloader(store=ObjectStore(tmp_path / 'store'))
+
+    content, is_last = downloader.download('https://example.com/icon.png')
+    # Stored content must not be moved by its requester.
+    assert is_last is False
+    assert content.file.parent.parent == tmp_path / 'store' / 'objects'
+    assert downloader.get_validators('https://example.com/icon.png') == {'etag': '"v1"'}
+    assert downloader.get_checksum('https://example.com/icon.png') == hashlib.sha256(b'content').hexdigest()
+
+    # Stored content is not downloaded again, even by later backups.
+    downloader.close()
+    downloader = Downloader(store=ObjectStore(tmp_path / 'store'))
+    assert downloader.download('https://example.com/icon.png')[0].file == content.file
+    download_mock.assert_called_once()
+    assert content.file.exists() is True
+
+
+@mock.patch('toto_backup.downloader.download_content')
+def test_download_should_store_content_modified_in_place_only_if_clones_are_supported(
+    download_mock: Mock, tmp_path: Path
+):
+    (tmp_path / 'tmpfile').write_bytes(b'data')
+    download_mock.return_value = DownloadedContent(tmp_path / 'tmpfile', 'audio/mpeg', {})
+    downloader = Downloader(store=ObjectStore(tmp_path / 'store'))
+
+    # Tracks are tagged in place: stored, they would take twice their size.
+    content, is_last = downloader.download('https://example.com/track.mp3', modified_in_place=True)
+    assert is_last is True
+    assert content.file == tmp_path / 'tmpfile'
+
+    downloader = Downloader(store=ObjectStore(tmp_path / 'store', clones_supported=True))
+    content, is_last = downloader.download('https://example.com/track.mp3', modified_in_place=True)
+    assert is_last is False
+    assert content.file.parent.parent == tmp_path / 'store' / 'objects'
+
+
+@mock.patch('toto_backup.downloader.download_content')
+def test_close_should_delete_files_not_handed_to_last_requester(download_mock: Mock, tmp_path: Path):
+    temp_download_file = tmp_path / 'tmpfile'
+    temp_download_file.write_bytes(b'content')
+    download_mock.return_value = DownloadedContent(temp_download_file, 'image/png', {})
+    downloader = Downloader()
+    downloader.expect('https://example.com/icon.png')
+    downloader.expect('https://example.com/icon.png')
+
+    assert downloader.download('https://example.com/icon.png')[1] is False
+    downloader.close()
+    assert temp_download_file.exists() is False
@@ -0,0 +1,154 @@
+#
+# SPDX-License-Identifier: MPL-2.0
+#
+# Copyright (c) 2025-2026 "Laurent Desgrange".
+#
+# This file is part of "toto-backup".
+# See "https://github.com/ldesgrange/toto-backup") for further information.
+#
+# This Source Code Form is subject to the terms of the
+# Mozilla Public License, v. 2.0. If a copy of the MPL
+# was not distributed with this file, You can obtain one
+# at https://mozilla.org/MPL/2.0/.
+#
+import json
+import logging
+import os
+from pathlib import Path
+from unittest import mock
+from unittest.mock import Mock
+
+from toto_backup.manifest import Manifest, MANIFEST_FILENAME
+
+logger = logging.getLogger(__name__)
+
+
+def test_record_should_save_manifest(tmp_path: Path):
+    track_file = tmp_path / 'track.mp3'
+    track_file.write_bytes(b'content')
+    validators = {'etag': '"v1"', 'last_modified': None, 'content_length': 7}
+
+    Manifest(tmp_path).record(tmp_path / 'track', 'https://example.com/track.mp3', track_file, validators)
+
+    assert json.loads((tmp_path / MANIFEST_FILENAME).read_text(encoding='utf-8')) == {
+        'version': 1,
+        'entries': {
+            'track <https://example.com/track.mp3>': {
+                'url': 'https://example.com/track.mp3',
+                'filename': 'track.mp3',
+                'size': 7,
+                'mtime_ns': track_file.stat().st_mtime_ns,
+                'sha256': 'ed7002b439e9ac845f22357d822bac1444730fbdb6016d3ec9432297b9ec9f73',
+                'validators': validators,
+            },
+        },
+    }
+
+
+@mock.patch('toto_backup.manifest.compute_checksum')
+def test_record_should_use_checksum_computed_while_downloading(checksum_mock: Mock, tmp_path: Path):
+    track_file = tmp_path / 'track.mp3'
+    track_file.write_bytes(b'content')
+    manifest = Manifest(tmp_path)
+
+    manifest.record(tmp_path / 'track', 'https://example.com/track.mp3', track_file, checksum='0123')
+
+    # The file is not read again.
+    checksum_mock.assert_not_called()
+    entry = json.loads(manifest.file.read_text(encoding='utf-8'))['entries']['track <https://example.com/track.mp3>']
+    assert entry['sha256'] == '0123'
+
+
+def test_record_tags_should_keep_validators(tmp_path: Path):
+    track_file = tmp_path / 'track.mp3'
+    track_file.write_bytes(b'content')
+    manifest = Manifest(tmp_path)
+    manifest.record(tmp_path / 'track', 'https://example.com/track.mp3', track_file, {'etag': '"v1"'})
+
+    # Tagging modifies the file.
+    track_file.write_bytes(b'tagged content')
+    manifest.record_tags(tmp_path / 'track', 'https://example.com/track.mp3', track_file, 'tags')
+
+    manifest = Manifest(tmp_path)
+    assert manifest.find(tmp_path / 'track', 'https://example.com/track.mp3') == track_file
+    assert manifest.get_validators(tmp_path / 'track', 'https://example.com/track.mp3') == {'etag': '"v1"'}
+    assert manifest.get_tags(tmp_path / 'track', 'https://example.com/track.mp3') == 'tags'
+
+
+def test_find_should_return_recorded_file(tmp_path: Path):
+    track_file = tmp_path / 'track.mp3'
+    track_file.write_bytes(b'content')
+    Manifest(tmp_path).record(tmp_path / 'track', 'https://example.com/track.mp3', track_file)
+
+    manifest = Manifest(tmp_path)
+    assert manifest.find(tmp_path / 'track', 'https://example.com/track.mp3') == track_file
+    # Different content.
+    assert manifest.find(tmp_path / 'other', 'https://example.com/track.mp3') is None
+    assert manifest.find(tmp_path / 'track', 'https://example.com/other.mp3') is None
+    # Not tagged, no validators.
+    assert manifest.get_tags(tmp_path / 'track', 'https://example.com/track.mp3') is None
+    assert manifest.get_validators(tmp_path / 'track', 'https://example.com/track.mp3') is None
+
+
+def test_find_should_ignore_url_query(tmp_path: Path):
+    track_file = tmp_path / 'track.mp3'
+    track_file.write_bytes(b'content')
+    Manifest(tmp_path).record(tmp_path / 'track', 'https://example.com/track.mp3?Signature=1', track_file)
+
+    # Signed URLs change each time the card page is fetched.
+    manifest = Manifest(tmp_path)
+    assert manifest.find(tmp_path / 'track', 'https://example.com/track.mp3?Signature=2') == track_file
+    assert manifest.find(tmp_path / 'track', 'https://example.com/other.mp3?Signature=1') is None
+
+
+def test_manifest_should_read_entries_keyed_by_whole_url(tmp_path: Path):
+    track_file = tmp_path / 'track.mp3'
+    track_file.write_bytes(b'content')
+    manifest = Manifest(tmp_path)
+    manifest.record(tmp_path / 'track', 'https://example.com/track.mp3?Signature=1', track_file)
+    content = json.loads(manifest.file.read_text(encoding='utf-8'))
+    entry = next(iter(content['entries'].values()))
+    content['entries'] = {'track <https://example.com/track.mp3?Signature=1>': entry}
+    manifest.file.write_text(json.dumps(content), encoding='utf-8')
+
+    assert Manifest(tmp_path).find(tmp_path / 'track', 'https://example.com/track.mp3?Signature=2') == track_file
+
+
+def test_find_should_ignore_modified_files(tmp_path: Path):
+    track_file = tmp_path / 'track.mp3'
+    track_file.write_bytes(b'content')
+    manifest = Manifest(tmp_path)
+    manifest.record(tmp_path / 'track', 'https://example.com/track.mp3', track_file)
+    mtime_ns = track_file.stat().st_mtime_ns
+
+    # Same size, different content.
+    track_file.write_bytes(b'CONTENT')
+    os.utime(track_file, ns=(mtime_ns + 1, mtime_ns + 1))
+    assert manifest.find(tmp_path / 'track', 'https://example.com/track.mp3') is None
+    # Truncated.
+    track_file.write_bytes(b'con')
+    assert manifest.find(tmp_path / 'track', 'https://example.com/track.mp3') is None
+    # Missing.
+    track_file.unlink()
+    assert manifest.find(tmp_path / 'track', 'https://example.com/track.mp3') is None
+
+
+def test_find_should_not_compute_checksum_of_unchanged_files(tmp_path: Path):
+    track_file = tmp_path / 'track.mp3'
+    track_file.write_bytes(b'content')
+    manifest = Manifest(tmp_path)
+    manifest.record(tmp_path / 'track', 'https://example.com/track.mp3', track_file)
+    mtime_ns = track_file.stat().st_mtime_ns
+
+    # Same size and modification time: trusted without reading the file.
+    track_file.write_bytes(b'CONTENT')
+    os.utime(track_file, ns=(mtime_ns, mtime_ns))
+    assert manifest.find(tmp_path / 'track', 'https://example.com/track.mp3') == track_file
+
+
+def test_manifest_should_ignore_invalid_manifest_file(tmp_path: Path):
+    (tmp_path / MANIFEST_FILENAME).write_text('{invalid', encoding='utf-8')
+    assert Manifest(tmp_path).find(tmp_path / 'cover', 'https://example.com/cover.png') is None
+
+    (tmp_path / MANIFEST_FILENAME).write_text('{"version": 0, "entries": {}}', encoding='utf-8')
+    assert Manifest(tmp_path).find(tmp_path / 'cover', 'https://example.com/cover.png') is None
@@ -0,0 +1,102 @@
+#
+# SPDX-License-Identifier: MPL-2.0
+#
+# Copyright (c) 2025-2026 "Laurent Desgrange".
+#
+# This file is part of "toto-backup".
+# See "https://github.com/ldesgrange/toto-backup") for further information.
+#
+# This Source Code Form is subject to the terms of the
+# Mozilla Public License, v. 2.0. If a copy of the MPL
+# was not distributed with this file, You can obtain one
+# at https://mozilla.org/MPL/2.0/.
+#
+import json
+import logging
+from pathlib import Path
+from unittest import mock
+
+import pytest
+
+from toto_backup.metrics import format_prometheus, Metrics
+
+logger = logging.getLogger(__name__)
+
+
+def test_summary_should_provide_percentiles_of_each_phase():
+    metrics = Metrics()
+    for duration in range(1, 101):
+        metrics.record('download', duration / 100)
+    metrics.record('tag_track', 0.5)
+
+    summary = metrics.summary()
+
+    assert summary['phases']['download'] == {'count': 100, 'total': pytest.approx(50.5), 'p50': 0.5, 'p95': 0.95}
+    assert summary['phases']['tag_track'] == {'count': 1, 'total': 0.5, 'p50': 0.5, 'p95': 0.5}
+
+
+def test_summary_should_provide_counters_and_throughput():
+    with mock.patch('toto_backup.metrics.time.perf_counter', side_effect=[10.0, 12.0]):
+        metrics = Metrics()
+        metrics.add('bytes', 1000)
+        metrics.add('bytes', 500)
+        metrics.add('retries')
+        metrics.set_concurrency_windows({'example.com': 4})
+        summary = metrics.summary()
+
+    assert summary == {
+        'duration': 2.0,
+        'phases': {},
+        'bytes': 1500,
+        'throughput': 750.0,
+        'retries': 1,
+        'connections': {'opened': 0, 'reused': 0},
+        'concurrency': {'example.com': 4},
+    }
+
+
+def test_timer_should_record_failed_phases():
+    metrics = Metrics()
+
+    with pytest.raises(ValueError), metrics.timer('parse_data'):
+        raise ValueError
+
+    assert metrics.summary()['phases']['parse_data']['count'] == 1
+
+
+def test_format_prometheus_should_label_phases_and_quantiles():
+    summary = {
+        'duration': 2.0,
+        'phases': {'download': {'count': 3, 'total': 1.5, 'p50': 0.4, 'p95': 0.7}},
+        'bytes': 1500,
+        'throughput': 750.0,
+        'retries': 1,
+        'connections': {'opened': 2, 'reused': 5},
+        'concurrency': {'example.com': 4},
+    }
+
+    lines = format_prometheus(summary).splitlines()
+
+    assert 'toto_backup_phase_duration_seconds{phase="download",quantile="0.5"} 0.4' in lines
+    assert 'toto_backup_phase_duration_seconds{phase="download",quantile="0.95"} 0.7' in lines
+    assert 'toto_backup_phase_duration_seconds_sum{phase="download"} 1.5' in lines
+    assert 'toto_backup_phase_duration_seconds_count{phase="download"} 3' in lines
+    assert 'toto_backup_downloaded_bytes 1500' in lines
+    assert 'toto_backup_http_connections{state="reused"} 5' in lines
+    assert 'toto_backup_concurrency_window{host="example.com"} 4' in lines
+
+
+def test_write_should_replace_files(tmp_path: Path):
+    metrics = Metrics()
+    metrics.add('bytes', 42)
+    json_file = tmp_path / 'metrics.json'
+    prometheus_file = tmp_path / 'toto_backup.prom'
+    json_file.write_text('previous')
+
+    metrics.write_json(json_file)
+    metrics.write_prometheus(prometheus_file)
+
+    assert json.loads(json_file.read_text())['bytes'] == 42  # noqa: PLR2004
+    assert 'toto_backup_downloaded_bytes 42\n' in prometheus_file.read_text()
+    # No temporary file is left behind.
+    assert sorted(file.name for file in tmp_path.iterdir()) == ['metrics.json', 'toto_backup.prom']
@@ -0,0 +1,113 @@
+#
+# SPDX-License-Identifier: MPL-2.0
+#
+# Copyright (c) 2025-2026 "Laurent Desgrange".
+#
+# This file is part of "toto-backup".
+# See "https://github.com/ldesgrange/toto-backup") for further information.
+#
+# This Source Code Form is subject to the terms of the
+# Mozilla Public License, v. 2.0. If a copy of the MPL
+# was not distributed with this file, You can obtain one
+# at https://mozilla.org/MPL/2.0/.
+#
+import io
+import logging
+import pstats
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+
+from toto_backup.profiling import profiled, Profiler
+
+logger = logging.getLogger(__name__)
+
+
+def work_in_worker() -> int:
+    return sum(range(1000))
+
+
+def work_in_main_thread() -> int:
+    return sum(range(1000))
+
+
+def count_in_worker() -> int:
+    total = 0
+    for n in range(100_000):
+        total += n
+    return total
+
+
+def call_in_worker() -> int:
+    # Let workers run at the same time.
+    time.sleep(0.01)
+    return count_in_worker()
+
+
+def get_function_names(stats: pstats.Stats) -> set[str]:
+    return {function_name for _, _, function_name in stats.stats}  # type: ignore[attr-defined]
+
+
+def get_call_count(stats: pstats.Stats, name: str) -> int:
+    return sum(
+        calls[1]
+        for (_, _, function_name), calls in stats.stats.items()  # type: ignore[attr-defined]
+        if function_name == name
+    )
+
+
+def get_function_stats(stats: pstats.Stats, name: str) -> tuple[int, int, float, float]:
+    """
+    :return: The primitive and total call counts, total and cumulative time of a function.
+    """
+    return next(
+        function_stats[:4]
+        for (_, _, function_name), function_stats in stats.stats.items()  # type: ignore[attr-defined]
+        if function_name == name
+    )
+
+
+def test_profiler_should_profile_worker_threads():
+    profiler = Profiler()
+    profiler.start()
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        futures = [executor.submit(work_in_worker) for _ in range(4)]
+        for future in futures:
+            future.result()
+    work_in_main_thread()
+    stats = profiler.stop()
+
+    assert {'work_in_worker', 'work_in_main_thread'} <= get_function_names(stats)
+    assert get_call_count(stats, 'work_in_worker') == 4  # noqa: PLR2004
+
+
+def test_profiler_should_not_mix_up_calls_of_threads():
+    profiler = Profiler()
+    profiler.start()
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        futures = [executor.submit(call_in_worker) for _ in range(8)]
+        for future in futures:
+            future.result()
+    stats = profiler.stop()
+
+    caller_stats = get_function_stats(stats, 'call_in_worker')
+    callee_stats = get_function_stats(stats, 'count_in_worker')
+    # All calls are complete, non-recursive calls: none is lost in the calls of other threads.
+    assert caller_stats[:2] == callee_stats[:2] == (8, 8)
+    # The cumulative time of the caller includes the time spent in the callee.
+    assert caller_stats[3] >= callee_stats[2]
+
+
+def test_profiled_should_write_statistics_and_summary_on_failure(tmp_path: Path):
+    profile_file = tmp_path / 'run.pstats'
+    summary = io.StringIO()
+
+    with pytest.raises(SystemExit), profiled(profile_file, 3, summary):
+        work_in_main_thread()
+        raise SystemExit(1)
+
+    assert 'work_in_main_thread' in get_function_names(pstats.Stats(str(profile_file)))
+    assert 'Ordered by: cumulative time' in summary.getvalue()
+    assert 'due to restriction <3>' in summary.getvalue()
@@ -0,0 +1,95 @@
+#
+# SPDX-License-Identifier: MPL-2.0
+#
+# Copyright (c) 2025-2026 "Laurent Desgrange".
+#
+# This file is part of "toto-backup".
+# See "https://github.com/ldesgrange/toto-backup") for further information.
+#
+# This Source Code Form is subject to the terms of the
+# Mozilla Public License, v. 2.0. If a copy of the MPL
+# was not distributed with this file, You can obtain one
+# at https://mozilla.org/MPL/2.0/.
+#
+import logging
+from email.utils import formatdate
+from time import time
+from unittest import mock
+from unittest.mock import Mock
+
+import pytest
+from requests import ConnectionError as RequestsConnectionError, HTTPError, Response
+from requests.exceptions import ChunkedEncodingError
+
+from toto_backup.retry import get_retry_after, is_retryable, RetryPolicy
+
+logger = logging.getLogger(__name__)
+
+
+def create_http_error(status_code: int, retry_after: str | None = None) -> HTTPError:
+    response = Response()
+    response.status_code = status_code
+    if retry_after is not None:
+        response.headers['Retry-After'] = retry_after
+    return HTTPError(response=response)
+
+
+def test_is_retryable_should_only_accept_transient_errors():
+    assert is_retryable(RequestsConnectionError()) is True
+    assert is_retryable(ChunkedEncodingError()) is True
+    assert is_retryable(create_http_error(503)) is True
+    assert is_retryable(create_http_error(429)) is True
+    assert is_retryable(create_http_error(404)) is False
+    assert is_retryable(HTTPError()) is False
+    assert is_retryable(ValueError()) is False
+    assert is_retryable(None) is False
+
+
+def test_get_retry_after_should_parse_seconds_and_dates():
+    assert get_retry_after(create_http_error(503, '120')) == 120  # noqa: PLR2004
+    assert get_retry_after(create_http_error(503, formatdate(time() + 60, usegmt=True))) == pytest.approx(60, abs=2)
+    assert get_retry_after(create_http_error(503, formatdate(time() - 60, usegmt=True))) == 0
+    assert get_retry_after(create_http_error(503, 'soon')) is None
+    assert get_retry_after(create_http_error(503)) is None
+    assert get_retry_after(RequestsConnectionError()) is None
+
+
+def test_run_should_retry_transient_errors_with_exponential_backoff():
+    sleep_mock = Mock()
+    operation = Mock(
+        side_effect=[RequestsConnectionError(), RequestsConnectionError(), RequestsConnectionError(), 'result']
+    )
+    policy = RetryPolicy(max_attempts=4, base_delay=1, max_delay=3, sleep=sleep_mock)
+
+    with mock.patch('toto_backup.retry.random.uniform', side_effect=lambda low, high: high) as uniform_mock:
+        assert policy.run(operation) == 'result'
+
+    assert operation.call_count == 4  # noqa: PLR2004
+    # Full jitter, up to a delay doubling after each attempt, capped.
+    assert uniform_mock.call_args_list == [mock.call(0, 1), mock.call(0, 2), mock.call(0, 3)]
+    assert sleep_mock.call_args_list == [mock.call(1), mock.call(2), mock.call(3)]
+    assert policy.retry_count == 3  # noqa: PLR2004
+
+
+def test_run_should_honour_retry_after():
+    sleep_mock = Mock()
+    operation = Mock(side_effect=[create_http_error(429, '5'), create_http_error(503, '600'), 'result'])
+
+    assert RetryPolicy(max_attempts=3, max_delay=30, sleep=sleep_mock).run(operation) == 'result'
+
+    assert sleep_mock.call_args_list == [mock.call(5), mock.call(30)]
+
+
+def test_run_should_raise_fatal_errors_and_last_error():
+    sleep_mock = Mock()
+    fatal_error = create_http_error(404)
+    with pytest.raises(HTTPError) as error_info:
+        RetryPolicy(sleep=sleep_mock).run(Mock(side_effect=fatal_error))
+    assert error_info.value is fatal_error
+    sleep_mock.assert_not_called()
+
+    operation = Mock(side_effect=RequestsConnectionError())
+    with pytest.raises(RequestsConnectionError):
+        RetryPolicy(max_attempts=3, sleep=sleep_mock).run(operation)
+    assert operation.call_count == 3  # noqa: PLR2004
+    assert sleep_mock.call_count == 2  # noqa: PLR2004
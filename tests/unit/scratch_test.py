@@ -0,0 +1,78 @@
+#
+# SPDX-License-Identifier: MPL-2.0
+#
+# Copyright (c) 2025-2026 "Laurent Desgrange".
+#
+# This file is part of "toto-backup".
+# See "https://github.com/ldesgrange/toto-backup") for further information.
+#
+# This Source Code Form is subject to the terms of the
+# Mozilla Public License, v. 2.0. If a copy of the MPL
+# was not distributed with this file, You can obtain one
+# at https://mozilla.org/MPL/2.0/.
+#
+import logging
+import os
+import time
+from pathlib import Path
+
+from toto_backup.scratch import ORPHAN_MIN_AGE, PARTIAL_FILE_MAX_AGE, ScratchSpace
+
+logger = logging.getLogger(__name__)
+
+
+def create_file(directory: Path, name: str, age: float = 0) -> Path:
+    file = directory / name
+    file.write_bytes(b'content')
+    modification_time = time.time() - age
+    os.utime(file, (modification_time, modification_time))
+    return file
+
+
+def test_scratch_space_should_delete_orphan_files(tmp_path: Path):
+    old = ORPHAN_MIN_AGE + 60
+    # Interrupted downloads, kept to be resumed.
+    interrupted_files = [create_file(tmp_path, 'a.part', old), create_file(tmp_path, 'a.part.json', old)]
+    # Finished download never moved, and resume information without its download.
+    orphan_files = [create_file(tmp_path, 'b.part', old), create_file(tmp_path, 'c.part.json', old)]
+    # Files of a concurrent run.
+    recent_files = [create_file(tmp_path, 'd.part'), create_file(tmp_path, 'e.part.json')]
+    # Downloads interrupted too long ago.
+    expired_files = [
+        create_file(tmp_path, 'f.part', PARTIAL_FILE_MAX_AGE + 60),
+        create_file(tmp_path, 'f.part.json', PARTIAL_FILE_MAX_AGE + 60),
+    ]
+    other_file = create_file(tmp_path, 'notes.txt', PARTIAL_FILE_MAX_AGE + 60)
+
+    ScratchSpace(tmp_path)
+
+    assert sorted(tmp_path.iterdir()) == sorted([*interrupted_files, *recent_files, other_file])
+    assert all(not file.exists() for file in orphan_files + expired_files)
+
+
+def test_scratch_space_should_provide_partial_file_per_url(tmp_path: Path):
+    scratch = ScratchSpace(tmp_path / 'scratch')
+
+    partial_file = scratch.get_partial_file('https://example.com/track.mp3')
+
+    assert partial_file.parent == tmp_path / 'scratch'
+    assert partial_file.name.endswith('.part')
+    assert scratch.get_partial_file('https://example.com/track.mp3') == partial_file
+    assert scratch.get_partial_file('https://example.com/icon.png') != partial_file
+    # Signed URLs change each time the card page is fetched.
+    assert scratch.get_partial_file('https://example.com/track.mp3?Signature=1') == partial_file
+
+
+def test_close_should_delete_scratch_directory_unless_downloads_can_be_resumed(tmp_path: Path):
+    scratch = ScratchSpace(tmp_path / 'scratch')
+    partial_file = scratch.get_partial_file('https://example.com/track.mp3')
+    partial_file.write_bytes(b'content')
+    partial_file.with_name(f'{partial_file.name}.json').write_text('{}')
+
+    scratch.close()
+    assert partial_file.exists()
+
+    partial_file.unlink()
+    partial_file.with_name(f'{partial_file.name}.json').unlink()
+    scratch.close()
+    assert not (tmp_path / 'scratch').exists()
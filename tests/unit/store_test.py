@@ -0,0 +1,132 @@
+#
+# SPDX-License-Identifier: MPL-2.0
+#
+# Copyright (c) 2025-2026 "Laurent Desgrange".
+#
+# This file is part of "toto-backup".
+# See "https://github.com/ldesgrange/toto-backup") for further information.
+#
+# This Source Code Form is subject to the terms of the
+# Mozilla Public License, v. 2.0. If a copy of the MPL
+# was not distributed with this file, You can obtain one
+# at https://mozilla.org/MPL/2.0/.
+#
+import hashlib
+import json
+import logging
+from pathlib import Path
+
+from toto_backup.store import ObjectStore, STORE_INDEX_FILENAME, STORE_JOURNAL_FILENAME
+from toto_backup.utils import DownloadedContent
+
+logger = logging.getLogger(__name__)
+
+
+def create_content(directory: Path, name: str, data: bytes) -> DownloadedContent:
+    file = directory / name
+    file.write_bytes(data)
+    return DownloadedContent(file, 'image/png', {'etag': f'"{name}"'}, hashlib.sha256(data).hexdigest())
+
+
+def test_add_should_move_content_into_store(tmp_path: Path):
+    content = create_content(tmp_path, 'download', b'content')
+    store = ObjectStore(tmp_path / 'store')
+
+    stored_content = store.add('https://example.com/icon.png', content)
+
+    checksum = hashlib.sha256(b'content').hexdigest()
+    assert stored_content.file == tmp_path / 'store' / 'objects' / checksum[:2] / checksum[2:]
+    assert stored_content.file.read_bytes() == b'content'
+    assert stored_content.mime_type == 'image/png'
+    assert stored_content.validators == {'etag': '"download"'}
+    assert content.file.exists() is False
+
+
+def test_add_should_store_identical_content_once(tmp_path: Path):
+    store = ObjectStore(tmp_path / 'store')
+
+    stored_content_1 = store.add('https://example.com/icon-1.png', create_content(tmp_path, 'download-1', b'content'))
+    stored_content_2 = store.add('https://example.com/icon-2.png', create_content(tmp_path, 'download-2', b'content'))
+
+    assert stored_content_1.file == stored_content_2.file
+    assert len(list((tmp_path / 'store' / 'objects').rglob('*'))) == 2  # noqa: PLR2004
+    assert list(tmp_path.glob('download-*')) == []
+
+
+def test_find_should_return_stored_content(tmp_path: Path):
+    stored_content = ObjectStore(tmp_path / 'store').add(
+        'https://example.com/icon.png', create_content(tmp_path, 'download', b'content')
+    )
+
+    store = ObjectStore(tmp_path / 'store')
+    found_content = store.find('https://example.com/icon.png')
+    assert found_content.file == stored_content.file
+    assert found_content.mime_type == 'image/png'
+    assert found_content.validators == {'etag': '"download"'}
+    assert found_content.checksum == stored_content.checksum
+    assert store.find('https://example.com/other.png') is None
+
+    # Missing object.
+    stored_content.file.unlink()
+    assert store.find('https://example.com/icon.png') is None
+
+
+def test_find_should_ignore_url_query(tmp_path: Path):
+    stored_content = ObjectStore(tmp_path / 'store').add(
+        'https://example.com/icon.png?Signature=1', create_content(tmp_path, 'download', b'content')
+    )
+
+    # Signed URLs change each time the card page is fetched.
+    store = ObjectStore(tmp_path / 'store')
+    assert store.find('https://example.com/icon.png?Signature=2').file == stored_content.file
+    assert store.find('https://example.com/other.png?Signature=1') is None
+
+
+def test_store_should_ignore_invalid_index_file(tmp_path: Path):
+    (tmp_path / STORE_INDEX_FILENAME).write_text('{invalid', encoding='utf-8')
+    assert ObjectStore(tmp_path).find('https://example.com/icon.png') is None
+
+
+def test_add_should_append_entries_to_journal(tmp_path: Path):
+    store = ObjectStore(tmp_path)
+
+    for n in range(3):
+        store.add(f'https://example.com/icon-{n}.png', create_content(tmp_path, f'download-{n}', bytes([n])))
+
+    # The index file is only written when the store is closed.
+    assert (tmp_path / STORE_INDEX_FILENAME).exists() is False
+    assert len((tmp_path / STORE_JOURNAL_FILENAME).read_text(encoding='utf-8').splitlines()) == 3  # noqa: PLR2004
+    store.close()
+    index = json.loads((tmp_path / STORE_INDEX_FILENAME).read_text(encoding='utf-8'))
+    assert sorted(index['entries']) == [f'https://example.com/icon-{n}.png' for n in range(3)]
+    assert (tmp_path / STORE_JOURNAL_FILENAME).exists() is False
+    assert list(tmp_path.glob('*.tmp')) == []
+
+
+def test_store_should_read_journal_of_interrupted_runs(tmp_path: Path):
+    ObjectStore(tmp_path).add('https://example.com/icon.png', create_content(tmp_path, 'download', b'content'))
+    with open(tmp_path / STORE_JOURNAL_FILENAME, 'a', encoding='utf-8') as journal:
+        journal.write('{"url": "https://example.com/trunc')
+
+    store = ObjectStore(tmp_path)
+
+    assert store.find('https://example.com/icon.png') is not None
+    # The journal has been merged into the index file.
+    assert (tmp_path / STORE_JOURNAL_FILENAME).exists() is False
+    assert list(json.loads((tmp_path / STORE_INDEX_FILENAME).read_text(encoding='utf-8'))['entries']) == [
+        'https://example.com/icon.png'
+    ]
+
+
+def test_store_should_keep_entries_of_stores_sharing_directory(tmp_path: Path):
+    store_1 = ObjectStore(tmp_path / 'store')
+    store_2 = ObjectStore(tmp_path / 'store')
+
+    store_1.add('https://example.com/icon-1.png', create_content(tmp_path, 'download-1', b'content-1'))
+    store_2.add('https://example.com/icon-2.png', create_content(tmp_path, 'download-2', b'content-2'))
+    store_1.close()
+    store_2.add('https://example.com/icon-3.png', create_content(tmp_path, 'download-3', b'content-3'))
+    store_2.close()
+
+    store = ObjectStore(tmp_path / 'store')
+    assert all(store.find(f'https://example.com/icon-{n}.png') is not None for n in range(1, 4))
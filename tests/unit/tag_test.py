@@ -13,13 +13,15 @@
 #
 import logging
 import shutil
+from collections.abc import Callable
 from pathlib import Path
 
+import pytest
 from mutagen import File
-from mutagen.id3 import ID3Tags, APIC, PictureType
+from mutagen.id3 import ID3Tags, APIC, PictureType, delete as delete_id3_tags
 from mutagen.mp4 import MP4Cover, MP4Tags
 
-from toto_backup.tag import tag_track, Metadata
+from toto_backup.tag import tag_track, Metadata, TAG_PADDING, Id3TagInjector, get_metadata_fingerprint
 from utils import (
     get_dummy_m4a_file,
     get_dummy_ogg_opus_file,
@@ -70,6 +72,18 @@ def test_tag_track_should_add_tags_to_mp3_track(tmp_path: Path):
     assert cover.mime == 'image/png'
 
 
+def test_tag_track_should_add_tags_to_mp3_track_without_tags(tmp_path: Path):
+    track_file = tmp_path / 'empty_1.mp3'
+    shutil.copy(get_dummy_mp3_file(), track_file)
+    delete_id3_tags(track_file)
+
+    tag_track(track_file, create_metadata())
+
+    actual_tags: ID3Tags = File(track_file).tags
+    assert actual_tags['TIT2'][0] == 'Track Name'
+    assert actual_tags['APIC:'].mime == 'image/png'
+
+
 def test_tag_track_should_add_tags_to_ogg_vorbis_track(tmp_path: Path):
     track_file = tmp_path / 'empty_1.ogg'
     shutil.copy(get_dummy_ogg_vorbis_file(), track_file)
@@ -110,6 +124,14 @@ def test_tag_track_should_add_tags_to_ogg_opus_track(tmp_path: Path):
     assert actual_tags['metadata_block_picture'][0] is not None
 
 
+def test_metadata_should_be_empty_by_default():
+    track_metadata = Metadata()
+
+    assert [getattr(track_metadata, name) for name in Metadata.__slots__] == [None] * len(Metadata.__slots__)
+    with pytest.raises(AttributeError):
+        track_metadata.track_title = 'Typo'  # type: ignore[attr-defined]
+
+
 def test_tag_track_should_ignore_empty_tags(tmp_path: Path):
     track_file = tmp_path / 'empty_2.m4a'
     shutil.copy(get_dummy_m4a_file(), track_file)
@@ -124,6 +146,79 @@ def test_tag_track_should_ignore_empty_tags(tmp_path: Path):
     }
 
 
+@pytest.mark.parametrize(
+    ('get_dummy_file', 'suffix'),
+    [
+        (get_dummy_m4a_file, '.m4a'),
+        (get_dummy_mp3_file, '.mp3'),
+        (get_dummy_ogg_vorbis_file, '.ogg'),
+        (get_dummy_ogg_opus_file, '.opus'),
+    ],
+)
+def test_tag_track_should_reserve_padding_to_update_tags_in_place(
+    get_dummy_file: Callable[[], Path], suffix: str, tmp_path: Path
+):
+    track_file = tmp_path / f'empty_1{suffix}'
+    shutil.copy(get_dummy_file(), track_file)
+    track_metadata = create_metadata()
+
+    tag_track(track_file, track_metadata)
+    tagged_size = track_file.stat().st_size
+    assert tagged_size > get_dummy_file().stat().st_size + TAG_PADDING // 2
+
+    # Updated tags fit in the padding: the file keeps its size, audio data does not move.
+    track_metadata.track_name = 'A much longer track name, as if the card had been updated'
+    tag_track(track_file, track_metadata)
+    assert track_file.stat().st_size == tagged_size
+    assert File(track_file).tags is not None
+
+
+@pytest.mark.parametrize('track_format', [None, '.m4a'])
+def test_tag_track_should_tag_track_according_to_its_actual_format(track_format: str | None, tmp_path: Path):
+    track_file = tmp_path / 'empty_1.mp3'
+    shutil.copy(get_dummy_m4a_file(), track_file)
+
+    tag_track(track_file, create_metadata(), track_format)
+
+    actual_tags: MP4Tags = File(track_file).tags
+    assert actual_tags['\xa9nam'][0] == 'Track Name'
+
+
+@pytest.mark.parametrize('strip_tags', [False, True])
+def test_id3_tag_injector_should_tag_mp3_track_while_downloaded(strip_tags: bool, tmp_path: Path):
+    track_file = tmp_path / 'empty_1.mp3'
+    shutil.copy(get_dummy_mp3_file(), track_file)
+    if strip_tags:
+        delete_id3_tags(track_file)
+    content = track_file.read_bytes()
+    track_metadata = create_metadata()
+    injector = Id3TagInjector(track_metadata)
+
+    # More data is needed until the whole incoming tag has been received.
+    assert injector.rewrite_head(content[:4]) is None
+    head = injector.rewrite_head(content)
+    assert head is not None
+    new_head, replaced_size = head
+
+    tagged_file = tmp_path / 'tagged.mp3'
+    tagged_file.write_bytes(new_head + content[replaced_size:])
+    actual_tags: ID3Tags = File(tagged_file).tags
+    assert actual_tags['TIT2'][0] == 'Track Name'
+    assert actual_tags['APIC:'].mime == 'image/png'
+    assert injector.key == get_metadata_fingerprint(track_metadata)
+    # Tags of the downloaded track are kept.
+    assert ('TSSE' in actual_tags) is not strip_tags
+
+
+def test_id3_tag_injector_should_leave_other_formats_as_is():
+    injector = Id3TagInjector(create_metadata())
+
+    assert injector.rewrite_head(get_dummy_m4a_file().read_bytes()) == (b'', 0)
+    assert injector.rewrite_head(get_dummy_ogg_vorbis_file().read_bytes()[:64]) == (b'', 0)
+    # ADTS (AAC) frame.
+    assert injector.rewrite_head(b'\xff\xf1\x50\x80\x00\x1f\xfc\x21\x00\x00') == (b'', 0)
+
+
 def create_metadata() -> Metadata:
     track_metadata = Metadata()
     track_metadata.author = 'Author'
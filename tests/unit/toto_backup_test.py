@@ -11,15 +11,37 @@
 # was not distributed with this file, You can obtain one
 # at https://mozilla.org/MPL/2.0/.
 #
+import io
+import json
 import logging
+import os
+import subprocess
+import sys
+import time
 from pathlib import Path
+from typing import Any
 from unittest import mock
 from unittest.mock import Mock
 
+import pytest
 from requests import HTTPError
 
-from toto_backup.card import Card
-from toto_backup.toto_backup import create_card_directory, download_and_move_content
+from toto_backup.card import Card, Chapter, Track
+from toto_backup.downloader import Downloader
+from toto_backup.manifest import Manifest
+from toto_backup.tag import Metadata, get_metadata_fingerprint
+from toto_backup.utils import DownloadedContent, NotModifiedError, link_or_copy
+from toto_backup.toto_backup import (
+    create_card_directory,
+    read_card_urls,
+    backup_cards,
+    CardBackup,
+    ERROR_UNEXPECTED,
+    download_and_move_content,
+    download_tracks,
+    download_track,
+    TrackDownload,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -74,7 +96,60 @@ def test_create_card_directory_may_overwrite_existing_directory(confirm_mock: Mo
     assert file_in_card_directory.exists() is False
 
 
-@mock.patch('toto_backup.toto_backup.download_content')
+@mock.patch('toto_backup.toto_backup.should_overwrite_directory')
+def test_create_card_directory_should_reuse_existing_directory_when_resuming(confirm_mock: Mock, tmp_path: Path):
+    parent_directory = tmp_path
+    card = Card('title', 'author', 'https://example.com/cover.png')
+    card_directory = create_card_directory(parent_directory, card)
+    file_in_card_directory = card_directory / 'dummy.txt'
+    file_in_card_directory.touch()
+
+    assert create_card_directory(parent_directory, card, resume=True) == card_directory
+    confirm_mock.assert_not_called()
+    assert file_in_card_directory.exists() is True
+
+
+@mock.patch('toto_backup.toto_backup.should_overwrite_directory')
+def test_create_card_directory_should_not_overwrite_existing_directory_when_not_interactive(
+    confirm_mock: Mock, tmp_path: Path
+):
+    card = Card('title', 'author', 'https://example.com/cover.png')
+    card_directory = create_card_directory(tmp_path, card)
+
+    assert create_card_directory(tmp_path, card, interactive=False) is None
+    assert create_card_directory(tmp_path, card, resume=True, interactive=False) == card_directory
+    confirm_mock.assert_not_called()
+
+
+def test_read_card_urls_should_skip_comments_and_duplicates():
+    file = io.StringIO(
+        '# My cards\nhttps://yoto.io/AAAAA?x=1\n\n  https://yoto.io/BBBBB?x=2  \nHTTPS://YOTO.IO/AAAAA/?x=1\n'
+    )
+
+    assert read_card_urls(file) == ['https://yoto.io/AAAAA?x=1', 'https://yoto.io/BBBBB?x=2']
+
+
+@mock.patch('toto_backup.toto_backup.backup_card')
+def test_backup_cards_should_back_up_other_cards_after_unexpected_errors(backup_mock: Mock):
+    error = OSError('disk full')
+
+    def backup(url: str, *_args: Any, **_kwargs: Any) -> CardBackup:
+        if url.endswith('BBBBB'):
+            raise error
+        return CardBackup(url, 2)
+
+    backup_mock.side_effect = backup
+
+    card_backups = backup_cards(
+        ['https://yoto.io/AAAAA', 'https://yoto.io/BBBBB', 'https://yoto.io/CCCCC'], Downloader(), cards=2
+    )
+
+    assert [card_backup.exit_code for card_backup in card_backups] == [0, ERROR_UNEXPECTED, 0]
+    assert card_backups[1].reason == 'unexpected error: disk full'
+    assert card_backups[2].successful_track_count == 2  # noqa: PLR2004
+
+
+@mock.patch('toto_backup.downloader.download_content')
 def test_download_and_move_content_should_download_and_move_content(download_mock: Mock, tmp_path: Path):
     destination_directory = tmp_path / 'destination'
     destination_directory.mkdir()
@@ -82,16 +157,16 @@ def test_download_and_move_content_should_download_and_move_content(download_moc
     download_mock.reset_mock()
     temp_download_file = tmp_path / 'tmpfile'
     temp_download_file.write_bytes(b'content')
-    download_mock.return_value = (temp_download_file, 'audio/mpeg')
+    download_mock.return_value = DownloadedContent(temp_download_file, 'audio/mpeg', {})
     final_file = download_and_move_content('https://example.com/track1.mp3', destination_directory / 'file')
     assert final_file.exists() is True
     assert final_file.read_bytes() == b'content'
     assert final_file.name == 'file.mp3'
     assert final_file.parent == destination_directory
-    download_mock.assert_called_once_with('https://example.com/track1.mp3')
+    download_mock.assert_called_once_with('https://example.com/track1.mp3', None, None, None, None)
 
 
-@mock.patch('toto_backup.toto_backup.download_content')
+@mock.patch('toto_backup.downloader.download_content')
 def test_download_and_move_content_should_return_none_in_case_of_error(download_mock: Mock, tmp_path: Path):
     destination_directory = tmp_path / 'destination'
     destination_directory.mkdir()
@@ -100,4 +175,242 @@ def test_download_and_move_content_should_return_none_in_case_of_error(download_
     download_mock.side_effect = HTTPError()
     final_file = download_and_move_content('https://example.com/track1.mp3', destination_directory / 'file')
     assert final_file is None
-    download_mock.assert_called_once_with('https://example.com/track1.mp3')
+    download_mock.assert_called_once_with('https://example.com/track1.mp3', None, None, None, None)
+
+
+@mock.patch('toto_backup.downloader.download_content')
+def test_download_and_move_content_should_share_content_of_identical_urls(download_mock: Mock, tmp_path: Path):
+    destination_directory = tmp_path / 'destination'
+    destination_directory.mkdir()
+    temp_download_file = tmp_path / 'tmpfile'
+    temp_download_file.write_bytes(b'content')
+    download_mock.return_value = DownloadedContent(temp_download_file, 'image/png', {})
+    downloader = Downloader()
+    for _ in range(3):
+        downloader.expect('https://example.com/icon.png')
+
+    icon_files = [
+        download_and_move_content('https://example.com/icon.png', destination_directory / f'file{n}', downloader)
+        for n in range(1, 4)
+    ]
+
+    download_mock.assert_called_once_with('https://example.com/icon.png', None, None, None, None)
+    assert [icon_file.name for icon_file in icon_files] == ['file1.png', 'file2.png', 'file3.png']
+    # Content is stored once.
+    assert len({icon_file.stat().st_ino for icon_file in icon_files}) == 1
+    assert temp_download_file.exists() is False
+
+
+@mock.patch('toto_backup.toto_backup.link_or_copy')
+@mock.patch('toto_backup.downloader.download_content')
+def test_download_and_move_content_should_share_content_between_concurrent_requesters(
+    download_mock: Mock, link_mock: Mock, tmp_path: Path
+):
+    destination_directory = tmp_path / 'destination'
+    destination_directory.mkdir()
+    temp_download_file = tmp_path / 'tmpfile'
+    temp_download_file.write_bytes(b'content')
+    download_mock.return_value = DownloadedContent(temp_download_file, 'image/png', {})
+    requester_count = 8
+
+    def slow_link_or_copy(source: Path, destination: Path, hardlink: bool = True) -> None:
+        # Let later requesters come while this one has not linked the file yet.
+        time.sleep(0.05)
+        link_or_copy(source, destination, hardlink)
+
+    link_mock.side_effect = slow_link_or_copy
+    downloader = Downloader(jobs=requester_count)
+    for _ in range(requester_count):
+        downloader.expect('https://example.com/icon.png')
+
+    futures = [
+        downloader.executor.submit(
+            download_and_move_content, 'https://example.com/icon.png', destination_directory / f'file{n}', downloader
+        )
+        for n in range(requester_count)
+    ]
+    icon_files = [future.result() for future in futures]
+    downloader.close()
+
+    download_mock.assert_called_once()
+    assert all(icon_file.read_bytes() == b'content' for icon_file in icon_files)
+    assert temp_download_file.exists() is False
+
+
+@mock.patch('toto_backup.downloader.download_content')
+def test_download_and_move_content_should_copy_shared_writable_content(download_mock: Mock, tmp_path: Path):
+    destination_directory = tmp_path / 'destination'
+    destination_directory.mkdir()
+    temp_download_file = tmp_path / 'tmpfile'
+    temp_download_file.write_bytes(b'content')
+    download_mock.return_value = DownloadedContent(temp_download_file, 'audio/mpeg', {})
+    downloader = Downloader()
+    downloader.expect('https://example.com/track.mp3')
+    downloader.expect('https://example.com/track.mp3')
+
+    file_1 = download_and_move_content('https://example.com/track.mp3', tmp_path / 'file1', downloader, Metadata())
+    file_2 = download_and_move_content('https://example.com/track.mp3', tmp_path / 'file2', downloader, Metadata())
+
+    download_mock.assert_called_once_with('https://example.com/track.mp3', None, None, None, mock.ANY)
+    assert file_1.read_bytes() == file_2.read_bytes() == b'content'
+    assert file_1.stat().st_ino != file_2.stat().st_ino
+
+
+@mock.patch('toto_backup.toto_backup.tag_track')
+@mock.patch('toto_backup.toto_backup.download_and_move_content')
+def test_download_tracks_should_download_tracks_concurrently(
+    download_mock: Mock, tag_mock: Mock, tmp_path: Path, capsys: pytest.CaptureFixture[str]
+):
+    card = Card('title', 'author', 'https://example.com/cover.png')
+    for chapter_number in range(1, 4):
+        chapter = Chapter(chapter_number, f'Chapter {chapter_number}', f'https://example.com/icon-{chapter_number}.png')
+        for track_number in range(1, 4):
+            chapter.add_track(
+                Track(track_number, f'Track {track_number}', f'https://example.com/{chapter_number}-{track_number}.mp3')
+            )
+        card.add_chapter(chapter)
+
+    def download(
+        url: str,
+        destination: Path,
+        _downloader: Downloader,
+        track_metadata: Metadata | None = None,
+        _validators: None = None,
+    ) -> Path | None:
+        assert (track_metadata is not None) is url.endswith('.mp3')
+        if url == 'https://example.com/2-2.mp3':
+            return None
+        file = destination.with_name(f'{destination.name}{Path(url).suffix}')
+        file.write_bytes(url.encode('utf-8'))
+        return file
+
+    download_mock.side_effect = download
+
+    successful_count, failed_count = download_tracks(card, tmp_path, 'https://example.com/card', Downloader(jobs=4))
+
+    assert successful_count == 8  # noqa: PLR2004
+    assert failed_count == 1
+    assert tag_mock.call_count == 8  # noqa: PLR2004
+    download_mock.assert_any_call(
+        'https://example.com/icon-2.png', tmp_path / '1-05_Chapter 2 - Track 2', mock.ANY, None
+    )
+    download_mock.assert_any_call(
+        'https://example.com/3-3.mp3', tmp_path / '1-09_Chapter 3 - Track 3', mock.ANY, mock.ANY
+    )
+    # Results are reported in track order, whatever the completion order.
+    output_lines = capsys.readouterr().out.splitlines()
+    assert output_lines[0] == 'Downloading tracks…'
+    assert [line.split(' ')[1] for line in output_lines[1:]] == [f'{n}/9' for n in range(1, 10) if n != 5]  # noqa: PLR2004
+
+
+@mock.patch('toto_backup.toto_backup.tag_track')
+@mock.patch('toto_backup.toto_backup.download_and_move_content')
+def test_download_track_should_skip_track_already_backed_up(download_mock: Mock, tag_mock: Mock, tmp_path: Path):
+    def download(
+        url: str, destination: Path, _downloader: Downloader, _track_metadata: None = None, _validators: None = None
+    ) -> Path:
+        file = destination.with_name(f'{destination.name}{Path(url).suffix}')
+        file.write_bytes(url.encode('utf-8'))
+        return file
+
+    download_mock.side_effect = download
+    track_metadata = Metadata()
+    track_metadata.track_name = 'Track 1'
+    track_download = TrackDownload(
+        'https://example.com/icon.png', 'https://example.com/track.mp3', tmp_path / '1-01_Track 1', track_metadata
+    )
+
+    # First backup downloads everything.
+    track_file = download_track(track_download, Downloader(), Manifest(tmp_path))
+    assert track_file == tmp_path / '1-01_Track 1.mp3'
+    assert download_mock.call_count == 2  # noqa: PLR2004
+    tag_mock.assert_called_once_with(track_file, track_metadata, None)
+
+    # Resumed backup downloads nothing.
+    download_mock.reset_mock()
+    tag_mock.reset_mock()
+    assert download_track(track_download, Downloader(), Manifest(tmp_path)) == track_file
+    download_mock.assert_not_called()
+    tag_mock.assert_not_called()
+
+    # Modified track is downloaded again.
+    track_file.write_bytes(b'corrupted')
+    assert download_track(track_download, Downloader(), Manifest(tmp_path)) == track_file
+    download_mock.assert_called_once_with(
+        'https://example.com/track.mp3', tmp_path / '1-01_Track 1', mock.ANY, track_metadata, None
+    )
+    tag_mock.assert_called_once_with(track_file, track_metadata, None)
+
+    # Modified metadata is tagged again, without downloading.
+    download_mock.reset_mock()
+    tag_mock.reset_mock()
+    track_metadata.track_name = 'Track One'
+    assert download_track(track_download, Downloader(), Manifest(tmp_path)) == track_file
+    download_mock.assert_not_called()
+    tag_mock.assert_called_once_with(track_file, track_metadata, None)
+
+
+@mock.patch('toto_backup.toto_backup.tag_track')
+@mock.patch('toto_backup.downloader.download_content')
+def test_download_track_should_not_tag_track_tagged_while_downloaded(
+    download_mock: Mock, tag_mock: Mock, tmp_path: Path
+):
+    track_download = TrackDownload(
+        'https://example.com/icon.png', 'https://example.com/track.mp3', tmp_path / '1-01_Track 1', Metadata()
+    )
+
+    def download(url: str, _session: None, _partial_file: None, _validators: None, head_rewriter: Any) -> Any:
+        file = tmp_path / Path(url).name
+        file.write_bytes(b'content')
+        head_key = head_rewriter.key if head_rewriter is not None else None
+        return DownloadedContent(file, 'audio/mpeg' if url.endswith('.mp3') else 'image/png', {}, None, head_key)
+
+    download_mock.side_effect = download
+    manifest = Manifest(tmp_path)
+
+    track_file = download_track(track_download, Downloader(), manifest)
+
+    tag_mock.assert_not_called()
+    assert manifest.get_tags(track_download.destination, track_download.track_url) == get_metadata_fingerprint(
+        track_download.metadata
+    )
+    assert track_file == tmp_path / '1-01_Track 1.mp3'
+
+
+@mock.patch('toto_backup.toto_backup.tag_track')
+@mock.patch('toto_backup.toto_backup.download_and_move_content')
+def test_download_track_should_keep_track_not_modified_when_refreshing(
+    download_mock: Mock, tag_mock: Mock, tmp_path: Path
+):
+    track_file = tmp_path / '1-01_Track 1.mp3'
+    track_file.write_bytes(b'content')
+    Manifest(tmp_path).record(tmp_path / '1-01_Track 1', 'https://example.com/track.mp3', track_file, {'etag': '"v1"'})
+    download_mock.side_effect = [None, NotModifiedError('https://example.com/track.mp3')]
+    track_download = TrackDownload(
+        'https://example.com/icon.png', 'https://example.com/track.mp3', tmp_path / '1-01_Track 1', Metadata()
+    )
+
+    assert download_track(track_download, Downloader(), Manifest(tmp_path, refresh=True)) == track_file
+    download_mock.assert_called_with(
+        'https://example.com/track.mp3', tmp_path / '1-01_Track 1', mock.ANY, track_download.metadata, {'etag': '"v1"'}
+    )
+    assert track_file.read_bytes() == b'content'
+    # Never tagged yet.
+    tag_mock.assert_called_once_with(track_file, track_download.metadata, None)
+
+
+def test_import_should_not_import_format_specific_modules():
+    # Checked in a new interpreter, other tests import them.
+    code = 'import json, sys, toto_backup.toto_backup; print(json.dumps(list(sys.modules)))'
+    result = subprocess.run(
+        [sys.executable, '-c', code],
+        env={**os.environ, 'PYTHONPATH': os.pathsep.join(sys.path)},
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    modules = json.loads(result.stdout)
+    assert 'toto_backup.tag' in modules
+    lazy_modules = ['bs4', 'puremagic', 'mutagen.flac', 'mutagen.id3', 'mutagen.mp4', 'mutagen.ogg']
+    assert [module for module in lazy_modules if module in modules] == []
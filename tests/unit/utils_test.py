@@ -11,31 +11,56 @@
 # was not distributed with this file, You can obtain one
 # at https://mozilla.org/MPL/2.0/.
 #
+import errno
+import hashlib
+import io
 import logging
 import os
+import tracemalloc
+from http.server import BaseHTTPRequestHandler
 from pathlib import Path
 from unittest import mock
+from unittest.mock import Mock
 
 import click
 import pytest
 import responses
+from bs4 import BeautifulSoup
 from _pytest.logging import LogCaptureFixture
 from click.testing import CliRunner
-from requests import HTTPError
+from requests import HTTPError, RequestException
 from requests.structures import CaseInsensitiveDict
 
 from toto_backup.utils import (
+    can_clone_files,
+    canonical_url,
+    content_url,
+    create_session,
+    get_connection_stats,
     get_extension,
     get_mime_type,
     download_content,
+    DOWNLOAD_CHUNK_SIZE,
+    NotModifiedError,
     fetch_page,
     find_data,
     should_overwrite_directory,
     similar_strings,
     format_base_filename,
     deep_get,
+    link_or_copy,
+    move_file,
+    sniff_extension,
+)
+from utils import (
+    get_dummy_m4a_file,
+    get_dummy_ogg_opus_file,
+    get_dummy_ogg_vorbis_file,
+    get_dummy_mp3_file,
+    get_dummy_png_file,
+    get_dummy_file,
+    local_http_server,
 )
-from utils import get_dummy_m4a_file, get_dummy_ogg_vorbis_file, get_dummy_mp3_file, get_dummy_file
 
 logger = logging.getLogger(__name__)
 
@@ -81,6 +106,54 @@ def test_get_extension_should_return_extension_from_magic_bytes():
     assert get_extension(None, get_dummy_ogg_vorbis_file()) == '.ogg'
 
 
+@mock.patch('puremagic.magic_file')
+def test_get_extension_should_prefer_detected_extension_to_magic_bytes(magic_file_mock: mock.Mock):
+    assert get_extension('audio/mpeg', get_dummy_m4a_file(), '.m4a') == '.mp3'
+    assert get_extension(None, get_dummy_m4a_file(), '.m4a') == '.m4a'
+    magic_file_mock.assert_not_called()
+
+
+def test_sniff_extension_should_detect_format_from_first_bytes():
+    assert sniff_extension(b'') is None
+    assert sniff_extension(b'content') is None
+    assert sniff_extension(get_dummy_m4a_file().read_bytes()) == '.m4a'
+    assert sniff_extension(get_dummy_mp3_file().read_bytes()) == '.mp3'
+    # MPEG frame without ID3 tag.
+    assert sniff_extension(b'\xff\xfb\x90\x00') == '.mp3'
+    # ADTS (AAC) frame, same frame sync as MPEG audio.
+    assert sniff_extension(b'\xff\xf1\x50\x80\x00\x1f\xfc') == '.aac'
+    assert sniff_extension(get_dummy_ogg_vorbis_file().read_bytes()) == '.ogg'
+    assert sniff_extension(get_dummy_ogg_opus_file().read_bytes()) == '.opus'
+    assert sniff_extension(get_dummy_png_file().read_bytes()) == '.png'
+
+
+class KeepAliveHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Type', 'audio/mpeg')
+        self.send_header('Content-Length', '7')
+        self.end_headers()
+        self.wfile.write(b'content')
+
+    def log_message(self, *_args):
+        pass
+
+
+def test_create_session_should_reuse_connections():
+    with local_http_server(KeepAliveHandler) as base_url, create_session() as session:
+        assert get_connection_stats(session) == (0, 0)
+
+        assert fetch_page(f'{base_url}/card', session) == 'content'
+        for track_number in range(1, 4):
+            downloaded_file = download_content(f'{base_url}/track{track_number}.mp3', session).file
+            assert downloaded_file.read_bytes() == b'content'
+            downloaded_file.unlink()
+
+        assert get_connection_stats(session) == (1, 3)
+
+
 @responses.activate
 def test_download_content_should_create_file():
     url = 'https://example.com/track1.mp3'
@@ -91,14 +164,220 @@ def test_download_content_should_create_file():
             url=url,
             status=200,
             content_type='audio/mpeg',
-            body=b'content',
+            headers={'ETag': '"v1"', 'Last-Modified': 'Wed, 21 Oct 2015 07:28:00 GMT'},
+            body=b'ID3content',
+        )
+    )
+
+    content = download_content(url)
+    assert content.file.exists()
+    assert content.file.read_bytes() == b'ID3content'
+    assert content.mime_type == 'audio/mpeg'
+    assert content.validators['etag'] == '"v1"'
+    assert content.validators['last_modified'] == 'Wed, 21 Oct 2015 07:28:00 GMT'
+    assert content.checksum == hashlib.sha256(b'ID3content').hexdigest()
+    assert content.extension == '.mp3'
+
+
+class ZeroStream(io.RawIOBase):
+    """
+    Readable stream of zeros generated on the fly, to simulate a large HTTP response body
+    without allocating it.
+    """
+
+    def __init__(self, size: int):
+        self._remaining = size
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        size = min(len(buffer), self._remaining)
+        buffer[:size] = bytes(size)
+        self._remaining -= size
+        return size
+
+
+@responses.activate
+def test_download_content_should_stream_content_with_constant_memory():
+    url = 'https://example.com/track1.mp3'
+    content_length = 64 * 1024 * 1024
+    # Mock HTTP response.
+    responses.add(
+        responses.Response(
+            method='GET',
+            url=url,
+            status=200,
+            content_type='audio/mpeg',
+            headers={'Content-Length': str(content_length)},
+            body=io.BufferedReader(ZeroStream(content_length)),
         )
     )
 
-    downloaded_file, mime_type = download_content(url)
-    assert downloaded_file.exists()
-    assert downloaded_file.read_bytes() == b'content'
-    assert mime_type == 'audio/mpeg'
+    tracemalloc.start()
+    try:
+        downloaded_file = download_content(url).file
+        _, peak_memory = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    assert downloaded_file.stat().st_size == content_length
+    # Peak memory is bounded by the chunk size, not by the content size.
+    assert peak_memory < 16 * DOWNLOAD_CHUNK_SIZE
+    downloaded_file.unlink()
+
+
+# Number of bytes sent before the connection is dropped, a whole number of chunks.
+DROP_AFTER = 2 * DOWNLOAD_CHUNK_SIZE
+
+
+def create_flaky_handler(
+    content: bytes, etag: str, drop_after: int, supports_ranges: bool = True
+) -> tuple[type[BaseHTTPRequestHandler], list[str | None]]:
+    """
+    Creates a request handler serving content, dropping the connection in the middle of the
+    first response. Returns the handler and the list of received `Range` headers.
+    """
+    received_ranges: list[str | None] = []
+
+    class FlakyHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        served_content = content
+        served_etag = etag
+
+        def do_GET(self):
+            range_header = self.headers.get('Range')
+            received_ranges.append(range_header)
+            if_range = self.headers.get('If-Range')
+            start = 0
+            if supports_ranges and range_header and if_range in [None, self.served_etag]:
+                start = int(range_header.removeprefix('bytes=').removesuffix('-'))
+                self.send_response(206)
+                self.send_header(
+                    'Content-Range', f'bytes {start}-{len(self.served_content) - 1}/{len(self.served_content)}'
+                )
+            else:
+                self.send_response(200)
+            body = self.served_content[start:]
+            self.send_header('Content-Type', 'audio/mpeg')
+            self.send_header('Content-Length', str(len(body)))
+            self.send_header('ETag', self.served_etag)
+            self.end_headers()
+            if len(received_ranges) == 1:
+                # Simulate a connection dropped in the middle of the body.
+                self.wfile.write(body[:drop_after])
+                self.close_connection = True
+            else:
+                self.wfile.write(body)
+
+        def log_message(self, *_args):
+            pass
+
+    return FlakyHandler, received_ranges
+
+
+def test_download_content_should_resume_interrupted_download(tmp_path: Path):
+    content = os.urandom(256 * 1024)
+    handler, received_ranges = create_flaky_handler(content, '"v1"', drop_after=DROP_AFTER)
+    partial_file = tmp_path / 'track.part'
+
+    with local_http_server(handler) as base_url:
+        with pytest.raises(RequestException):
+            download_content(f'{base_url}/track.mp3', partial_file=partial_file)
+        # Downloaded content is kept.
+        assert partial_file.stat().st_size == DROP_AFTER
+
+        downloaded_content = download_content(f'{base_url}/track.mp3', partial_file=partial_file)
+
+    assert downloaded_content.file == partial_file
+    assert downloaded_content.file.read_bytes() == content
+    assert downloaded_content.mime_type == 'audio/mpeg'
+    # Validators are the ones of the whole content.
+    assert downloaded_content.validators == {'etag': '"v1"', 'last_modified': None, 'content_length': len(content)}
+    # Checksum covers the whole content.
+    assert downloaded_content.checksum == hashlib.sha256(content).hexdigest()
+    assert received_ranges == [None, f'bytes={DROP_AFTER}-']
+    # Only the rest of the content has been received.
+    assert downloaded_content.downloaded_size == len(content) - DROP_AFTER
+    # Only the content is left.
+    assert list(tmp_path.iterdir()) == [partial_file]
+
+
+class PrefixRewriter:
+    """
+    Replaces the first 4 bytes of content with a longer prefix.
+    """
+
+    key = 'prefix'
+
+    @staticmethod
+    def rewrite_head(head: bytes) -> tuple[bytes, int] | None:
+        if len(head) < 4:  # noqa: PLR2004
+            return None
+        return b'rewritten', 4
+
+
+def test_download_content_should_rewrite_head_and_resume_after_it(tmp_path: Path):
+    content = os.urandom(256 * 1024)
+    handler, received_ranges = create_flaky_handler(content, '"v1"', drop_after=DROP_AFTER)
+    partial_file = tmp_path / 'track.part'
+
+    with local_http_server(handler) as base_url:
+        with pytest.raises(RequestException):
+            download_content(f'{base_url}/track.mp3', partial_file=partial_file, head_rewriter=PrefixRewriter())
+        downloaded_content = download_content(
+            f'{base_url}/track.mp3', partial_file=partial_file, head_rewriter=PrefixRewriter()
+        )
+
+    rewritten_content = b'rewritten' + content[4:]
+    assert downloaded_content.file.read_bytes() == rewritten_content
+    assert downloaded_content.head_key == 'prefix'
+    assert downloaded_content.checksum == hashlib.sha256(rewritten_content).hexdigest()
+    # The download is resumed where the server content was interrupted.
+    assert received_ranges == [None, f'bytes={DROP_AFTER}-']
+    # The rewritten head has not been received.
+    assert downloaded_content.downloaded_size == len(content) - DROP_AFTER
+
+
+@mock.patch('toto_backup.utils.NamedTemporaryFile')
+def test_download_content_should_delete_temporary_file_when_download_fails(temp_file_mock: Mock, tmp_path: Path):
+    temp_file_mock.return_value.__enter__.return_value.name = str(tmp_path / 'download')
+    handler, _ = create_flaky_handler(os.urandom(256 * 1024), '"v1"', drop_after=DROP_AFTER)
+
+    with local_http_server(handler) as base_url, pytest.raises(RequestException):
+        download_content(f'{base_url}/track.mp3')
+
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_download_content_should_download_again_when_server_ignores_ranges(tmp_path: Path):
+    content = os.urandom(256 * 1024)
+    handler, received_ranges = create_flaky_handler(content, '"v1"', drop_after=DROP_AFTER, supports_ranges=False)
+    partial_file = tmp_path / 'track.part'
+
+    with local_http_server(handler) as base_url:
+        with pytest.raises(RequestException):
+            download_content(f'{base_url}/track.mp3', partial_file=partial_file)
+        downloaded_file = download_content(f'{base_url}/track.mp3', partial_file=partial_file).file
+
+    assert downloaded_file.read_bytes() == content
+    assert received_ranges == [None, f'bytes={DROP_AFTER}-']
+
+
+def test_download_content_should_download_again_when_content_changed(tmp_path: Path):
+    handler, received_ranges = create_flaky_handler(os.urandom(256 * 1024), '"v1"', drop_after=DROP_AFTER)
+    partial_file = tmp_path / 'track.part'
+
+    with local_http_server(handler) as base_url:
+        with pytest.raises(RequestException):
+            download_content(f'{base_url}/track.mp3', partial_file=partial_file)
+        new_content = os.urandom(128 * 1024)
+        handler.served_content = new_content
+        handler.served_etag = '"v2"'
+        downloaded_file = download_content(f'{base_url}/track.mp3', partial_file=partial_file).file
+
+    assert downloaded_file.read_bytes() == new_content
+    assert received_ranges == [None, f'bytes={DROP_AFTER}-']
 
 
 @responses.activate
@@ -120,6 +399,29 @@ def test_download_content_should_raise_on_http_error():
     assert str(e.value) == '404 Client Error: Not Found for url: https://example.com/track1.mp3'
 
 
+@responses.activate
+def test_download_content_should_send_conditional_request_and_raise_when_not_modified():
+    url = 'https://example.com/track1.mp3'
+    validators = {'etag': '"v1"', 'last_modified': 'Wed, 21 Oct 2015 07:28:00 GMT', 'content_length': 7}
+    # Mock HTTP response.
+    responses.add(
+        responses.Response(
+            method='GET',
+            url=url,
+            status=304,
+            match=[
+                responses.matchers.header_matcher(
+                    {'If-None-Match': '"v1"', 'If-Modified-Since': 'Wed, 21 Oct 2015 07:28:00 GMT'}
+                )
+            ],
+        )
+    )
+
+    with pytest.raises(NotModifiedError) as e:
+        download_content(url, validators=validators)
+    assert str(e.value) == 'Content not modified: https://example.com/track1.mp3'
+
+
 @responses.activate
 def test_fetch_page_should_return_html_content():
     url = 'https://example.com/card.html'
@@ -137,6 +439,45 @@ def test_fetch_page_should_return_html_content():
     assert fetch_page(url) == '<html><body>content</body></html>'
 
 
+class LargePageHandler(BaseHTTPRequestHandler):
+    """
+    Serves a card page with a large content after its data, counting the bytes actually sent.
+    """
+
+    protocol_version = 'HTTP/1.1'
+    head = '<html><body><script id="__NEXT_DATA__" type="application/json">{"title": "Café"}</script>'.encode()
+    tail = b'<div>useless</div>' * 1024 * 1024
+    sent_byte_count = 0
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(self.head) + len(self.tail)))
+        self.end_headers()
+        body = self.head + self.tail
+        try:
+            for start in range(0, len(body), DOWNLOAD_CHUNK_SIZE):
+                self.wfile.write(body[start : start + DOWNLOAD_CHUNK_SIZE])
+                type(self).sent_byte_count = start + DOWNLOAD_CHUNK_SIZE
+        except OSError:
+            # Client closed the connection.
+            pass
+
+    def log_message(self, *_args):
+        pass
+
+
+def test_fetch_page_should_stop_reading_once_data_is_found():
+    with local_http_server(LargePageHandler) as base_url:
+        page_content = fetch_page(f'{base_url}/card')
+
+    assert page_content.startswith(LargePageHandler.head.decode())
+    assert find_data(page_content) == {'title': 'Café'}
+    # The transfer has been interrupted.
+    assert len(page_content.encode()) < len(LargePageHandler.tail)
+    assert LargePageHandler.sent_byte_count < len(LargePageHandler.tail)
+
+
 @responses.activate
 def test_fetch_page_should_return_none_when_http_error_occurs():
     url = 'https://example.com/card.html'
@@ -158,12 +499,88 @@ def test_find_data_should_return_json_data_as_dict():
     assert find_data('<html><script id="__NEXT_DATA__">{"foo": "bar"}</script></html>') == {'foo': 'bar'}
 
 
+@mock.patch('bs4.BeautifulSoup', wraps=BeautifulSoup)
+def test_find_data_should_not_parse_html_when_script_is_found(beautiful_soup_mock: Mock):
+    html = (
+        '<html><head><script src="/app.js"></script></head><body><div>Card</div>'
+        '<script id="__NEXT_DATA__" type="application/json" crossorigin="anonymous">{"foo": "bar"}</script>'
+        '<script>window.foo = 1;</script></body></html>'
+    )
+    assert find_data(html) == {'foo': 'bar'}
+    beautiful_soup_mock.assert_not_called()
+
+
+@mock.patch('bs4.BeautifulSoup', wraps=BeautifulSoup)
+def test_find_data_should_parse_html_when_script_is_not_found(beautiful_soup_mock: Mock):
+    # Unusual markup, not handled by the fast path.
+    html = '<html><script data-foo="a>b" id="__NEXT_DATA__">{"foo": "bar"}</script></html>'
+    assert find_data(html) == {'foo': 'bar'}
+    beautiful_soup_mock.assert_called_once()
+
+
 def test_find_data_should_return_none_when_json_not_found():
     assert find_data('') is None
     assert find_data('<html><script id="foo"></script></html>') is None
     assert find_data('<html><script id="__NEXT_DATA__"></script></html>') is None
 
 
+def test_move_file_should_replace_destination(tmp_path: Path):
+    source = tmp_path / 'source'
+    source.write_bytes(b'new')
+    destination = tmp_path / 'destination'
+    destination.write_bytes(b'old')
+
+    move_file(source, destination)
+
+    assert destination.read_bytes() == b'new'
+    assert source.exists() is False
+
+
+@mock.patch('toto_backup.utils.os.replace', side_effect=OSError(errno.EXDEV, 'Invalid cross-device link'))
+def test_move_file_should_copy_file_across_filesystems(_replace_mock: Mock, tmp_path: Path):
+    source = tmp_path / 'source'
+    source.write_bytes(b'content')
+
+    move_file(source, tmp_path / 'destination')
+
+    assert (tmp_path / 'destination').read_bytes() == b'content'
+    assert source.exists() is False
+
+
+def test_link_or_copy_should_share_storage_unless_content_is_writable(tmp_path: Path):
+    source = tmp_path / 'source'
+    source.write_bytes(b'content')
+
+    link_or_copy(source, tmp_path / 'link')
+    link_or_copy(source, tmp_path / 'copy', hardlink=False)
+
+    assert (tmp_path / 'link').stat().st_ino == source.stat().st_ino
+    assert (tmp_path / 'copy').stat().st_ino != source.stat().st_ino
+    assert (tmp_path / 'copy').read_bytes() == b'content'
+    # Modifying the copy (cloned or not) leaves the source untouched.
+    (tmp_path / 'copy').write_bytes(b'modified')
+    assert source.read_bytes() == b'content'
+
+
+@mock.patch('toto_backup.utils._clone_file')
+def test_can_clone_files_should_try_to_clone_a_file(clone_mock: Mock, tmp_path: Path):
+    source_directory = tmp_path / 'source'
+    source_directory.mkdir()
+    destination_directory = tmp_path / 'destination'
+    destination_directory.mkdir()
+
+    clone_mock.return_value = True
+    assert can_clone_files(source_directory, destination_directory) is True
+    source, destination = clone_mock.call_args.args
+    assert source.parent == source_directory
+    assert destination.parent == destination_directory
+    clone_mock.return_value = False
+    assert can_clone_files(source_directory, destination_directory) is False
+    # Nothing is left behind.
+    assert list(source_directory.iterdir()) == []
+    assert list(destination_directory.iterdir()) == []
+
+
 def test_should_overwrite_directory_should_ask_user(caplog: LogCaptureFixture):
     caplog.set_level(10000)
     runner = CliRunner()
@@ -186,6 +603,20 @@ def test_should_overwrite_directory_should_ask_user(caplog: LogCaptureFixture):
     caplog.set_level(logging.NOTSET)
 
 
+def test_canonical_url():
+    assert canonical_url('https://yoto.io/AbCdE?b=2&a=1') == 'https://yoto.io/AbCdE?a=1&b=2'
+    assert canonical_url(' HTTPS://Yoto.IO:443/AbCdE/?a=1#top ') == 'https://yoto.io/AbCdE?a=1'
+    assert canonical_url('http://yoto.io:8080/AbCdE') == 'http://yoto.io:8080/AbCdE'
+    # Paths and query values are case-sensitive.
+    assert canonical_url('https://yoto.io/abcde?a=X') != canonical_url('https://yoto.io/AbCdE?a=x')
+
+
+def test_content_url():
+    assert content_url('https://example.com/track.mp3?Signature=1&Expires=2') == 'https://example.com/track.mp3'
+    assert content_url(' HTTPS://Example.COM:443/track.mp3#top ') == 'https://example.com/track.mp3'
+    assert content_url('https://example.com/track.mp3') != content_url('https://example.com/other.mp3')
+
+
 def test_similar_strings():
     assert similar_strings('foo', 'bar') is False
 
@@ -214,3 +645,12 @@ def test_deep_get():
     assert deep_get({'foo': 'bar'}, ['foo']) == 'bar'
     assert deep_get({'foo': {'bar': 'baz'}}, ['foo']) == {'bar': 'baz'}
     assert deep_get({'foo': {'bar': 'baz'}}, ['foo', 'bar']) == 'baz'
+
+
+@responses.activate
+def test_fetch_page_should_raise_transient_http_errors():
+    url = 'https://example.com/card.html'
+    responses.add(responses.GET, url, status=503)
+
+    with pytest.raises(HTTPError):
+        fetch_page(url)
@@ -11,7 +11,20 @@
 # was not distributed with this file, You can obtain one
 # at https://mozilla.org/MPL/2.0/.
 #
+import json
+import os
+import shutil
+import struct
+import zlib
+import threading
+import time
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from pathlib import Path
+from typing import Any
+
+from mutagen.ogg import OggPage
 
 
 def get_project_root() -> Path:
@@ -46,3 +59,176 @@ def get_dummy_ogg_opus_file() -> Path:
 def get_dummy_png_file() -> Path:
     # “empty.png” was generated using: `convert -size 16x16 xc:white empty.png`
     return get_project_root() / 'tests/data/empty.png'
+
+
+@contextmanager
+def local_http_server(handler_class: type[BaseHTTPRequestHandler]) -> Iterator[str]:
+    """
+    Runs an HTTP server on a random local port in a background thread.
+
+    :param handler_class: The request handler serving the responses.
+    :return: The base URL of the server (e.g. `http://127.0.0.1:12345`).
+    """
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler_class)
+    thread = threading.Thread(target=server.serve_forever, kwargs={'poll_interval': 0.01}, daemon=True)
+    thread.start()
+    try:
+        yield f'http://127.0.0.1:{server.server_port}'
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join()
+
+
+def generate_card_data(
+    chapter_count: int, track_count_per_chapter: int = 1, base_url: str = 'https://example.url'
+) -> dict[str, Any]:
+    """
+    Generates the JSON data of a card page, as found in its `__NEXT_DATA__` script element.
+
+    :param base_url: The URL of the server the cover, icons and tracks are downloaded from.
+    """
+    chapters = [
+        {
+            'key': f'{chapter_number:03d}',
+            'title': f'Chapter {chapter_number}',
+            'display': {'icon16x16': f'{base_url}/card/chapter-{chapter_number}-icon'},
+            'tracks': [
+                {
+                    'key': f'{track_number:03d}',
+                    'title': f'Track {track_number}',
+                    'format': 'aac',
+                    'type': 'audio',
+                    'trackUrl': f'{base_url}/card/chapter-{chapter_number}-track-{track_number}',
+                }
+                for track_number in range(1, track_count_per_chapter + 1)
+            ],
+        }
+        for chapter_number in range(1, chapter_count + 1)
+    ]
+    return {
+        'props': {
+            'pageProps': {
+                'card': {
+                    'slug': 'the-card-title',
+                    'title': 'The Card Title',
+                    'content': {'chapters': chapters},
+                    'metadata': {
+                        'category': 'stories',
+                        'author': 'Author Name',
+                        'cover': {'imageL': f'{base_url}/card/cover'},
+                    },
+                }
+            }
+        }
+    }
+
+
+def generate_card_page(data: dict[str, Any], element_count: int = 0) -> str:
+    """
+    Generates the HTML page of a card, with some markup around its data.
+
+    :param data: The JSON data of the card.
+    :param element_count: The number of elements added before the data, to get real-sized pages.
+    """
+    elements = ''.join(
+        f'<div class="chapter" data-index="{n}"><span>Chapter {n}</span><img src="/icons/{n}.png" alt=""></div>'
+        for n in range(element_count)
+    )
+    return (
+        '<!DOCTYPE html><html><head><meta charset="utf-8"><title>The Card Title</title>'
+        '<script src="/_next/static/chunks/main.js" defer></script></head>'
+        f'<body><div id="__next">{elements}</div>'
+        f'<script id="__NEXT_DATA__" type="application/json">{json.dumps(data)}</script></body></html>'
+    )
+
+
+def measure_time(function: Callable[[], Any], repeat: int = 5) -> float:
+    """
+    Measures the execution time of a function, keeping the best of several runs to limit noise.
+
+    :return: The best execution time, in seconds.
+    """
+    best_time = float('inf')
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        function()
+        best_time = min(best_time, time.perf_counter() - start_time)
+    return best_time
+
+
+def generate_large_track(source: Path, destination: Path, size: int) -> Path:
+    """
+    Generates a track of about the given size, from a dummy track, to benchmark tagging. The
+    added content is not playable audio, but tagging libraries do not read it.
+
+    - MP3: zero bytes are appended (MPEG frames are not parsed when writing ID3 tags).
+    - M4A: a `free` atom is appended after the `moov` atom, so growing it moves the content.
+    - Ogg: the audio page is replaced by pages of random data.
+
+    :param source: The dummy track (MP3, M4A, or Ogg).
+    :param destination: The track to generate.
+    :param size: The approximate size of the generated track, in bytes.
+    :return: The generated track.
+    """
+    shutil.copyfile(source, destination)
+    padding_size = max(size - source.stat().st_size, 0)
+    if source.suffix == '.mp3':
+        with open(destination, 'ab') as file:
+            file.truncate(destination.stat().st_size + padding_size)
+    elif source.suffix == '.m4a':
+        with open(destination, 'ab') as file:
+            file.write(struct.pack('>I4s', padding_size + 8, b'free'))
+            file.truncate(destination.stat().st_size + padding_size)
+    else:
+        with open(source, 'rb') as file:
+            header_pages = [OggPage(file), OggPage(file)]
+        # At most 255 lacing values per page, a packet ending with a value lower than 255.
+        page_data_size = 255 * 255 - 1
+        page_count = max(padding_size // page_data_size, 1)
+        with open(destination, 'wb') as file:
+            for header_page in header_pages:
+                file.write(header_page.write())
+            for page_number in range(page_count):
+                page = OggPage()
+                page.serial = header_pages[0].serial
+                page.sequence = len(header_pages) + page_number
+                page.position = (page_number + 1) * 48000
+                page.last = page_number == page_count - 1
+                page.packets = [os.urandom(page_data_size)]
+                file.write(page.write())
+    return destination
+
+
+def generate_large_cover(destination: Path, size: int) -> Path:
+    """
+    Generates a PNG cover of about the given size, from the dummy cover, to benchmark tagging.
+    A private ancillary chunk of random data is added, image decoders skip it.
+
+    :param destination: The cover to generate.
+    :param size: The approximate size of the generated cover, in bytes.
+    :return: The generated cover.
+    """
+    png = get_dummy_png_file().read_bytes()
+    # Signature (8 bytes), then the IHDR chunk (length, type, 13 bytes of data, CRC).
+    ihdr_end = 8 + 4 + 4 + 13 + 4
+    data = os.urandom(max(size - len(png) - 12, 0))
+    chunk = struct.pack('>I', len(data)) + b'prVt' + data + struct.pack('>I', zlib.crc32(b'prVt' + data))
+    destination.write_bytes(png[:ihdr_end] + chunk + png[ihdr_end:])
+    return destination
+
+
+def get_io_counters() -> tuple[int, int] | None:
+    """
+    Provides the number of bytes the current process read and wrote so far through system
+    calls, whether they hit the disk or the page cache.
+
+    :return: The bytes read and the bytes written, or `None` where unknown (only Linux provides
+        them, in `/proc/self/io`).
+    """
+    try:
+        lines = Path('/proc/self/io').read_text().splitlines()
+    except OSError:
+        return None
+    counters = dict(line.split(': ', 1) for line in lines)
+    return int(counters['rchar']), int(counters['wchar'])